@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Train the models of many stations in one go.
+
+Running `indra.py --train 1` once per station pays the import cost every
+time and fits the SARMA candidates of a station one after the other on
+one core. This script reads a manifest of stations and splits their
+training into tasks that share one pool of worker processes:
+    1. ingestion of the seed data and the fourier fits, one per station,
+    2. one SARMA candidate fit per station, variable and candidate order,
+    3. simulation of the selected models and creation of the samples,
+       once all the candidates of a station are in.
+The outputs of every station go to its usual store_path, where indra can
+sample from them as if it had trained the station itself. A summary of
+the timings and failures of every station is printed and saved as JSON.
+
+The manifest is a JSON list with one dictionary per station. The keys
+are the training arguments of indra; only station_code and path_file_in
+are required:
+    [{"station_code": "gen", "path_file_in": "gen/che_geneva.iwec.a",
+      "store_path": "gen", "n_samples": 100,
+      "arma_params": [2, 2, 1, 1, 24], "bounds": [1, 99]},
+     {"station_code": "zrh", "path_file_in": "zrh/",
+      "climate_change": true, "path_cc_file": "zrh/cc.p",
+      "epoch": [2051, 2060], "compress": "gzip", "fixed_point": true}]
+
+Typical use:
+    python batch.py stations.json --workers 8 --summary batch.json
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+import wfileio as wf
+import checkpoint
+import compression
+import fixedpoint
+import resampling
+import seedmap
+import store
+from petites import setseed
+from ts_models import candidate_orders, fit_candidate, refit_candidate
+
+# Training arguments of a station that can be left out of the manifest,
+# with the same defaults as indra.
+DEFAULTS = dict(n_samples=10, arma_params=[2, 2, 1, 1, 24],
+                bounds=[0.01, 99.9], climate_change=False,
+                path_cc_file='ccfile.p', cc_scenario='rcp85',
+                epoch=None, randseed=None, store_path=None, window=None,
+                compress=None, fixed_point=False, seed_map=None)
+
+# Intermediate results of a station between its tasks, in store_path.
+STATE_FILE = 'batch_state.p'
+
+
+def read_manifest(path_manifest):
+    '''Read the list of stations and fill in the defaults.'''
+
+    with open(path_manifest, 'r') as open_file:
+        entries = json.load(open_file)
+
+    stations = list()
+
+    for entry in entries:
+
+        for key in ['station_code', 'path_file_in']:
+            if key not in entry:
+                raise KeyError(
+                    "Every station in the manifest needs a {0}.".format(key))
+
+        station = dict(DEFAULTS)
+        station.update(entry)
+
+        station['station_code'] = station['station_code'].lower()
+        if station['store_path'] is None:
+            station['store_path'] = station['station_code']
+        if station['randseed'] is None:
+            station['randseed'] = int(time.time())
+
+        stations.append(station)
+
+    return stations
+
+# ----------- END read_manifest function. -----------
+
+
+def prepare_station(station):
+    '''Task 1: read the seed (and climate model) data and fit the fourier
+       series. Everything the last task needs is left in store_path, and
+       only the de-meaned series are sent back.'''
+
+    tic = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        if not os.path.isdir(station['store_path']):
+            os.makedirs(station['store_path'])
+
+        setseed(station['randseed'])
+
+        # Kept in the record, so that an update reads only new files.
+        seed_files = checkpoint.file_stats(station['path_file_in'])
+
+        if station['seed_map'] is None:
+            xy_train, _, _ = wf.get_seed(
+                station['station_code'], station['path_file_in'])
+        else:
+            xy_train, _, _ = seedmap.get_seed(
+                station['station_code'], station['path_file_in'],
+                station['seed_map'])
+
+        if station['climate_change']:
+            cc_data = wf.get_cc_data(station['path_cc_file'],
+                                     station['cc_scenario'],
+                                     station['epoch'])
+        else:
+            cc_data = None
+
+        fits = resampling.fit_means(xy_train, cc_data, station['randseed'])
+
+    with open(os.path.join(station['store_path'], STATE_FILE),
+              'wb') as open_file:
+        pickle.dump(dict(fits=fits, cc_data=cc_data, seed_files=seed_files),
+                    open_file)
+
+    return fits['sans_means'], time.perf_counter() - tic
+
+# ----------- END prepare_station function. -----------
+
+
+def fit_task(ts_in, order, seasonal_order):
+    '''Task 2: fit one SARMA candidate and send back its AIC and
+       parameters (None if the fit failed).'''
+
+    tic = time.perf_counter()
+
+    mod_fit = fit_candidate(ts_in, order, seasonal_order)
+
+    if mod_fit is None:
+        return None, None, time.perf_counter() - tic
+
+    return (mod_fit.aic, np.asarray(mod_fit.params),
+            time.perf_counter() - tic)
+
+# ----------- END fit_task function. -----------
+
+
+def generate_station(station, selected):
+    '''Task 3: rebuild the selected models from their parameters,
+       generate the samples and save everything in store_path.
+       `selected` has one (order, seasonal_order, params) per variable.'''
+
+    tic = time.perf_counter()
+
+    path_state = os.path.join(station['store_path'], STATE_FILE)
+    with open(path_state, 'rb') as open_file:
+        state = pickle.load(open_file)
+
+    fits = state['fits']
+    store_files = store.paths(station['store_path'], station['epoch'])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        selmdl = [refit_candidate(fits['sans_means'][var], *selected[var])
+                  for var in fits['sans_means']]
+
+        # Every station can compress its samples, or not.
+        if station['compress'] is None:
+            compression.disable()
+        else:
+            compression.enable(station['compress'])
+        if station['fixed_point']:
+            fixedpoint.enable()
+        else:
+            fixedpoint.disable()
+
+        xout = resampling.generate(
+            fits, selmdl, station['n_samples'], store_files['syn'],
+            station['bounds'], state['cc_data'], station['randseed'],
+            station['window'])
+
+        store.save_model(store_files['model'], selmdl, fits['ffit'],
+                         station['randseed'])
+        store.save_stats(store_files['stats'], xout)
+        store.save_diagnostics(store_files['diagnostics'], selmdl,
+                               fits['ffit'], xout)
+        store.save_counter(store_files['counter'], station['n_samples'],
+                           station['randseed'])
+        store.save_record(store_files['record'], resampling.record_files(
+            fits['record'], state['seed_files']))
+
+    os.remove(path_state)
+
+    return time.perf_counter() - tic
+
+# ----------- END generate_station function. -----------
+
+
+def select(fits):
+    '''Pick the candidate with the lowest AIC, as select_models does.
+       `fits` is a list of (order, seasonal_order, aic, params) in the
+       order of candidate_orders.'''
+
+    selaic = np.infty
+    selected = None
+
+    for order, seasonal_order, aic, params in fits:
+        if aic is not None and aic < selaic:
+            selaic = aic
+            selected = (order, seasonal_order, params)
+
+    return selected
+
+# ----------- END select function. -----------
+
+
+def run(stations, workers=None):
+    '''Train all stations with a pool of `workers` processes (default:
+       one per core). Returns a summary per station.'''
+
+    summary = [dict(station_code=x['station_code'],
+                    store_path=x['store_path'], status='queued',
+                    error=None, prepare_seconds=None, fit_seconds=0.,
+                    n_fits=0, failed_fits=0, generate_seconds=None,
+                    wall_seconds=None)
+               for x in stations]
+
+    # Candidate fits of every station, by variable.
+    fits = [dict() for _ in stations]
+    candidates = [candidate_orders(x['arma_params']) for x in stations]
+    # Number of candidate fits still running, per station.
+    pending = [0 for _ in stations]
+
+    tic = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        running = dict()
+
+        for sidx, station in enumerate(stations):
+            running[pool.submit(prepare_station, station)] = (
+                'prepare', sidx, None)
+
+        while running:
+
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                task, sidx, info = running.pop(future)
+                this_summary = summary[sidx]
+
+                if future.exception() is not None:
+                    # Any failure ends the station, but not the batch.
+                    if this_summary['status'] != 'failed':
+                        this_summary['status'] = 'failed'
+                        this_summary['error'] = '{0}: {1!r}'.format(
+                            task, future.exception())
+                    if task == 'fit':
+                        pending[sidx] -= 1
+                    continue
+
+                if task == 'prepare':
+
+                    sans_means, seconds = future.result()
+                    this_summary['prepare_seconds'] = seconds
+                    this_summary['status'] = 'fitting'
+
+                    # Queue every candidate of every variable.
+                    for var in sans_means:
+                        fits[sidx][var] = [None] * len(candidates[sidx])
+                        for cidx, (order, seasonal_order) in enumerate(
+                                candidates[sidx]):
+                            running[pool.submit(
+                                fit_task, sans_means[var], order,
+                                seasonal_order)] = ('fit', sidx, (var, cidx))
+                            pending[sidx] += 1
+
+                elif task == 'fit':
+
+                    aic, params, seconds = future.result()
+                    var, cidx = info
+                    order, seasonal_order = candidates[sidx][cidx]
+                    fits[sidx][var][cidx] = (order, seasonal_order,
+                                             aic, params)
+                    this_summary['fit_seconds'] += seconds
+                    this_summary['n_fits'] += 1
+                    if aic is None:
+                        this_summary['failed_fits'] += 1
+                    pending[sidx] -= 1
+
+                    if pending[sidx] > 0 or \
+                            this_summary['status'] == 'failed':
+                        continue
+
+                    # All candidates are in, so select and generate.
+                    selected = dict([(var, select(var_fits))
+                                     for var, var_fits in
+                                     fits[sidx].items()])
+                    fits[sidx] = None
+
+                    if any([x is None for x in selected.values()]):
+                        this_summary['status'] = 'failed'
+                        this_summary['error'] = (
+                            'select_models: no candidate could be fitted')
+                        continue
+
+                    this_summary['status'] = 'generating'
+                    running[pool.submit(
+                        generate_station, stations[sidx], selected)] = (
+                            'generate', sidx, None)
+
+                else:
+
+                    this_summary['generate_seconds'] = future.result()
+                    this_summary['status'] = 'done'
+                    this_summary['wall_seconds'] = time.perf_counter() - tic
+
+    return summary
+
+# ----------- END run function. -----------
+
+
+def fmt_seconds(seconds):
+    '''Seconds for the summary table, or a dash.'''
+    return '-' if seconds is None else '{:.1f}'.format(seconds)
+
+# ----------- END fmt_seconds function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Train the models of all the stations in a manifest, "
+        "sharing one pool of worker processes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("manifest", type=str,
+                        help="JSON list of stations and their training "
+                        "arguments.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes. Defaults to the "
+                        "number of cores.")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Write the summary to this JSON file.")
+    args = parser.parse_args()
+
+    stations = read_manifest(args.manifest)
+
+    tic = time.perf_counter()
+    summary = run(stations, args.workers)
+    wall = time.perf_counter() - tic
+
+    print("{0:>12s} {1:>8s} {2:>11s} {3:>10s} {4:>6s} {5:>12s} "
+          "{6:>9s}".format("station", "status", "prepare [s]", "fits [s]",
+                           "fits", "generate [s]", "wall [s]"))
+
+    for this_summary in summary:
+        print("{0:>12s} {1:>8s} {2:>11s} {3:10.1f} {4:>6s} {5:>12s} "
+              "{6:>9s}".format(
+                  this_summary['station_code'], this_summary['status'],
+                  fmt_seconds(this_summary['prepare_seconds']),
+                  this_summary['fit_seconds'],
+                  '{0}/{1}'.format(this_summary['n_fits'] -
+                                   this_summary['failed_fits'],
+                                   this_summary['n_fits']),
+                  fmt_seconds(this_summary['generate_seconds']),
+                  fmt_seconds(this_summary['wall_seconds'])))
+        if this_summary['error'] is not None:
+            print("             {0}".format(this_summary['error']))
+
+    n_done = len([x for x in summary if x['status'] == 'done'])
+    print("Trained {0} of {1} stations in {2:.1f} s.".format(
+        n_done, len(summary), wall))
+
+    if args.summary is not None:
+        with open(args.summary, 'w') as open_file:
+            json.dump(dict(wall_seconds=wall, stations=summary),
+                      open_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for the hot functions of indra.
+
+Every benchmark runs offline, on the bundled files in gen/ or on synthetic
+inputs built from them. Benchmarks are registered with the @benchmark
+decorator, asv-style: each keyword of the decorator is a parameter with a
+list of values, the decorated function is called once per combination to
+do its set-up, and it returns the callable that is actually timed. As in
+asv, a set-up that raises NotImplementedError skips its benchmark, e.g.,
+when an input file or an optional package is missing, and the skip is
+stored with its reason.
+
+Typical use:
+    python benchmarks.py --save baseline.json
+    (change something)
+    python benchmarks.py --compare baseline.json
+
+The comparison prints the ratio of the current to the stored time of
+every benchmark and exits with a non-zero code if any of them got slower
+than the tolerance allows. Commit the baseline file next to the code it
+measures so that a regression shows up as a diff.
+
+benchmarks_baseline.json is such a baseline, saved with --save. Its
+"host" entry describes the machine and packages it was saved with, and
+its "inputs" entry the seed files. Compare against it on similar
+hardware, or save your own. The bundled EPW files were git-lfs pointers
+there, so the EPW benchmarks ran on the ESP-r seed written out as an EPW
+file by seedgen (--epw).
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import compression
+import ensemble
+import harmonics
+import fourier
+import wfileio as wf
+import petites as petite
+import resampling
+import seedgen
+from ts_models import select_models
+
+# Bundled seed files. The EPW files in gen/ are stored with git-lfs, so
+# run `git lfs pull` if read_epw complains about them.
+PATH_ESPR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'gen', 'che_geneva.iwec.a')
+PATH_EPW = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'gen', 'gen_iwec.epw')
+
+# Columns of the fin4 files, in the order read_fin4 expects them.
+FIN4_COLS = ["year", "month", "day", "hour", "tdb", "tdp", "atmpr", "sky",
+             "osky", "wspd", "wdir", "ghi", "dni", "Pres", "Rain", "vis",
+             "chgt", "solarz"]
+
+# Registered benchmarks, as (name, function, parameters).
+BENCHMARKS = list()
+
+# Paths to the seed files and the scratch folder, set in main().
+FIXTURES = dict(epw=PATH_EPW, espr=PATH_ESPR, fin4=None, tmp=None)
+
+
+def require(path):
+    '''Skip the benchmark if the input file at path is missing, or is
+       still a git-lfs pointer rather than the file itself.'''
+
+    if path is None or not os.path.isfile(path):
+        raise NotImplementedError("{0} is missing".format(path))
+
+    with open(path, 'rb') as open_file:
+        if open_file.read(40).startswith(b'version https://git-lfs'):
+            raise NotImplementedError(
+                "{0} is a git-lfs pointer, run `git lfs pull` or use "
+                "--epw".format(os.path.basename(path)))
+
+    return path
+
+# ----------- END require function. -----------
+
+
+def benchmark(**params):
+    '''Register a benchmark. Each keyword is a parameter and its list of
+       values. The decorated function is called with every combination
+       and must return the callable to time.'''
+
+    def decorator(func):
+        BENCHMARKS.append((func.__name__.replace('bench_', ''),
+                           func, params))
+        return func
+
+    return decorator
+
+# ----------- END benchmark function. -----------
+
+
+# %% Synthetic inputs.
+
+@lru_cache(maxsize=None)
+def seed_year():
+    '''One year of recorded data, read from the bundled ESP-r file.'''
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        wdata, _, _, _ = wf.read_espr(FIXTURES['espr'])
+
+    return wdata
+
+
+@lru_cache(maxsize=None)
+def seed_record(years):
+    '''A record of several consecutive years, made by seedgen with the
+       statistics of the bundled year.'''
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        record = seedgen.make_record(years=years, randseed=years,
+                                     path_espr=FIXTURES['espr'])
+
+    return pd.concat(record)
+
+
+@lru_cache(maxsize=None)
+def sans_means():
+    '''De-meaned temperature and RH of the bundled year, as in trainer.'''
+
+    rec = seed_year()
+    x_calc = np.arange(0, rec.shape[0])
+    hstats = harmonics.harmonic_stats(x_calc, rec[['tdb', 'rh']])
+
+    demeaned = pd.DataFrame(index=rec.index)
+    for var in ['tdb', 'rh']:
+        demeaned[var] = rec[var] - fourier.fit(
+            var, x_calc, *harmonics.solve_harmonics(hstats, var))
+
+    return demeaned
+
+
+@lru_cache(maxsize=None)
+def fitted_model():
+    '''A small SARMA model fitted to the de-meaned temperature.'''
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        selmdl, resid = select_models([1, 1, 0, 0, 24], sans_means()['tdb'])
+
+    return selmdl
+
+
+def synthetic_samples(n_samples):
+    '''Synthetic samples that look like the output of create_future_no_cc,
+       i.e., an ensemble of the seed year with perturbed temperature
+       and RH.'''
+
+    rng = np.random.RandomState(n_samples)
+    base = seed_year()
+
+    syn = ensemble.Ensemble(base, resampling.VARYING, n_samples)
+    syn.column('tdb')[:] += rng.normal(0, 1, [n_samples, base.shape[0]])
+    syn.column('rh')[:] = np.clip(
+        syn.column('rh') + rng.normal(0, 5, [n_samples, base.shape[0]]),
+        10, 99)
+
+    return syn
+
+
+def write_fin4(path):
+    '''Write the bundled year out as a fin4 file, for read_fin4.'''
+
+    base = seed_year()
+
+    table = pd.DataFrame(0., index=base.index, columns=FIN4_COLS)
+    for col in ["year", "month", "day", "hour", "tdb", "tdp",
+                "wspd", "ghi", "dni"]:
+        table[col] = base[col].values
+    table["wdir"] = base["wdr"].values
+    table["atmpr"] = 965.
+    table["Pres"] = 965.
+    table["vis"] = 30.
+    table["chgt"] = 777.
+    table["hour"] = table["hour"] + 1
+
+    fin_fmt = ["%4d", "%2d", "%2d", "%2d"] + ["%6.1f"] * (len(FIN4_COLS) - 4)
+    header = "fin4 benchmark file\nsynthetic\nfrom {0}".format(
+        os.path.basename(FIXTURES['espr']))
+
+    np.savetxt(path, table.values, fmt=fin_fmt, delimiter=" ",
+               header=header, comments="")
+
+# ----------- END write_fin4 function. -----------
+
+
+# %% Benchmarks.
+
+@benchmark()
+def bench_read_epw():
+    return lambda: wf.read_epw(require(FIXTURES['epw']))
+
+
+@benchmark()
+def bench_read_espr():
+    return lambda: wf.read_espr(FIXTURES['espr'])
+
+
+@benchmark()
+def bench_read_fin4():
+    return lambda: wf.read_fin4(FIXTURES['fin4'])
+
+
+@benchmark(arma_params=['1,0,0,0,24', '1,1,0,0,24'])
+def bench_select_models(arma_params):
+    arma_params = [int(x) for x in arma_params.split(',')]
+    ts_in = sans_means()['tdb']
+    return lambda: select_models(arma_params, ts_in)
+
+
+@benchmark(samples=[10, 100])
+def bench_arma_simulate(samples):
+    mdl = fitted_model()
+    return lambda: [mdl.simulate(nsimulations=resampling.STD_LEN_OUT)
+                    for _ in range(0, samples)]
+
+
+@benchmark(years=[1, 10])
+def bench_quantilecleaner(years):
+    rec = seed_record(years)
+    syn = synthetic_samples(1)[0]['tdb']
+    return lambda: petite.quantilecleaner(syn, rec, 'tdb', [1, 99])
+
+
+@benchmark(years=[1, 10])
+def bench_calc_tdp(years):
+    rec = seed_record(years)
+    return lambda: petite.calc_tdp(rec['tdb'].values, rec['rh'].values)
+
+
+@benchmark(years=[1, 10])
+def bench_w2rh(years):
+    rec = seed_record(years)
+    # Humidity ratio of the recorded dew point, at sea level.
+    p_w = 610.94 * np.exp(17.625 * rec['tdp'] / (rec['tdp'] + 243.04))
+    w = (0.621945 * p_w / (101325 - p_w)).values
+    tdb = rec['tdb'].values + 273.15
+    return lambda: petite.w2rh(w, tdb, 101325)
+
+
+@benchmark(samples=[1, 10], years=[1, 5])
+def bench_nearest_neighbour(samples, years):
+    rec = seed_record(years)
+    syn = synthetic_samples(samples)
+    # nearest_neighbour writes into the samples, so give it fresh ones.
+    return lambda: resampling.nearest_neighbour(
+        copy.deepcopy(syn), rec, 'tdb', 'ghi')
+
+
+@benchmark(file_type=['csv', 'epw', 'espr', 'fin4'])
+def bench_give_weather(file_type):
+
+    if file_type == 'epw':
+        masterfile = require(FIXTURES['epw'])
+        sample, locdata, header = wf.read_epw(masterfile)
+    elif file_type == 'fin4':
+        masterfile = FIXTURES['fin4']
+        sample, locdata, header = wf.read_fin4(masterfile)
+    else:
+        masterfile = FIXTURES['espr']
+        sample, locdata, header, _ = wf.read_espr(masterfile)
+
+    path_file_out = os.path.join(FIXTURES['tmp'], 'bench_out.a')
+
+    # give_weather changes some columns in place.
+    return lambda: wf.give_weather(
+        sample.copy(), locdata, 'gen', header, masterfile=masterfile,
+        file_type=file_type, path_file_out=path_file_out)
+
+
+@benchmark(file_type=['npz', 'feather'], samples=[10])
+def bench_give_ensemble(file_type, samples):
+
+    if file_type == 'feather' and wf.pyarrow is None:
+        raise NotImplementedError("pyarrow is not installed")
+
+    syn = synthetic_samples(samples)
+    _, locdata, _, _ = wf.read_espr(FIXTURES['espr'])
+    path_file_out = os.path.join(FIXTURES['tmp'], 'bench_ensemble')
+
+    return lambda: wf.give_ensemble(syn, locdata, 'gen', path_file_out,
+                                    file_type=file_type)
+
+
+@benchmark(codec=['none', 'gzip', 'lzma'], samples=[10])
+def bench_dump_samples(codec, samples):
+
+    syn = synthetic_samples(samples)
+    path = os.path.join(FIXTURES['tmp'], 'bench_syn.p')
+
+    return lambda: compression.dump_pickle(
+        syn, path, codec=None if codec == 'none' else codec)
+
+
+@benchmark(codec=['none', 'gzip', 'lzma'], samples=[10])
+def bench_load_samples(codec, samples):
+
+    path = os.path.join(FIXTURES['tmp'], 'bench_syn_{0}.p'.format(codec))
+    compression.dump_pickle(synthetic_samples(samples), path,
+                            codec=None if codec == 'none' else codec)
+
+    return lambda: compression.load_pickle(path)
+
+
+# %% Runner.
+
+def expand(params):
+    '''All combinations of the parameter values, as dictionaries.'''
+
+    keys = sorted(params)
+    return [dict(zip(keys, values)) for values in
+            itertools.product(*[params[k] for k in keys])]
+
+
+def bench_key(name, kwargs):
+    '''Name under which the result of one benchmark is stored.'''
+
+    if not kwargs:
+        return name
+    return "{0}[{1}]".format(name, ",".join(
+        "{0}={1}".format(k, kwargs[k]) for k in sorted(kwargs)))
+
+
+def run(pattern=None, repeat=3):
+    '''Run every benchmark whose name contains pattern. Returns a
+       dictionary of results keyed by bench_key.'''
+
+    results = dict()
+
+    for name, func, params in BENCHMARKS:
+
+        if pattern is not None and pattern not in name:
+            continue
+
+        for kwargs in expand(params):
+
+            key = bench_key(name, kwargs)
+
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    to_time = func(**kwargs)
+                    times = list()
+                    for _ in range(0, repeat):
+                        tic = time.perf_counter()
+                        to_time()
+                        times.append(time.perf_counter() - tic)
+
+                results[key] = dict(min=min(times),
+                                    median=float(np.median(times)),
+                                    repeat=repeat)
+                print("{0:<50s} {1:10.4f} s".format(key, min(times)))
+
+            except NotImplementedError as err:
+                results[key] = dict(skipped=str(err))
+                print("{0:<50s} skipped: {1}".format(key, err))
+
+            except Exception as err:
+                results[key] = dict(error=repr(err))
+                print("{0:<50s} failed: {1!r}".format(key, err))
+
+    return results
+
+# ----------- END run function. -----------
+
+
+def host_specs():
+    '''Machine and packages the benchmarks run on, to store with the
+       results.'''
+
+    # platform.processor() is empty on many Linux hosts.
+    cpu_model = platform.processor()
+    if os.path.isfile('/proc/cpuinfo'):
+        with open('/proc/cpuinfo', 'r') as open_file:
+            found = re.search(r'^model name\s*:\s*(.*)$', open_file.read(),
+                              re.MULTILINE)
+        if found is not None:
+            cpu_model = found.group(1).strip()
+
+    try:
+        memory_gb = (os.sysconf('SC_PAGE_SIZE') *
+                     os.sysconf('SC_PHYS_PAGES') / 1024.**3)
+    except (ValueError, OSError, AttributeError):
+        memory_gb = None
+
+    return dict(machine=platform.node(), platform=platform.platform(),
+                cpu_model=cpu_model, cpus=os.cpu_count(),
+                cpus_usable=(len(os.sched_getaffinity(0))
+                             if hasattr(os, 'sched_getaffinity')
+                             else os.cpu_count()),
+                memory_gb=(None if memory_gb is None
+                           else round(memory_gb, 1)),
+                python=platform.python_version(), numpy=np.__version__,
+                pandas=pd.__version__,
+                pyarrow=(None if wf.pyarrow is None
+                         else wf.pyarrow.__version__))
+
+# ----------- END host_specs function. -----------
+
+
+def compare(results, baseline, tolerance=0.2):
+    '''Print current against stored times. Returns the keys of the
+       benchmarks that got slower by more than tolerance.'''
+
+    regressions = list()
+
+    print("\r\n{0:<50s} {1:>10s} {2:>10s} {3:>7s}".format(
+        "benchmark", "baseline", "current", "ratio"))
+
+    for key in sorted(set(results) | set(baseline)):
+
+        old = baseline.get(key, dict()).get('min')
+        new = results.get(key, dict()).get('min')
+
+        if old is None or new is None:
+            print("{0:<50s} {1:>10s} {2:>10s}".format(
+                key, "-" if old is None else "{:.4f}".format(old),
+                "-" if new is None else "{:.4f}".format(new)))
+            continue
+
+        ratio = new / old
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 / (1 + tolerance):
+            flag = "  faster"
+
+        print("{0:<50s} {1:10.4f} {2:10.4f} {3:7.2f}{4}".format(
+            key, old, new, ratio, flag))
+
+    return regressions
+
+# ----------- END compare function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks for indra. Times the hot functions "
+        "on the bundled seed files and on synthetic inputs.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--filter", type=str, default=None,
+                        help="Only run benchmarks whose name contains "
+                        "this string.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs per benchmark. The minimum "
+                        "is stored.")
+    parser.add_argument("--save", type=str, default=None,
+                        help="Write the results to this JSON file, e.g., "
+                        "to use as a baseline.")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Compare the results against this baseline "
+                        "JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slow-down that counts as a "
+                        "regression in --compare.")
+    parser.add_argument("--epw", type=str, default=PATH_EPW,
+                        help="EPW seed file for the EPW benchmarks.")
+    parser.add_argument("--espr", type=str, default=PATH_ESPR,
+                        help="ESP-r seed file for the other benchmarks.")
+    args = parser.parse_args()
+
+    FIXTURES['epw'] = args.epw
+    FIXTURES['espr'] = args.espr
+    FIXTURES['tmp'] = tempfile.mkdtemp(prefix='indra_bench_')
+    FIXTURES['fin4'] = os.path.join(FIXTURES['tmp'], 'bench.fin4')
+
+    try:
+        write_fin4(FIXTURES['fin4'])
+        results = run(args.filter, args.repeat)
+    finally:
+        shutil.rmtree(FIXTURES['tmp'])
+
+    if args.save is not None:
+        with open(args.save, 'w') as open_file:
+            json.dump(dict(host=host_specs(),
+                           inputs=dict(epw=os.path.basename(args.epw),
+                                       espr=os.path.basename(args.espr)),
+                           results=results),
+                      open_file, indent=1, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as open_file:
+            baseline = json.load(open_file)['results']
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints of a training run, so that an interrupted run can be resumed.
+
+Once start() has been called, every finished stage of trainer, every
+SARMA candidate fit and every GCM-year of the climate change loop is
+written to the checkpoint folder (store_path/checkpoints by default) as
+soon as it is done. Running the same training again skips whatever is
+already there. The folder is removed by finish() at the end of a
+successful run, and kept by stop(), which switches checkpointing off
+when a run fails. Checkpoints cost disk space and time, so they are
+only written when asked for, e.g., by `indra.py --checkpoints 1`.
+
+A checkpoint is only reused if the run that wrote it had the same
+configuration (seed files, n_samples, arma_params, and so on) and the
+same random seed. Otherwise the folder is cleared and the run starts from
+scratch. Every stage draws its random numbers from its own stream of that
+seed (see streams.py), so a resumed run draws the same numbers as an
+uninterrupted one would have.
+
+Every file is written to a temporary name and then renamed, so a run
+that dies halfway through a write leaves no half-written checkpoint.
+When no run has been started, load() finds nothing and save() does
+nothing.
+
+@author: Parag Rastogi
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+
+# Switched on by start().
+ENABLED = False
+
+# Returned by load() when there is no checkpoint. None is a valid
+# checkpoint (e.g., of a candidate that could not be fitted).
+MISSING = object()
+
+# Name of the file that identifies the run that wrote the checkpoints.
+CONFIG_FILE = 'config.json'
+
+# Folder of the current run.
+_PATH = [None]
+
+
+def file_stats(path):
+    '''Name, size and modification time of a file, or of every file in a
+       folder, to tell whether the inputs of a run have changed.'''
+
+    if os.path.isdir(path):
+        files = sorted([os.path.join(path, x) for x in os.listdir(path)])
+    else:
+        files = [path]
+
+    return [[os.path.basename(x), os.path.getsize(x),
+             int(os.path.getmtime(x))]
+            for x in files if os.path.isfile(x)]
+
+# ----------- END file_stats function. -----------
+
+
+def fingerprint(config):
+    '''Hash of a run configuration, which must be JSON serialisable.'''
+
+    return hashlib.sha1(json.dumps(
+        config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+# ----------- END fingerprint function. -----------
+
+
+def start(path, config, randseed=None):
+    '''Start checkpointing a run into folder `path`. If the folder holds
+       the checkpoints of a run with the same configuration, and with the
+       same random seed (or randseed is None), they are kept and that
+       run is resumed. Returns the random seed to use: the one of the
+       resumed run, the one passed, or one based on the time.'''
+
+    global ENABLED
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    path_config = os.path.join(path, CONFIG_FILE)
+    this_fingerprint = fingerprint(config)
+
+    stored = None
+    if os.path.isfile(path_config):
+        try:
+            with open(path_config, 'r') as open_file:
+                stored = json.load(open_file)
+        except ValueError:
+            stored = None
+
+    if (stored is not None and
+            stored['fingerprint'] == this_fingerprint and
+            (randseed is None or randseed == stored['randseed'])):
+
+        randseed = stored['randseed']
+        print("Resuming the interrupted run from {0} checkpoints "
+              "in {1}.\r\n".format(len(os.listdir(path)) - 1, path))
+
+    else:
+
+        # Different run, so nothing in the folder can be reused.
+        for name in os.listdir(path):
+            path_name = os.path.join(path, name)
+            if os.path.isdir(path_name):
+                shutil.rmtree(path_name)
+            else:
+                os.remove(path_name)
+
+        if randseed is None:
+            randseed = int(time.time())
+
+        _write(path_config, json.dumps(
+            dict(fingerprint=this_fingerprint, randseed=randseed,
+                 config=config), indent=1, default=str).encode('utf-8'))
+
+    _PATH[0] = path
+    ENABLED = True
+
+    return randseed
+
+# ----------- END start function. -----------
+
+
+def finish():
+    '''End a successful run: switch checkpointing off and delete the
+       checkpoints.'''
+
+    global ENABLED
+
+    if ENABLED and os.path.isdir(_PATH[0]):
+        shutil.rmtree(_PATH[0])
+
+    ENABLED = False
+    _PATH[0] = None
+
+# ----------- END finish function. -----------
+
+
+def stop():
+    '''Switch checkpointing off, keeping the checkpoints, e.g., when a run
+       fails, so that it can be resumed.'''
+
+    global ENABLED
+
+    ENABLED = False
+    _PATH[0] = None
+
+# ----------- END stop function. -----------
+
+
+def _write(path_file, data):
+    '''Write bytes to path_file atomically.'''
+
+    handle, path_temp = tempfile.mkstemp(
+        dir=os.path.dirname(path_file), suffix='.tmp')
+
+    try:
+        with os.fdopen(handle, 'wb') as open_file:
+            open_file.write(data)
+            open_file.flush()
+            os.fsync(open_file.fileno())
+        os.replace(path_temp, path_file)
+    except BaseException:
+        if os.path.isfile(path_temp):
+            os.remove(path_temp)
+        raise
+
+# ----------- END _write function. -----------
+
+
+def _file(key):
+    '''File name of a checkpoint. Anything that is not safe in a file
+       name (e.g., in the name of a GCM) is replaced.'''
+
+    return os.path.join(
+        _PATH[0], re.sub(r'[^A-Za-z0-9_.-]', '-', key) + '.p')
+
+# ----------- END _file function. -----------
+
+
+def save(key, value):
+    '''Checkpoint value under key.'''
+
+    if not ENABLED or key is None:
+        return
+
+    _write(_file(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+# ----------- END save function. -----------
+
+
+def load(key):
+    '''The checkpointed value of key, or MISSING.'''
+
+    if not ENABLED or key is None or not os.path.isfile(_file(key)):
+        return MISSING
+
+    try:
+        with open(_file(key), 'rb') as open_file:
+            return pickle.load(open_file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return MISSING
+
+# ----------- END load function. -----------
+
+
+def cached(key, func, *args, **kwargs):
+    '''Return the checkpointed result of stage `key`, or run func(*args,
+       **kwargs) and checkpoint its result.'''
+
+    found = load(key)
+
+    if found is not MISSING:
+        return found
+
+    value = func(*args, **kwargs)
+    save(key, value)
+
+    return value
+
+# ----------- END cached function. -----------
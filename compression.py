@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Compressed sample stores and weather file exports.
+
+Weather files are text that repeats itself a lot, and the pickles of
+samples are mostly float arrays with little entropy in their last bits,
+so both shrink several times when compressed. This module compresses
+them with the standard library only:
+    - gzip (zlib) or lzma (xz): what is written is cut into chunks of
+      CHUNK bytes, which a pool of threads compresses at the same time
+      (zlib and lzma let go of the interpreter while they work). Every
+      chunk becomes one gzip member or xz stream, and the usual readers
+      (gzip.open, lzma.open, gunzip, xz) read them back as one file.
+    - zip: ZipBundle puts many exported files into one archive, e.g.,
+      every sample of an ensemble. Its members are compressed one at a
+      time.
+Compressed pickles keep their names (syn.p, ...). open_read and
+load_pickle tell the codec from the first bytes of the file, and
+decompress as they read, so the readers do not need to know whether a
+store was compressed.
+
+The sample store is compressed when enable() has been called, e.g., by
+`indra.py --compress gzip`. Exports are compressed by the writers of
+pipeline.py.
+
+@author: Parag Rastogi
+"""
+
+import collections
+import gzip
+import io
+import lzma
+import os
+import pickle
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Codecs that compress in chunks, the extension of their files, their
+# first bytes, and their compression levels. The levels trade a little
+# size for a lot of speed, so that compressing keeps up with
+# generation.
+CODECS = ('gzip', 'lzma')
+EXTENSIONS = dict(gzip='.gz', lzma='.xz', zip='.zip')
+MAGIC = dict(gzip=b'\x1f\x8b', lzma=b'\xfd7zXZ\x00')
+LEVELS = dict(gzip=6, lzma=1)
+
+# Bytes compressed together by one thread.
+CHUNK = 4 * 2 ** 20
+
+# Threads that compress chunks.
+WORKERS = os.cpu_count() or 1
+
+# Codec of the sample store, set by enable(). Module-level so that every
+# script sees it.
+CODEC = None
+
+
+def enable(codec, workers=None):
+    '''Compress the sample store with codec (see CODECS) from now on, in
+       workers threads.'''
+
+    global CODEC, WORKERS
+
+    if codec not in CODECS:
+        raise ValueError("The sample store can be compressed with {0}, "
+                         "not {1}.".format(" or ".join(CODECS), codec))
+
+    CODEC = codec
+    if workers is not None:
+        WORKERS = workers
+
+# ----------- END enable function. -----------
+
+
+def disable():
+    '''Stop compressing the sample store.'''
+
+    global CODEC
+    CODEC = None
+
+# ----------- END disable function. -----------
+
+
+def compress_chunk(data, codec):
+    '''One chunk of bytes compressed as a gzip member or xz stream.'''
+
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=LEVELS['gzip'], mtime=0)
+
+    return lzma.compress(data, preset=LEVELS['lzma'])
+
+# ----------- END compress_chunk function. -----------
+
+
+class ChunkedWriter(object):
+    '''Binary file object that compresses what is written to it a chunk
+       at a time, in a pool of threads, and writes the compressed chunks
+       to path in order. At most two chunks per thread are held in
+       memory.'''
+
+    def __init__(self, path, codec, workers=None, chunk=CHUNK):
+
+        if codec not in CODECS:
+            raise ValueError("I can compress in chunks with {0}, not "
+                             "{1}.".format(" or ".join(CODECS), codec))
+
+        self.codec = codec
+        self.chunk = chunk
+        self.workers = WORKERS if workers is None else workers
+
+        self.raw = open(path, 'wb')
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.n_in = 0
+        self.n_out = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, data):
+
+        # pickle hands over large arrays as buffers, not bytes.
+        data = memoryview(data).cast('B')
+
+        self.buffer += data
+        self.n_in += data.nbytes
+
+        while len(self.buffer) >= self.chunk:
+            self._submit(bytes(self.buffer[0:self.chunk]))
+            del self.buffer[0:self.chunk]
+
+        return data.nbytes
+
+    def _submit(self, data):
+
+        self.pending.append(
+            self.pool.submit(compress_chunk, data, self.codec))
+
+        while len(self.pending) > 2 * self.workers:
+            self._write_next()
+
+    def _write_next(self):
+        out = self.pending.popleft().result()
+        self.raw.write(out)
+        self.n_out += len(out)
+
+    def close(self):
+
+        if self.raw.closed:
+            return
+
+        try:
+            if self.buffer or self.n_in == 0:
+                self._submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            while self.pending:
+                self._write_next()
+        finally:
+            self.pool.shutdown()
+            self.raw.close()
+
+# ----------- END ChunkedWriter class. -----------
+
+
+def codec_of(path):
+    '''Codec of a file, from its first bytes, or None if it is not
+       compressed.'''
+
+    with open(path, 'rb') as open_file:
+        start = open_file.read(max([len(x) for x in MAGIC.values()]))
+
+    for codec, magic in MAGIC.items():
+        if start.startswith(magic):
+            return codec
+
+    return None
+
+# ----------- END codec_of function. -----------
+
+
+def open_read(path):
+    '''Binary file object that reads path, decompressing as it goes if
+       it is compressed.'''
+
+    codec = codec_of(path)
+
+    if codec == 'gzip':
+        return gzip.open(path, 'rb')
+    if codec == 'lzma':
+        return lzma.open(path, 'rb')
+
+    return open(path, 'rb')
+
+# ----------- END open_read function. -----------
+
+
+def open_text(path):
+    '''Text file object that reads path, decompressing as it goes if it
+       is compressed.'''
+
+    return io.TextIOWrapper(open_read(path))
+
+# ----------- END open_text function. -----------
+
+
+def strip_extension(path):
+    '''path without the extension of a codec, if it has one, e.g.,
+       wf_out_0001.epw for wf_out_0001.epw.gz.'''
+
+    root, ext = os.path.splitext(path)
+
+    if ext.lower() in (EXTENSIONS['gzip'], EXTENSIONS['lzma']):
+        return root
+
+    return path
+
+# ----------- END strip_extension function. -----------
+
+
+def dump_pickle(obj, path, codec=None, workers=None):
+    '''Pickle obj to path, compressed with codec, or with the codec of
+       the sample store (see enable) if codec is None.'''
+
+    if codec is None:
+        codec = CODEC
+
+    if codec is None:
+        with open(path, 'wb') as open_file:
+            pickle.dump(obj, open_file, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        with ChunkedWriter(path, codec, workers) as open_file:
+            pickle.dump(obj, open_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+# ----------- END dump_pickle function. -----------
+
+
+def load_pickle(path):
+    '''Load a pickle, compressed or not.'''
+
+    with open_read(path) as open_file:
+        return pickle.load(open_file)
+
+# ----------- END load_pickle function. -----------
+
+
+def compress_file(path, codec, workers=None, remove=True):
+    '''Compress the file at path into path plus the extension of codec,
+       and remove the original unless remove is False. Returns the path
+       of the compressed file.'''
+
+    path_out = path + EXTENSIONS[codec]
+
+    with open(path, 'rb') as open_in, \
+            ChunkedWriter(path_out, codec, workers) as open_out:
+        shutil.copyfileobj(open_in, open_out, CHUNK)
+
+    if remove:
+        os.remove(path)
+
+    return path_out
+
+# ----------- END compress_file function. -----------
+
+
+class ZipBundle(object):
+    '''Zip archive that several threads can add files to. Use it as a
+       context manager, or call close() when done.'''
+
+    def __init__(self, path):
+
+        if not path.endswith(EXTENSIONS['zip']):
+            path = path + EXTENSIONS['zip']
+
+        self.path = path
+        self.archive = zipfile.ZipFile(path, 'w',
+                                       compression=zipfile.ZIP_DEFLATED,
+                                       compresslevel=LEVELS['gzip'])
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add(self, path, remove=True):
+        '''Add the file at path to the archive, under its name, and remove
+           it unless remove is False. Returns the size of the compressed
+           member.'''
+
+        with self._lock:
+            self.archive.write(path, arcname=os.path.basename(path))
+            size = self.archive.getinfo(os.path.basename(path)).compress_size
+
+        if remove:
+            os.remove(path)
+
+        return size
+
+    def close(self):
+        with self._lock:
+            self.archive.close()
+
+# ----------- END ZipBundle class. -----------
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Temporal structure of the recorded, residual and synthetic series.
+
+For TDB and RH, diagnose() computes:
+    - the autocorrelation (ACF) and partial autocorrelation (PACF), up to
+      NLAGS hours, and the periodogram of the de-meaned recorded series
+      that the SARMA models were fitted to,
+    - the ACF of the residuals of the selected models, with the
+      Ljung-Box statistic, to check that they are close to white noise,
+    - the ACF, PACF and periodogram of every synthetic sample, once the
+      same fourier series has been removed from it.
+The ACFs of many series are computed at once with an FFT, and the PACFs
+from the ACFs with the Durbin-Levinson recursion, also for all the
+series at once. The samples go through a block at a time, so even a
+large ensemble is diagnosed in one quick pass.
+
+With climate change, the samples also carry the signal of the climate
+models, which raises their ACF at long lags.
+
+The diagnostics are saved with every trained station (store.paths), and
+summary() condenses them into one row per variable.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import fft
+from scipy.stats import chi2
+
+import ensemble
+import timeindex
+
+# Variables of the SARMA models, in the order of selmdl.
+VARIABLES = ('tdb', 'rh')
+
+# Largest lag, in hours, of the ACF and PACF.
+NLAGS = 3 * 24
+
+# Lags of the Ljung-Box statistic of the residuals.
+LJUNG_BOX_LAGS = (24, 48)
+
+# Samples diagnosed together.
+CHUNK = 128
+
+# Frequency bands, in cycles per day, whose power summary compares:
+# weather systems of two to ten days, and the days themselves. The
+# fourier series remove the exact daily cycle, but not the power around
+# it.
+BANDS = dict(synoptic=(1. / 10, 1. / 2), diurnal=(0.8, 1.2))
+
+
+def acf(series, nlags=NLAGS):
+    '''Autocorrelation of every series along the last axis, up to lag
+       nlags, computed with an FFT. Missing values count as the mean.'''
+
+    series = np.asarray(series, dtype=np.float64)
+    series = series - np.nanmean(series, axis=-1, keepdims=True)
+    series = np.where(np.isfinite(series), series, 0.)
+
+    n_values = series.shape[-1]
+    # Zero-padding to at least twice the length gives the linear, not
+    # circular, autocovariance.
+    n_fft = fft.next_fast_len(2 * n_values - 1, real=True)
+
+    spectrum = fft.rfft(series, n=n_fft, axis=-1)
+    autocov = fft.irfft(spectrum * np.conj(spectrum), n=n_fft,
+                        axis=-1)[..., 0:nlags + 1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return autocov / autocov[..., 0:1]
+
+# ----------- END acf function. -----------
+
+
+def pacf(autocorr):
+    '''Partial autocorrelation from the autocorrelation of every series
+       along the last axis (lag 0 first), with the Durbin-Levinson
+       recursion.'''
+
+    autocorr = np.asarray(autocorr, dtype=np.float64)
+    nlags = autocorr.shape[-1] - 1
+
+    out = np.ones(autocorr.shape)
+    if nlags == 0:
+        return out
+
+    # AR coefficients of the current order, and the variance of the
+    # innovations, for every series.
+    phi = np.zeros(autocorr.shape[:-1] + (nlags,))
+    phi[..., 0] = autocorr[..., 1]
+    variance = 1. - autocorr[..., 1] ** 2
+    out[..., 1] = autocorr[..., 1]
+
+    for k in range(2, nlags + 1):
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reflection = (autocorr[..., k] - np.sum(
+                phi[..., 0:k - 1] * autocorr[..., k - 1:0:-1],
+                axis=-1)) / variance
+
+        phi[..., 0:k - 1] = (phi[..., 0:k - 1] -
+                             reflection[..., None] * phi[..., k - 2::-1])
+        phi[..., k - 1] = reflection
+        variance = variance * (1. - reflection ** 2)
+        out[..., k] = reflection
+
+    return out
+
+# ----------- END pacf function. -----------
+
+
+def periodogram(series):
+    '''Periodogram of every series along the last axis, and its
+       frequencies in cycles per day.'''
+
+    series = np.asarray(series, dtype=np.float64)
+    series = series - np.nanmean(series, axis=-1, keepdims=True)
+    series = np.where(np.isfinite(series), series, 0.)
+
+    n_values = series.shape[-1]
+    power = np.abs(fft.rfft(series, axis=-1)) ** 2 / n_values
+
+    return power, fft.rfftfreq(n_values, d=1. / 24)
+
+# ----------- END periodogram function. -----------
+
+
+def ljung_box(autocorr, n_values, lags=LJUNG_BOX_LAGS):
+    '''Ljung-Box statistic and its p-value at each of lags, from the
+       autocorrelation of a series of n_values values.'''
+
+    out = dict()
+
+    for lag in lags:
+        k = np.arange(1, lag + 1)
+        stat = n_values * (n_values + 2) * np.sum(
+            autocorr[1:lag + 1] ** 2 / (n_values - k))
+        out[lag] = dict(stat=float(stat),
+                        pvalue=float(chi2.sf(stat, lag)))
+
+    return out
+
+# ----------- END ljung_box function. -----------
+
+
+def diagnose(selmdl, ffit, xout, nlags=NLAGS, chunk=CHUNK):
+    '''Diagnostics of the selected models (whose endogenous series are
+       the de-meaned recorded series) and of the samples in xout (an
+       Ensemble, a list of samples, or an ensemble read with
+       wfileio.get_ensemble). ffit are the fourier series of the
+       variables, which are removed from the samples. Returns a
+       dictionary per variable.'''
+
+    n_samples, columns, _, _ = ensemble.describe(xout)
+
+    # Hours of the year covered by the samples, which may be a window.
+    if isinstance(xout, ensemble.Ensemble):
+        first_hour = xout.first_hour
+    elif isinstance(xout, dict):
+        first_hour = int(timeindex.noleap_hours(
+            pd.DatetimeIndex([xout['meta']['start']]))[0])
+    else:
+        first_hour = int(timeindex.noleap_hours(xout[0].index[0:1])[0])
+
+    out = dict(nlags=nlags, n_samples=n_samples)
+
+    for var, mdl, mean in zip(VARIABLES, selmdl, ffit):
+
+        if var not in columns:
+            continue
+
+        recorded = np.asarray(mdl.model.endog, dtype=np.float64).ravel()
+        resid = np.asarray(mdl.resid, dtype=np.float64).ravel()
+
+        rec_acf = acf(recorded, nlags)
+        res_acf = acf(resid, nlags)
+        rec_power, freq = periodogram(recorded)
+
+        syn_acf = list()
+        syn_power = None
+
+        for first in range(0, n_samples, chunk):
+
+            last = min(first + chunk, n_samples)
+            values = ensemble.block(xout, var, first, last)
+            values = values - np.asarray(mean)[
+                first_hour:first_hour + values.shape[1]]
+
+            syn_acf.append(acf(values, nlags))
+
+            power, syn_freq = periodogram(values)
+            if syn_power is None:
+                syn_power = power.sum(axis=0)
+            else:
+                syn_power += power.sum(axis=0)
+
+        syn_acf = np.concatenate(syn_acf)
+        syn_pacf = pacf(syn_acf)
+
+        out[var] = dict(
+            recorded=dict(acf=rec_acf, pacf=pacf(rec_acf),
+                          periodogram=rec_power, frequency=freq),
+            residuals=dict(acf=res_acf,
+                           ljung_box=ljung_box(res_acf, len(resid)),
+                           white_band=1.96 / np.sqrt(len(resid))),
+            samples=dict(acf=syn_acf, pacf=syn_pacf,
+                         periodogram=syn_power / n_samples,
+                         frequency=syn_freq))
+
+    return out
+
+# ----------- END diagnose function. -----------
+
+
+def band_power(power, freq, band):
+    '''Mean power of the periodogram in a band of frequencies (low,
+       high). Each bin estimates the spectral density, so the mean does
+       not depend on the length of the series, while the sum grows with
+       the number of bins in the band. This lets a window of samples be
+       compared with years of recorded data.'''
+    return np.mean(power[(freq >= band[0]) & (freq <= band[1])])
+
+# ----------- END band_power function. -----------
+
+
+def summary(diag):
+    '''One row per variable: how far the mean ACF and PACF of the samples
+       are from the recorded ones (RMSE over lags 1 to nlags), the share
+       of lags at which the recorded value is within the 5-95 % range of
+       the samples, the ratio of the mean power of the samples to the
+       recorded one in each of BANDS, the share of residual ACF lags
+       outside the white-noise band, and the Ljung-Box p-values.'''
+
+    rows = dict()
+
+    for var in [x for x in VARIABLES if x in diag]:
+
+        this = diag[var]
+        row = dict()
+
+        for key in ['acf', 'pacf']:
+            recorded = this['recorded'][key][1:]
+            synthetic = this['samples'][key][:, 1:]
+            low, high = np.nanpercentile(synthetic, [5, 95], axis=0)
+            row[key + '_rmse'] = float(np.sqrt(np.nanmean(
+                (np.nanmean(synthetic, axis=0) - recorded) ** 2)))
+            row[key + '_coverage'] = float(np.mean(
+                (recorded >= low) & (recorded <= high)))
+
+        for name, band in BANDS.items():
+            row[name + '_power_ratio'] = float(
+                band_power(this['samples']['periodogram'],
+                           this['samples']['frequency'], band) /
+                band_power(this['recorded']['periodogram'],
+                           this['recorded']['frequency'], band))
+
+        res = this['residuals']
+        row['resid_acf_outside'] = float(np.mean(
+            np.abs(res['acf'][1:]) > res['white_band']))
+        for lag, test in res['ljung_box'].items():
+            row['ljung_box_p{0}'.format(lag)] = test['pvalue']
+
+        rows[var] = row
+
+    return pd.DataFrame(rows).T
+
+# ----------- END summary function. -----------
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Compact in-memory container for the synthetic samples made by trainer.
+
+Each sample used to be a full float64 copy of the seed year, calendar
+columns and all. An Ensemble keeps only the columns that change from one
+sample to the next, in one contiguous float32 array of shape
+[samples, hours, variables]. Columns that are the same in every sample
+(month, day, hour, and whatever the resampling leaves alone) are stored
+once, and the year of every sample is a single integer.
+
+Columns that are filled with whole recorded days (the solar components
+picked by nearest_neighbour) are not stored per sample at all. The
+recorded days are kept once, as a table of donor days, and every sample
+only stores which donor day it uses for each of its days.
+
+Cleaners and writers can read a column of all samples, or one sample of a
+column, as views into that array. frame(k), or ensemble[k], rebuilds the
+full DataFrame of sample k for the writers, so a sample is only
+materialised when it is written.
+
+Ensembles can be saved in fixed point (see fixedpoint.py), and are
+decoded back to float32 as they are loaded.
+
+@author: Parag Rastogi
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+import fixedpoint
+from timeindex import noleap_hours, noleap_index
+
+
+class Ensemble(object):
+    '''A set of samples that share the calendar and static columns of a
+       template year. `varying` lists the columns that differ between
+       samples. Every sample starts out as a copy of the template. If
+       `years` is given, sample k is moved to years[k], year column and
+       index both. Otherwise every sample keeps the year column and the
+       index of the template. Every sample is identified by the GCM it
+       was made with (if any), its year and its variant number. The
+       template can be a window of whole days of its year, in which case
+       every sample covers the same window.'''
+
+    def __init__(self, template, varying, n_samples, years=None,
+                 gcms=None, variants=None):
+
+        self.columns = list(template.columns)
+        self.varying = [x for x in self.columns if x in varying]
+        self._vidx = dict([(var, idx)
+                           for idx, var in enumerate(self.varying)])
+
+        self.base_year = int(template.index.year[0])
+        # Hour of the year at which the samples start.
+        self.first_hour = int(noleap_hours(template.index[0:1])[0])
+
+        if years is None:
+            self.years = np.repeat(self.base_year, n_samples)
+            static = [x for x in self.columns if x not in self.varying]
+        else:
+            self.years = np.asarray(years, dtype=int)
+            static = [x for x in self.columns
+                      if x not in self.varying and x != 'year']
+
+        # Columns stored once, with their own dtypes.
+        self.static = template[static].copy()
+
+        if gcms is None:
+            gcms = [''] * n_samples
+        self.gcms = [str(x) for x in gcms]
+
+        if variants is None:
+            variants = np.arange(0, n_samples)
+        self.variants = np.asarray(variants, dtype=int)
+
+        self.values = np.empty(
+            [n_samples, template.shape[0], len(self.varying)],
+            dtype=np.float32)
+        self.values[:] = template[self.varying].values
+
+        # Groups of columns filled from donor days, as
+        # (columns, donor table, picks). See add_donors.
+        self.donors = list()
+        self._didx = dict()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Samples saved in fixed point are decoded as they are loaded.
+        if 'fixed_point' in state:
+            fixedpoint.unpack(self)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, k):
+        return self.frame(k)
+
+    def __iter__(self):
+        for k in range(0, len(self)):
+            yield self.frame(k)
+
+    @property
+    def n_hours(self):
+        return self.values.shape[1]
+
+    @property
+    def nbytes(self):
+        '''Memory held by the samples, static columns included.'''
+        return (self.values.nbytes + self.years.nbytes +
+                int(self.static.memory_usage(index=True).sum()) +
+                sum([x[1].nbytes + x[2].nbytes for x in self.donors]))
+
+    @property
+    def per_sample(self):
+        '''Columns that differ between samples: those stored per sample
+           and those filled from donor days, in template order.'''
+        return [x for x in self.columns
+                if x in self._vidx or x in self._didx]
+
+    def key(self, k):
+        '''(GCM, year, variant) of sample k, e.g., to derive its random
+           number streams.'''
+        return (self.gcms[k], int(self.years[k]), int(self.variants[k]))
+
+    def index(self, k):
+        '''Datetime index of sample k.'''
+
+        if self.years[k] == self.base_year:
+            return self.static.index
+
+        return noleap_index(int(self.years[k]), self.n_hours,
+                            self.first_hour)
+
+    def add_donors(self, columns, table):
+        '''Fill `columns` from a table of donor days, [days, 24, columns],
+           from now on. The columns stop being stored per sample. Returns
+           the [samples, days] array of donor day indices, which starts at
+           -1 (keep the template day) and is filled in by the caller.'''
+
+        # Columns that were stored per sample keep the values of the
+        # first sample as the fall-back for days that are not picked.
+        for col in columns:
+            if col in self._vidx:
+                self.static[col] = self.values[0, :, self._vidx[col]]
+            elif col not in self.static:
+                raise ValueError(
+                    "Column {0} is not in the template.".format(col))
+
+        keep = [x for x in self.varying if x not in columns]
+        self.values = np.ascontiguousarray(
+            self.values[:, :, [self._vidx[x] for x in keep]])
+        self.varying = keep
+        self._vidx = dict([(var, idx) for idx, var in enumerate(keep)])
+
+        picks = np.full([len(self), self.n_hours // 24], -1, dtype=np.int32)
+        gidx = len(self.donors)
+        self.donors.append((list(columns),
+                            np.asarray(table, dtype=np.float32), picks))
+        for cidx, col in enumerate(columns):
+            self._didx[col] = (gidx, cidx)
+
+        return picks
+
+    def _donated(self, k, var):
+        '''Materialise a donor column of sample k. Negative values, e.g.,
+           of irradiance at sunrise, are set to zero.'''
+
+        gidx, cidx = self._didx[var]
+        _, table, picks = self.donors[gidx]
+
+        days = np.reshape(self.static[var].values.astype(np.float32),
+                          [-1, 24]).copy()
+        picked = picks[k] >= 0
+        days[picked] = table[picks[k][picked], :, cidx]
+        days = np.reshape(days, [-1])
+
+        return np.where(days <= 0, 0, days)
+
+    def column(self, var):
+        '''View of one variable in all samples, [samples, hours].
+           Writing into it changes the ensemble. Donor columns are
+           materialised instead, so writing into them has no effect, and
+           static columns cannot be written into.'''
+
+        if var in self._didx:
+            return np.asarray([self._donated(k, var)
+                               for k in range(0, len(self))])
+
+        if var in self._vidx:
+            return self.values[:, :, self._vidx[var]]
+
+        # Static columns are the same in every sample (read-only view).
+        return np.broadcast_to(self.static[var].values,
+                               [len(self), self.n_hours])
+
+    def series(self, k, var):
+        '''Sample k of one variable as a Series, without copying
+           (except for donor columns).'''
+
+        if var in self._didx:
+            return pd.Series(self._donated(k, var), index=self.index(k),
+                             name=var)
+
+        if var in self._vidx:
+            data = self.values[k, :, self._vidx[var]]
+        else:
+            data = self.static[var].values
+
+        return pd.Series(data, index=self.index(k), name=var, copy=False)
+
+    def frame(self, k):
+        '''Full DataFrame of sample k, in the column order of the template.
+           The writers modify what they are given, so this is a copy.'''
+
+        index = self.index(k)
+        data = dict()
+        for col in self.columns:
+            if col in self._vidx:
+                data[col] = self.values[k, :, self._vidx[col]]
+            elif col in self._didx:
+                data[col] = self._donated(k, col)
+            elif col in self.static:
+                data[col] = self.static[col].values
+            else:
+                data[col] = np.repeat(self.years[k], self.n_hours)
+
+        return pd.DataFrame(data, index=index, columns=self.columns)
+
+# ----------- END Ensemble class. -----------
+
+
+def concatenate(parts):
+    '''One Ensemble with the samples of every Ensemble in parts, in
+       order. The parts have to be made from the same template and donor
+       days, e.g., blocks of samples of one training run. A single part
+       is returned as it is.'''
+
+    if len(parts) == 0:
+        raise ValueError("There are no samples to put together.")
+
+    if len(parts) == 1:
+        return parts[0]
+
+    # The calendar, static columns and donor tables of the first part
+    # are shared by all.
+    out = copy.copy(parts[0])
+
+    out.values = np.concatenate([x.values for x in parts])
+    out.years = np.concatenate([x.years for x in parts])
+    out.gcms = sum([x.gcms for x in parts], [])
+    out.variants = np.concatenate([x.variants for x in parts])
+    out.donors = [(columns, table,
+                   np.concatenate([x.donors[gidx][2] for x in parts]))
+                  for gidx, (columns, table, _) in enumerate(
+                      parts[0].donors)]
+
+    return out
+
+# ----------- END concatenate function. -----------
+
+
+def describe(xout):
+    '''Number of samples, columns, and the month and hour of day of every
+       hour of the samples of an Ensemble, of a list of samples, or of an
+       ensemble read with wfileio.get_ensemble. Every sample covers whole
+       days of the same calendar.'''
+
+    if isinstance(xout, dict):
+        return (xout['meta']['n_samples'], list(xout['meta']['columns']),
+                np.asarray(xout['month'], dtype=int),
+                np.arange(0, xout['meta']['n_hours']) % 24)
+
+    if isinstance(xout, Ensemble):
+        index = xout.index(0)
+        columns = list(xout.columns)
+    else:
+        index = xout[0].index
+        columns = list(xout[0].columns)
+
+    return (len(xout), columns, np.asarray(index.month),
+            np.asarray(index.hour))
+
+# ----------- END describe function. -----------
+
+
+def block(xout, var, first, last):
+    '''Values of var in samples first to last - 1 of an Ensemble, of a
+       list of samples, or of an ensemble read with wfileio.get_ensemble,
+       as [samples, hours].'''
+
+    if isinstance(xout, dict):
+        # Variables that are the same in every sample are stored once.
+        if np.ndim(xout[var]) == 1:
+            return np.tile(xout[var], [last - first, 1])
+        return np.asarray(xout[var][first:last])
+
+    if isinstance(xout, Ensemble):
+        if var in xout.varying:
+            return xout.column(var)[first:last]
+        return np.asarray([xout.series(k, var).values
+                           for k in range(first, last)])
+
+    return np.asarray([x[var].values for x in xout[first:last]])
+
+# ----------- END block function. -----------
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-point storage of the samples, in the manner of ESP-r climate files.
+
+ESP-r files store temperatures in tenths of a degree and wind speeds in
+tenths of a m/s, as integers. The samples can be stored the same way:
+every variable is kept as a 16-bit integer code, with its own scale and
+offset,
+    value = code * scale + offset,
+which takes a quarter of the space of float64 values (and half of the
+float32 values an Ensemble holds in memory). The scales and offsets in
+FORMATS fit the physical range of every variable into the codes, so the
+value read back is within half a scale of the value stored, give or
+take the rounding of float32. That rounding is a few parts in 1e8 of the
+offset and of the distance from it, i.e., below 1e-4 of a unit for
+every variable:
+
+    variable               scale   offset   range             max. error
+    tdb, tdp (C)           0.005        0   -163 to 163           0.0025
+    rh (%)                 0.004       50   -81 to 181             0.002
+    ghi, dni, dhi (W/m2)   0.04       700   -610 to 2010            0.02
+    wspd (m/s)             0.005       80   -83 to 243            0.0025
+    wdr, wdir (deg)        0.01       180   -147 to 507            0.005
+    atmpr (Pa)             2.       80000   14466 to 145534            1
+
+Values outside the range are stored as its nearest end, and missing
+values as MISSING. The errors are well below the precision of the
+recorded data, which is usually a tenth of a unit.
+
+pack() encodes an Ensemble before it is saved, and Ensemble decodes it
+again as it is loaded, so the readers of the store get float32 values
+either way. The samples are stored in fixed point when enable() has been
+called, e.g., by `indra.py --fixed_point 1`.
+
+@author: Parag Rastogi
+"""
+
+import copy
+
+import numpy as np
+
+# Scale and offset of every variable.
+FORMATS = dict(tdb=(0.005, 0.), tdp=(0.005, 0.), rh=(0.004, 50.),
+               ghi=(0.04, 700.), dni=(0.04, 700.), dhi=(0.04, 700.),
+               wspd=(0.005, 80.), wdr=(0.01, 180.), wdir=(0.01, 180.),
+               atmpr=(2., 80000.))
+
+# Code of missing values. The other codes are symmetric around zero.
+MISSING = np.iinfo(np.int16).min
+CODE_MAX = np.iinfo(np.int16).max
+
+# Store the samples in fixed point, set by enable(). Module-level so that
+# every script sees it.
+ENABLED = False
+
+
+def enable():
+    '''Store the samples in fixed point from now on.'''
+
+    global ENABLED
+    ENABLED = True
+
+# ----------- END enable function. -----------
+
+
+def disable():
+    '''Store the samples as floats again.'''
+
+    global ENABLED
+    ENABLED = False
+
+# ----------- END disable function. -----------
+
+
+def formats(variables):
+    '''Scale and offset of each of variables, as arrays, or None if any
+       of them has no format.'''
+
+    if any([x not in FORMATS for x in variables]):
+        return None
+
+    return (np.asarray([FORMATS[x][0] for x in variables]),
+            np.asarray([FORMATS[x][1] for x in variables]))
+
+# ----------- END formats function. -----------
+
+
+def max_error(var):
+    '''Largest difference between a value of var (within its range) and
+       the value read back.'''
+
+    return FORMATS[var][0] / 2
+
+# ----------- END max_error function. -----------
+
+
+def encode(values, scale, offset):
+    '''int16 codes of values, whose last axis holds variables with the
+       scales and offsets given.'''
+
+    values = np.asarray(values, dtype=np.float64)
+
+    codes = np.rint((values - offset) / scale)
+    np.clip(codes, -CODE_MAX, CODE_MAX, out=codes)
+    codes[~np.isfinite(values)] = MISSING
+
+    return codes.astype(np.int16)
+
+# ----------- END encode function. -----------
+
+
+def decode(codes, scale, offset):
+    '''float32 values of int16 codes, whose last axis holds variables
+       with the scales and offsets given.'''
+
+    values = (codes.astype(np.float32) * np.asarray(scale, np.float32) +
+              np.asarray(offset, np.float32))
+    values[codes == MISSING] = np.nan
+
+    return values
+
+# ----------- END decode function. -----------
+
+
+def pack(xout):
+    '''Copy of the Ensemble xout with the values of its samples and its
+       donor days in fixed point, ready to be saved. xout itself is
+       returned if one of its variables has no format.'''
+
+    value_fmt = formats(xout.varying)
+    donor_fmt = [formats(columns) for columns, _, _ in xout.donors]
+
+    if value_fmt is None or any([x is None for x in donor_fmt]):
+        print("Some variables of the samples have no fixed-point format, "
+              "so they are stored as floats.\r\n")
+        return xout
+
+    out = copy.copy(xout)
+    out.values = encode(xout.values, *value_fmt)
+    out.donors = [(columns, encode(table, *fmt), picks)
+                  for (columns, table, picks), fmt in zip(xout.donors,
+                                                          donor_fmt)]
+    # The formats go with the codes, so that they can be read back even
+    # if FORMATS changes.
+    out.fixed_point = dict(values=value_fmt, donors=donor_fmt)
+
+    return out
+
+# ----------- END pack function. -----------
+
+
+def unpack(xout):
+    '''Decode the values and donor days of an Ensemble stored by pack, in
+       place.'''
+
+    fmt = xout.__dict__.pop('fixed_point')
+
+    xout.values = decode(xout.values, *fmt['values'])
+    xout.donors = [(columns, decode(table, *this_fmt), picks)
+                   for (columns, table, picks), this_fmt in zip(
+                       xout.donors, fmt['donors'])]
+
+    return xout
+
+# ----------- END unpack function. -----------
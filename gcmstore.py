@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Store of climate model (GCM) outputs, split by scenario, GCM and year.
+
+The climate model outputs come as one pickle with a table of daily
+values per scenario, indexed by GCM and day. Training with climate
+change used to load the whole pickle to keep one scenario, and then
+clean every GCM (drop the days with missing values, average the days
+that appear more than once) and cut out the epoch, every time. This
+module does all of that once:
+    - build() cleans every GCM of every scenario and saves every year of
+      it as its own small pickle, scenario/GCM/year.p, with an index of
+      the scenarios, GCMs and years in the store,
+    - load() reads only the years of one scenario in an epoch, so
+      training takes as long, and as much memory, whatever the size of
+      the archive.
+load() returns the same table as wfileio.get_cc_data, which reads from a
+store whenever path_cc_file is one. From the command line:
+    python gcmstore.py ccfile.p ccstore
+and then `indra.py --climate_change 1 --path_cc_file ccstore ...`.
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+
+import pandas as pd
+
+# Index of the scenarios, GCMs and years in a store.
+INDEX_FILE = 'index.json'
+
+
+def safe_name(name):
+    '''Name of a scenario or GCM as a folder name. Anything that is not
+       safe in a file name is replaced.'''
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', str(name))
+
+# ----------- END safe_name function. -----------
+
+
+def clean_gcm(table):
+    '''Daily outputs of one GCM without the days with missing values,
+       and with the days that appear more than once averaged.'''
+
+    table = table.dropna(how='any')
+
+    return table.groupby(table.index).mean()
+
+# ----------- END clean_gcm function. -----------
+
+
+def is_store(path):
+    '''Whether path is a store made by build.'''
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+# ----------- END is_store function. -----------
+
+
+def read_index(path_store):
+    '''The index of a store: for every scenario, the folder, years and
+       columns of every GCM.'''
+
+    with open(os.path.join(path_store, INDEX_FILE), 'r') as open_file:
+        return json.load(open_file)
+
+# ----------- END read_index function. -----------
+
+
+def build(path_cc_file, path_store):
+    '''Clean the climate model outputs in the pickle at path_cc_file and
+       save them as a store at path_store, replacing any store there.
+       The store is written under a temporary name and renamed when it
+       is complete. Returns its index.'''
+
+    with open(path_cc_file, 'rb') as open_file:
+        cc_all = pickle.load(open_file)
+
+    path_store = os.path.abspath(path_store)
+    parent = os.path.dirname(path_store)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    path_temp = tempfile.mkdtemp(
+        dir=parent, prefix='.' + os.path.basename(path_store) + '.')
+
+    index = dict(source=os.path.abspath(path_cc_file), scenarios=dict())
+
+    try:
+        for scenario in sorted(cc_all):
+
+            cc_data = cc_all[scenario]
+            index['scenarios'][scenario] = dict()
+
+            for gcm in sorted(set(cc_data.index.get_level_values(0))):
+
+                table = clean_gcm(cc_data.loc[gcm])
+
+                # GCMs without any data are left out.
+                if table.shape[0] == 0:
+                    continue
+
+                folder = os.path.join(safe_name(scenario), safe_name(gcm))
+                os.makedirs(os.path.join(path_temp, folder))
+
+                years = sorted(set(table.index.year))
+                for year in years:
+                    table.loc[str(year)].to_pickle(os.path.join(
+                        path_temp, folder, '{0:04d}.p'.format(year)))
+
+                index['scenarios'][scenario][str(gcm)] = dict(
+                    folder=folder, years=[int(x) for x in years],
+                    columns=list(table.columns))
+
+        with open(os.path.join(path_temp, INDEX_FILE), 'w') as open_file:
+            json.dump(index, open_file, indent=1)
+
+        if os.path.isdir(path_store):
+            shutil.rmtree(path_store)
+        os.replace(path_temp, path_store)
+
+    except BaseException:
+        if os.path.isdir(path_temp):
+            shutil.rmtree(path_temp)
+        raise
+
+    return index
+
+# ----------- END build function. -----------
+
+
+def load(path_store, cc_scenario, epoch):
+    '''The daily outputs of every GCM of scenario cc_scenario in the
+       years of epoch (first and last year, both included), indexed by
+       GCM and day, as wfileio.get_cc_data returns them. Only those years
+       are read.'''
+
+    index = read_index(path_store)
+
+    if cc_scenario not in index['scenarios']:
+        raise KeyError("The store at {0} has no scenario {1}, only "
+                       "{2}.".format(path_store, cc_scenario,
+                                     ", ".join(index['scenarios'])))
+
+    parts = dict()
+
+    for gcm, entry in sorted(index['scenarios'][cc_scenario].items()):
+
+        years = [x for x in entry['years'] if epoch[0] <= x <= epoch[1]]
+
+        if len(years) == 0:
+            continue
+
+        parts[gcm] = pd.concat([pd.read_pickle(os.path.join(
+            path_store, entry['folder'], '{0:04d}.p'.format(x)))
+                                for x in years])
+
+    if len(parts) == 0:
+        raise ValueError("No GCM of scenario {0} in {1} has data for "
+                         "{2} to {3}.".format(cc_scenario, path_store,
+                                              epoch[0], epoch[1]))
+
+    return pd.concat(parts)
+
+# ----------- END load function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Clean the climate model outputs in a pickle and "
+        "split them into a store by scenario, GCM and year, which "
+        "training can read as its path_cc_file.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("path_cc_file", type=str,
+                        help="Pickle of climate model outputs.")
+    parser.add_argument("path_store", type=str,
+                        help="Folder to save the store in. A store "
+                        "already there is replaced.")
+    args = parser.parse_args()
+
+    index = build(args.path_cc_file, args.path_store)
+
+    for scenario, gcms in index['scenarios'].items():
+        years = sum([x['years'] for x in gcms.values()], [])
+        print("{0}: {1} GCMs, {2} GCM-years from {3} to {4}.".format(
+            scenario, len(gcms), len(years),
+            min(years) if years else '-', max(years) if years else '-'))
+
+    print("Store written to {0}.".format(args.path_store))
+
+
+if __name__ == "__main__":
+    main()
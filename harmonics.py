@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Closed-form harmonic regression for the Fourier series in fourier.py.
+
+Every function in fourier.py is a constant plus cos/sin pairs, i.e., it is
+linear in its coefficients. Instead of iterating curve_fit once per series,
+build the cos/sin design matrix once for all the periods in use, reduce it
+to its sufficient statistics (Gram matrix and cross-products with every
+target column) in one pass, and solve each requested harmonic set as a
+tiny least-squares problem on those statistics.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+
+# Periods (in hours) of the harmonics in each of the fits in fourier.py,
+# in the order in which fourier.fit expects the coefficients, i.e.,
+# a0, then (a, b) for each period in turn.
+HARMONIC_SETS = dict(tdb=(8760, 4380, 24),
+                     tdb_low=(8760, 4380),
+                     tdb_high=(24,),
+                     rh=(8760, 24),
+                     rh_low=(8760,),
+                     rh_high=(24,))
+
+# Union of all the periods above.
+ALL_PERIODS = (8760, 4380, 24)
+
+
+def design_matrix(x, periods=ALL_PERIODS):
+    '''Design matrix of a harmonic regression: a column of ones followed
+       by one cos and one sin column for each period.'''
+
+    x = np.asarray(x, dtype=float)
+
+    dmat = np.empty([x.shape[0], 1 + 2 * len(periods)])
+    dmat[:, 0] = 1
+
+    for pidx, period in enumerate(periods):
+        angle = 2 * np.pi * x / period
+        dmat[:, 1 + 2 * pidx] = np.cos(angle)
+        dmat[:, 2 + 2 * pidx] = np.sin(angle)
+
+    return dmat
+
+# ----------- END design_matrix function. -----------
+
+
+def harmonic_stats(x, ydata, periods=ALL_PERIODS):
+    '''Sufficient statistics for regressing every column of ydata (a
+       DataFrame) on the harmonics of x. Rows with missing values in any
+       column are dropped. The statistics of two stretches of data can be
+       combined by adding gram, xty, and n_obs.'''
+
+    yvals = np.asarray(ydata, dtype=float)
+    keep = np.isfinite(yvals).all(axis=1)
+
+    dmat = design_matrix(np.asarray(x)[keep], periods)
+
+    return dict(periods=tuple(periods), columns=list(ydata.columns),
+                gram=dmat.T @ dmat, xty=dmat.T @ yvals[keep, :],
+                n_obs=int(keep.sum()))
+
+# ----------- END harmonic_stats function. -----------
+
+
+def solve_harmonics(stats, fstr, periods=None):
+    '''Coefficients of the fit named fstr (see HARMONIC_SETS) from the
+       output of harmonic_stats. The target column is the part of fstr
+       before the underscore, e.g., tdb for tdb_low. Pass periods to fit
+       any subset of the periods in stats instead of a named set.'''
+
+    if periods is None:
+        periods = HARMONIC_SETS[fstr]
+
+    var = fstr.split('_')[0]
+
+    cols = [0]
+    for period in periods:
+        pidx = stats['periods'].index(period)
+        cols += [1 + 2 * pidx, 2 + 2 * pidx]
+
+    coefs = np.linalg.lstsq(
+        stats['gram'][np.ix_(cols, cols)],
+        stats['xty'][cols, stats['columns'].index(var)],
+        rcond=None)[0]
+
+    return coefs
+
+# ----------- END solve_harmonics function. -----------
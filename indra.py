@@ -5,8 +5,10 @@ Created on Fri Sep 22 16:32:27 2017
 
 @author: Parag Rastogi
 
-This script is called from the command line. It only parses the arguments
-and invokes Indra.
+This script is called from the command line, where main() parses the
+arguments and invokes indra(). indra() can also be imported and called
+from python (see vali.py), and session.py samples trained stations from
+python without reloading them for every sample.
 
 Create Synthetic Weather based on some recorded data.
 The algorithm works by creating synthetic time series over
@@ -35,14 +37,22 @@ import os
 import glob
 import pickle
 import time
-import pandas as pd
 
 # These custom functions load and clean recorded data.
 # For now, we are only concerned with ncdc and nsrdb.
 import wfileio as wf
 
+import timeindex
 from petites import setseed
 import resampling as resampling
+import profiler
+import store
+import checkpoint
+import diagnostics
+import pipeline
+import compression
+import fixedpoint
+import seedmap
 
 # Custom functions to calculate error metrics - not currently used.
 # import losses.
@@ -56,10 +66,13 @@ def indra(train=False, station_code="abc", n_samples=10,
           path_file_in="wf_in.epw", path_file_out="wf_out.epw",
           file_type="epw", store_path=".",
           climate_change=False, path_cc_file='ccfile.p',
-          cc_scenario='rcp85', epoch=None,
+          cc_scenario='rcp85', epoch=None, epochs=None,
           randseed=None, year=0, variant=0,
           arma_params=None,
-          bounds=None):
+          bounds=None, profile=False, profile_memory=False,
+          checkpoints=False, window=None, update=False, write_out=False,
+          writers=2, compress=None, bundle=False, fixed_point=False,
+          seed_map=None):
 
     # Reassign defaults if incoming list params are None
     # (i.e., nothing passed.)
@@ -86,325 +99,570 @@ def indra(train=False, station_code="abc", n_samples=10,
 
     # if isinstance(store_path, str):
 
-    if epoch is not None:
-        # These will be the files where the outputs will be stored.
-        path_model_save = os.path.join(
-            store_path, 'model_{:d}_{:d}.p'.format(epoch[0], epoch[1]))
-        # Save output time series.
-        path_syn_save = os.path.join(
-            store_path, 'syn_{:d}_{:d}.p'.format(epoch[0], epoch[1]))
-        path_counter_save = os.path.join(
-            store_path, 'counter_{:d}_{:d}.p'.format(epoch[0], epoch[1]))
-
-    else:
-        # This is for the sampling run, where a list of dataframes has
-        # been passed.
-        # These will be the files where the outputs will be stored.
-        path_model_save = os.path.join(
-            store_path, 'model.p')
-        # Save output time series.
-        path_syn_save = os.path.join(
-            store_path, 'syn.p')
-        path_counter_save = os.path.join(
-            store_path, 'counter.p')
+    # These will be the files where the outputs will be stored: the
+    # model, the output time series and the counter of samples given.
+    # With climate change, the file names carry the epoch. Several
+    # epochs are trained in one go, sharing the fitted models, and each
+    # gets its own files.
+    if epochs is None or not climate_change:
+        epochs = [epoch]
+    epoch = epochs[0]
+    store_files = store.paths(store_path, epoch)
+    path_model_save = store_files['model']
+    path_syn_save = store_files['syn']
+    path_counter_save = store_files['counter']
 
     # ----------------
 
-    if train:
-
-        # The learning/sampling functions rely on random sampling. For one
-        # run, the random seed is constant/immutable; changing it during a
-        # run would not make sense. This makes the runs repeatable -- keep
-        # track of the seed and you can reproduce exactly the same random
-        # number draws as before.
-
-        # If the user did not specify a random seed, then the generator
-        # uses the current time, in seconds since some past year, which
-        # differs between Unix and Windows. Anyhow, this is saved in the
-        # model output in case the results need to be reproduced.
-        if randseed is None:
-            randseed = int(time.time())
-
-        # Set the seed with either the input random seed or the one
-        # assigned just before.
-        setseed(randseed)
-
-        # See accompanying script "wfileio".
-        # try:
-        if os.path.isfile(path_file_in):
-            xy_train, locdata, header = wf.get_weather(station_code, path_file_in)
-
-        elif os.path.isdir(path_file_in):
-
-            list_wfiles = ([glob.glob(os.path.join(path_file_in, "*." + x))
-                            for x in WEATHER_FMTS] +
-                           [glob.glob(
-                            os.path.join(path_file_in, "*." + x.upper()))
-                            for x in WEATHER_FMTS])
-            list_wfiles = sum(list_wfiles, [])
-
-            xy_list = list()
-
-            for file in list_wfiles:
-                xy_temp, locdata, header = wf.get_weather(station_code, file)
-                xy_list.append(xy_temp)
-
-            xy_train = pd.concat(xy_list, sort=False)
-
-        print("Successfully retrieved weather data.\r\n")
+    try:
+
+        # Time every stage of the run if asked to, and account for memory
+        # use as well if asked to. The report goes to the store folder at the
+        # end of the run.
+        profile = profile or profile_memory
+        if profile:
+            profiler.enable(memory=profile_memory)
+            if update:
+                run_mode = 'update'
+            elif train:
+                run_mode = 'train'
+            else:
+                run_mode = 'sample'
+            path_profile_save = os.path.join(
+                store_path, 'profile_{0}.json'.format(run_mode))
+
+        # An update trains the station again, but only reads the data
+        # recorded since it was last trained (or updated) from path_file_in.
+        if update and not (os.path.isfile(store_files['record']) and
+                           os.path.isfile(path_model_save)):
+            print(("I could not find the model and record of station '{0}' "
+                   "in folder '{1}'. Please train it (again) before updating "
+                   "it.\r\n").format(station_code, store_path))
+            return
+
+        if update and len(epochs) > 1:
+            print(("Please update station '{0}' one epoch at a time, I was "
+                   "given {1}.\r\n").format(station_code, len(epochs)))
+            return
+
+        # The record keeps the seed files it was read from, so an update
+        # only reads the files added or changed since. Stations trained
+        # before the record kept them read every file again.
+        seed_files = checkpoint.file_stats(path_file_in)
+
+        if update:
+            with open(store_files['record'], 'rb') as open_file:
+                record = pickle.load(open_file)
+            new_files = [x for x in seed_files
+                         if x not in record.get('files', [])]
+            if len(new_files) == 0:
+                print(("There are no new or changed seed files in '{0}' "
+                       "since station '{1}' was last trained or "
+                       "updated.\r\n").format(path_file_in, station_code))
+                return
 
-        # Train the models.
-        print("Training the model. Go get a coffee or something...\r\n")
+        if train or update:
+
+            # The learning/sampling functions rely on random sampling. For one
+            # run, the random seed is constant/immutable; changing it during a
+            # run would not make sense. This makes the runs repeatable -- keep
+            # track of the seed and you can reproduce exactly the same random
+            # number draws as before.
+
+            # If the user did not specify a random seed, then the generator
+            # uses the current time, in seconds since some past year, which
+            # differs between Unix and Windows. Anyhow, this is saved in the
+            # model output in case the results need to be reproduced.
+
+            # With checkpoints, an interrupted run with the same settings is
+            # resumed, and with the same random seed unless another was asked
+            # for. See checkpoint.py.
+            if checkpoints:
+                run_config = dict(
+                    station_code=station_code,
+                    path_file_in=os.path.abspath(path_file_in),
+                    files_in=checkpoint.file_stats(path_file_in),
+                    n_samples=n_samples, arma_params=arma_params,
+                    bounds=bounds, climate_change=climate_change,
+                    epochs=epochs, window=window, update=update)
+                if climate_change:
+                    run_config.update(
+                        path_cc_file=os.path.abspath(path_cc_file),
+                        files_cc=checkpoint.file_stats(path_cc_file),
+                        cc_scenario=cc_scenario)
+                randseed = checkpoint.start(
+                    os.path.join(store_path, 'checkpoints'), run_config,
+                    randseed)
+
+            if randseed is None:
+                randseed = int(time.time())
+
+            # Set the seed with either the input random seed or the one
+            # assigned just before.
+            setseed(randseed)
+
+            # See accompanying script "wfileio". A folder of files is read
+            # in full, or only its new files for an update. With a seed
+            # map, the data is read once into that folder and mapped from
+            # there (see seedmap.py).
+            if update:
+                xy_train, locdata, header = wf.get_seed(
+                    station_code, path_file_in,
+                    names=[x[0] for x in new_files])
+            elif seed_map is None:
+                xy_train, locdata, header = wf.get_seed(station_code,
+                                                        path_file_in)
+            else:
+                with profiler.stage('seed_map'):
+                    xy_train, locdata, header = seedmap.get_seed(
+                        station_code, path_file_in, seed_map)
 
-        if climate_change:
+            print("Successfully retrieved weather data.\r\n")
 
-            cc_data = pickle.load(open(path_cc_file, 'rb'))
-            cc_data = cc_data[cc_scenario]
-            cc_models = set(cc_data.index.get_level_values(0))
+            if update and not (xy_train.index > record['last_stamp']).any():
+                print(("There is no data after {0}, the end of the recorded "
+                       "data of station '{1}', in the new seed files."
+                       "\r\n").format(record['last_stamp'], station_code))
+                checkpoint.finish()
+                return
 
-            # Pass only the relevant epochs to resampling.
-            # For some reason, some models have repetitions and NaNs.
-            # This will drop models with no data.
+            # Train the models.
+            print("Training the model. Go get a coffee or something...\r\n")
 
-            temp_dict = dict()
-            for model in cc_models:
+            if climate_change:
 
-                temp = cc_data.loc[model]
-                temp = temp.dropna(how='any')
-                # Some times there are non-unique indices, as in duplicate
-                # days. Get rid of them by taking the means.
-                temp = temp.groupby(temp.index).mean()
-                orig_index = temp.index
+                with profiler.stage('cc_data'):
+                    cc_epochs = [wf.get_cc_data(path_cc_file, cc_scenario, x)
+                                 for x in epochs]
+                cc_data = cc_epochs[0]
 
-                if orig_index.shape[0] > 0:
-                    temp_dict[model] = temp[
-                        (orig_index.year <= epoch[1]) &
-                        (orig_index.year >= epoch[0])]
+            else:
+                cc_data = None
+
+            # Hard-coded the scenario as of now - should be added as a
+            # parameter later.
+            # cc_scenario = 'rcp85'
+
+            # Store the samples in fixed point, and compress them, if asked
+            # to.
+            if fixed_point:
+                fixedpoint.enable()
+            if compress is not None:
+                compression.enable(compress)
+
+            # Write the samples out while the next ones are made, if asked
+            # to. The first file read is the master of the files written.
+            # They are compressed, or put into one zip archive, if asked to.
+            if write_out:
+                if os.path.isdir(path_file_in):
+                    masterfile = sorted(sum(
+                        [glob.glob(os.path.join(path_file_in, "*." + x))
+                         for x in WEATHER_FMTS], []))[0]
+                else:
+                    masterfile = path_file_in
+                if bundle:
+                    sample_bundle = compression.ZipBundle(
+                        os.path.splitext(path_file_out)[0])
+                else:
+                    sample_bundle = None
+                sample_pipeline = pipeline.Pipeline(
+                    pipeline.weather_writer(locdata, station_code, header,
+                                            file_type, path_file_out,
+                                            masterfile, codec=compress,
+                                            bundle=sample_bundle),
+                    writers=writers)
+                sample_pipeline.start()
+            else:
+                sample_pipeline = None
+
+            if update:
+
+                with open(path_model_save, 'rb') as open_file:
+                    models = pickle.load(open_file)
+
+                # Start from the saved models and summary of the record.
+                ffit, selmdl, xout = resampling.updater(
+                    xy_train, record, models, n_samples=n_samples,
+                    picklepath=path_syn_save,
+                    arma_params=arma_params,
+                    bounds=bounds, cc_data=cc_data, randseed=randseed,
+                    window=window, recordpath=store_files['record'],
+                    pipeline=sample_pipeline, seed_files=seed_files)
+                xouts = [xout]
+
+            elif len(epochs) > 1:
+
+                # Fit the models once and generate the samples of every
+                # epoch from them.
+                epoch_files = [store.paths(store_path, x) for x in epochs]
+                ffit, selmdl, xouts = resampling.epochs_trainer(
+                    xy_train, n_samples=n_samples,
+                    picklepaths=[x['syn'] for x in epoch_files],
+                    arma_params=arma_params,
+                    bounds=bounds, cc_epochs=cc_epochs, randseed=randseed,
+                    window=window,
+                    recordpaths=[x['record'] for x in epoch_files],
+                    pipeline=sample_pipeline, seed_files=seed_files)
 
-            # import ipdb; ipdb.set_trace()
+            else:
 
-            cc_data = pd.concat(temp_dict)
+                # Call resampling with null selmdl and ffit, since those
+                # haven"t been trained yet.
+                ffit, selmdl, xout = resampling.trainer(
+                    xy_train, n_samples=n_samples,
+                    picklepath=path_syn_save,
+                    arma_params=arma_params,
+                    bounds=bounds, cc_data=cc_data, randseed=randseed,
+                    window=window, recordpath=store_files['record'],
+                    pipeline=sample_pipeline, seed_files=seed_files)
+                xouts = [xout]
+
+            if sample_pipeline is not None:
+                with profiler.stage('write_out'):
+                    sample_pipeline.close()
+                    if sample_bundle is not None:
+                        sample_bundle.close()
+                        print("Samples written to {0}.\r\n".format(
+                            sample_bundle.path))
+
+            # Every epoch gets a copy of the models, so that it can be
+            # sampled (and updated) on its own.
+            for this_epoch, xout in zip(epochs, xouts):
+
+                epoch_files = store.paths(store_path, this_epoch)
+
+                with profiler.stage('save_model'):
+                    store.save_model(epoch_files['model'], selmdl, ffit,
+                                     randseed)
+
+                with profiler.stage('save_stats'):
+                    store.save_stats(epoch_files['stats'], xout)
+
+                # Check that the samples keep the temporal structure of the
+                # recorded data.
+                with profiler.stage('diagnostics'):
+                    diag = store.save_diagnostics(epoch_files['diagnostics'],
+                                                  selmdl, ffit, xout)
+                if this_epoch is None:
+                    print("Temporal diagnostics of the samples:\r\n"
+                          "{0}\r\n".format(
+                              diagnostics.summary(diag).round(3).to_string()))
+                else:
+                    print(("Temporal diagnostics of the samples of {0} to "
+                           "{1}:\r\n{2}\r\n").format(
+                               this_epoch[0], this_epoch[1],
+                               diagnostics.summary(diag).round(3).to_string()))
+
+                # Save counter.
+                store.save_counter(epoch_files['counter'], n_samples,
+                                   randseed)
+
+            # Everything is saved, so the checkpoints are not needed anymore.
+            checkpoint.finish()
+
+            print(("I've saved the model for station '{0}'. "
+                   "You can now ask me for samples in folder '{1}'."
+                   "\r\n").format(station_code, store_path))
 
         else:
-            cc_data = None
-
-        # Hard-coded the scenario as of now - should be added as a
-        # parameter later.
-        # cc_scenario = 'rcp85'
-
-        # Call resampling with null selmdl and ffit, since those
-        # haven"t been trained yet.
-        ffit, selmdl, _ = resampling.trainer(
-            xy_train, n_samples=n_samples,
-            picklepath=path_syn_save,
-            arma_params=arma_params,
-            bounds=bounds, cc_data=cc_data)
-
-        # The non-seasonal order of the model. This exists in both
-        # ARIMA and SARIMAX models, so it has to exist in the output
-        # of resampling.
-        order = [(p.model.k_ar, 0, p.model.k_ma) for p in selmdl]
-        # Also the endogenous variable.
-        endog = [p.model.endog for p in selmdl]
-
-        params = [p.params for p in selmdl]
-
-        try:
-            # Try to find the seasonal order. If it exists, save the
-            # sarimax model. This should almost always be the case.
-            seasonal_order = [
-                (int(mdl.model.k_seasonal_ar / mdl.model.seasonal_periods),
-                 0,
-                 int(mdl.model.k_seasonal_ma / mdl.model.seasonal_periods),
-                 mdl.model.seasonal_periods)
-                for mdl in selmdl]
-
-            arma_save = dict(order=order, params=params,
-                             seasonal_order=seasonal_order,
-                             ffit=ffit, endog=endog,
-                             randseed=randseed)
-
-        except Exception:
-            # Otherwise, ask for forgiveness and save the ARIMA model.
-            arma_save = dict(order=order, params=params, endog=endog,
-                             ffit=ffit, randseed=randseed)
-
-        with open(path_model_save, "wb") as open_file:
-            pickle.dump(arma_save, open_file)
-
-        # Save counter.
-        csave = dict(n_samples=n_samples, randseed=randseed, counter=0)
-        # with open(path_counter_save, "wb") as open_file:
-        pickle.dump(csave, open(path_counter_save, "wb"))
-
-        print(("I've saved the model for station '{0}'. "
-               "You can now ask me for samples in folder '{1}'."
-               "\r\n").format(station_code, store_path))
 
-    else:
+            # Call the functions in sampling mode.
 
-        # Call the functions in sampling mode.
+            # The output, xout, is a numpy nd-array with the standard
+            # columns ("month", "day", "hour", "tdb", "tdp", "rh",
+            # "ghi", "dni", "dhi", "wspd", "wdr")
 
-        # The output, xout, is a numpy nd-array with the standard
-        # columns ("month", "day", "hour", "tdb", "tdp", "rh",
-        # "ghi", "dni", "dhi", "wspd", "wdr")
+            # In this MC framework, the "year" of weather data is meaningless.
+            # If climate change models or UHI models are added, the years will
+            # mean something. For now, any number will do.
 
-        # In this MC framework, the "year" of weather data is meaningless.
-        # If climate change models or UHI models are added, the years will
-        # mean something. For now, any number will do.
+            if os.path.isdir(path_file_in):
 
-        # Load counter.
-        csave = pickle.load(open(path_counter_save, 'rb'))
+                list_wfiles = [glob.glob(os.path.join(path_file_in, "*." + x))
+                               for x in WEATHER_FMTS]
+                list_wfiles = sum(list_wfiles, [])
 
-        if climate_change:
-            sample = resampling.sampler(
-                picklepath=path_syn_save, year=year, n=variant)
+            else:
+                list_wfiles = [path_file_in]
+
+            with profiler.stage('get_weather'):
+                _, locdata, header = wf.get_weather(
+                    station_code, list_wfiles[0])
+
+            if file_type in wf.ensemble_formats:
+                # All the samples go into one binary file, so the counter of
+                # samples handed out is left alone.
+                with profiler.stage('give_ensemble'):
+                    wf.give_ensemble(compression.load_pickle(path_syn_save),
+                                     locdata, station_code, path_file_out,
+                                     file_type=file_type, window=window)
+
+                if profile:
+                    profiler.report(path_profile_save)
+                    profiler.disable()
+                return
 
-        else:
-            # Sample number has not exceeded number of samples.
-            if csave['counter'] < csave['n_samples']:
+            # Load counter.
+            csave = pickle.load(open(path_counter_save, 'rb'))
+
+            if climate_change:
                 sample = resampling.sampler(
-                    picklepath=path_syn_save, counter=csave['counter'])
-                csave['counter'] += 1
-                pickle.dump(csave, open(path_counter_save, "wb"))
+                    picklepath=path_syn_save, year=year, n=variant)
+
             else:
-                print('You are asking me for more samples than I have.' +
-                      'You generated {:d} '.format(csave['n_samples']) +
-                      'samples, I have given you ' +
-                      '{:d} samples.'.format(csave['counter']))
-                print('Next call will restart from the first sample.')
-                csave['counter'] = 0
-                pickle.dump(csave, open(path_counter_save, "wb"))
-                return
+                # Sample number has not exceeded number of samples.
+                if csave['counter'] < csave['n_samples']:
+                    sample = resampling.sampler(
+                        picklepath=path_syn_save, counter=csave['counter'])
+                    csave['counter'] += 1
+                    pickle.dump(csave, open(path_counter_save, "wb"))
+                else:
+                    print('You are asking me for more samples than I have.' +
+                          'You generated {:d} '.format(csave['n_samples']) +
+                          'samples, I have given you ' +
+                          '{:d} samples.'.format(csave['counter']))
+                    print('Next call will restart from the first sample.')
+                    csave['counter'] = 0
+                    pickle.dump(csave, open(path_counter_save, "wb"))
+                    return
+
+            # Only write out the window, if one was asked for. The sample can
+            # be a whole year or a window itself.
+            if window is not None and sample is not None:
+                hours = timeindex.window_hours(window)
+                sample_hours = timeindex.noleap_hours(sample.index)
+                sample = sample[(sample_hours >= hours.start) &
+                                (sample_hours < hours.stop)]
+                if sample.shape[0] == 0:
+                    print("The samples in {0} do not cover the window "
+                          "{1}.".format(path_syn_save, window))
+                    return
+
+            # Save / write-out synthetic time series.
+            with profiler.stage('give_weather'):
+                path_written = wf.give_weather(
+                    sample, locdata, station_code, header,
+                    file_type=file_type, path_file_out=path_file_out,
+                    masterfile=list_wfiles[0])
+
+            if compress is not None and path_written is not None:
+                with profiler.stage('compress'):
+                    compression.compress_file(path_written, compress)
+
+        if profile:
+            profiler.report(path_profile_save)
+            profiler.disable()
+            print("Timing report written to {0}.".format(path_profile_save))
+
+    finally:
+        # Samples are only stored in fixed point, or compressed, by the
+        # runs that ask for it, so a later run in the same process starts
+        # with both off.
+        fixedpoint.disable()
+        compression.disable()
+        # A run that failed keeps its checkpoints, for the next run to
+        # resume from, but does not leave checkpointing on.
+        checkpoint.stop()
+        # Nor profiling, whose report is only written by a run that ends
+        # normally.
+        profiler.disable()
+
+
+def main():
+
+    # Define a parser.
+    parser = argparse.ArgumentParser(
+        description="This is INDRA, a generator of synthetic weather " +
+        "time series. This function both 'learns' the structure of data " +
+        "and samples from the learnt model. Both run modes need 'seed' " +
+        "data, i.e., some input weather data.\r\n", prog='INDRA',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--train", type=int, choices=[0, 1], default=0,
+                        help="Enter 0 for no seed data (sampling mode), " +
+                        "or 1 if you are passing seed data (training or " +
+                        "initalisation mode).")
+    parser.add_argument("--station_code", type=str, default="abc",
+                        help="Make up a station code. " +
+                        "If you are not passing seed data, and want me to " +
+                        "pick up a saved model, please use the station code" +
+                        " of the saved model.")
+    parser.add_argument("--n_samples", type=int, default=10,
+                        help="How many samples do you want out?")
+    parser.add_argument("--path_file_in", type=str, help="Path to a weather " +
+                        "file (seed file).", default="wf_in.a")
+    parser.add_argument("--path_file_out", type=str,
+                        help="Path to where the synthetic data will be " +
+                        "written. If you ask for more than one sample, I " +
+                        "will append an integer to the name.",
+                        default="wf_out.a")
+    parser.add_argument("--file_type", type=str, default="espr",
+                        help=("What kind of input weather file "
+                              "are you giving me? Default is the ESP-r "
+                              "ascii format [espr]. For now, I can read EPW "
+                              "[epw] and ESP-r ascii files. If you pass a "
+                              "plain csv [csv] or python pickle [py] file, "
+                              "it must contain a table with the requisite "
+                              "data in the correct order. See file "
+                              "data_in_spec.txt for the format. In sampling "
+                              "mode, [feather] or [npz] writes all the "
+                              "samples into one binary file, see "
+                              "wfileio.give_ensemble."))
+    # Indra needs the data to be a numpy nd-array arranged exactly so:
+    # month, day of year, hour, tdb, tdp, rh, ghi, dni, dhi, wspd, wdr
+    parser.add_argument("--store_path", type=str, default="SyntheticWeather",
+                        help="Path to the folder where all outputs will go." +
+                        " Default behaviour is to create a folder in the " +
+                        "present working directory called SyntheticWeather.")
+    parser.add_argument("--climate_change", type=int, choices=[0, 1],
+                        default=0,
+                        help="Enter 0 to not include climate change " +
+                        "models, or 1 to do so. If you want to use a CC " +
+                        "model, you have to pass a path to the file " +
+                        "containing those outputs.")
+    parser.add_argument("--epochs", type=str, default=None,
+                        help='Future epochs (decades usually) if using a ' +
+                        'climate model to add a signal that shifts the ' +
+                        'current distribution. Enter as pairs of numbers ' +
+                        'separated by commas, e.g., 2051,2060,2061,2070. ' +
+                        'The epochs are trained together, sharing the ' +
+                        'fitted models, and samples are given from the first.')
+    parser.add_argument("--path_cc_file", type=str, default="ccfile.p",
+                        help="Path to the file containing CC model outputs.")
+    # parser.add_argument("--station_coordinates", type=str,
+    #                     default="[0, 0, 0]",
+    #                     help="Station latitude, longitude, altitude. " +
+    #                     "Not currently used.")
+    parser.add_argument("--randseed", type=int, default=42,
+                        help="Set the seed for this sampling " +
+                        "run. If you don't know what this " +
+                        "is, don't worry. The default is 42. Obviously.")
+    parser.add_argument("--arma_params", type=str, default="[2,2,1,1,24]",
+                        help=("A list of UPPER LIMITS of the number of SARMA "
+                              "terms [AR, MA, Seasonal AR, Seasonal MA, "
+                              "Seasonality] to use in the model. Input should "
+                              "look like a python list, i.e., a,b,c , WITHOUT "
+                              "SPACES. If you don't know what this is, " +
+                              "don't worry. The default is 2,2,1,1,24. "
+                              "The default frequency of Indra is hours, so "
+                              "seasonality should be declared in hours."))
+    parser.add_argument("--profile", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to time each stage of the run. A JSON " +
+                        "report (profile_train.json or profile_sample.json) " +
+                        "is written to the store folder.")
+    parser.add_argument("--profile_memory", type=int, choices=[0, 1],
+                        default=0,
+                        help="Enter 1 to also record the peak and retained " +
+                        "memory of each stage, and the largest allocation " +
+                        "sites, in the --profile report. This slows the run " +
+                        "down, so use it only to size jobs.")
+    parser.add_argument("--bounds", type=str, default="[1,99]",
+                        help=("Lower and upper bound percentile values to "
+                              "use for cleaning the synthetic data. Input "
+                              "should look like a python list, i.e., [a,b,c], "
+                              "WITHOUT SPACES. The defaults bounds are the "
+                              "1 and 99 percentiles, i.e., [1, 99]."))
+    parser.add_argument("--checkpoints", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to switch on checkpoints. With " +
+                        "checkpoints, every finished stage of training is " +
+                        "saved in a 'checkpoints' folder in the store " +
+                        "folder, and training again with the same settings " +
+                        "resumes an interrupted run. The folder is deleted " +
+                        "when training finishes. They cost disk space and " +
+                        "time, so only use them for long runs.")
+    parser.add_argument("--window", type=str, default=None,
+                        help="Only generate (in training mode) or write out " +
+                        "(in sampling mode) a window of the year, given as " +
+                        "first and last day MM-DD,MM-DD, e.g., 06-01,08-31. " +
+                        "Windows are written out as EPW or CSV files, with " +
+                        "the DATA PERIODS of EPW files set to the window.")
+    parser.add_argument("--write_out", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to also write every sample out as a " +
+                        "weather file of file_type while training, named " +
+                        "after path_file_out, as soon as it is made. The " +
+                        "files are written by background threads while the " +
+                        "next samples are made.")
+    parser.add_argument("--writers", type=int, default=2,
+                        help="Number of threads that write samples out with " +
+                        "--write_out 1.")
+    parser.add_argument("--compress", type=str, default="none",
+                        choices=["none"] + list(compression.CODECS),
+                        help="Compress the samples saved in the store (in " +
+                        "training mode) and the weather files written out " +
+                        "(in both modes) with gzip or lzma. Compressed " +
+                        "files are read back as they are.")
+    parser.add_argument("--bundle", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to put all the files written with " +
+                        "--write_out 1 into one zip archive, named after " +
+                        "path_file_out, instead of compressing them one by " +
+                        "one.")
+    parser.add_argument("--fixed_point", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to store the samples as 16-bit " +
+                        "integers with a scale and offset per variable, " +
+                        "like ESP-r files, which takes a quarter of the " +
+                        "space of float64. Values are read back within " +
+                        "half a scale, e.g., 0.0025 C, see fixedpoint.py.")
+    parser.add_argument("--seed_map", type=str, default=None,
+                        help="Folder to keep a memory-mapped copy of the " +
+                        "seed data in. The seed files are read into it " +
+                        "once, and training works off the mapped copy, " +
+                        "which runs on the same host share. It is read " +
+                        "again if the seed files change.")
+    parser.add_argument("--update", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to update a trained station with data " +
+                        "recorded since it was trained, in path_file_in. " +
+                        "Only the seed files added or changed since are " +
+                        "read, and only their data after the end of the " +
+                        "earlier data is used. The fourier series are " +
+                        "refitted from running sums, and the SARMA models " +
+                        "keep their orders unless the new data has " +
+                        "drifted. New samples replace the old ones.")
+
+    args = parser.parse_args()
+
+    train = bool(args.train)
+    station_code = args.station_code.lower()
+    n_samples = args.n_samples
+    path_file_in = args.path_file_in
+    path_file_out = args.path_file_out
+    file_type = args.file_type
+    store_path = args.store_path
+    # station_coordinates = [float(x.strip("[").strip("]"))
+    #                        for x in args.station_coordinates.split(",")]
+    climate_change = args.climate_change
+    epochs = args.epochs
+    path_cc_file = args.path_cc_file
+    randseed = args.randseed
+    arma_params = [int(x.strip("[").strip("]"))
+                   for x in args.arma_params.split(",")]
+    bounds = [float(x.strip("[").strip("]")) for x in args.bounds.split(",")]
+    profile = bool(args.profile)
+    profile_memory = bool(args.profile_memory)
+    checkpoints = bool(args.checkpoints)
+    window = None if args.window is None else args.window.split(",")
+    update = bool(args.update)
+    write_out = bool(args.write_out)
+    writers = args.writers
+    compress = None if args.compress == "none" else args.compress
+    bundle = bool(args.bundle)
+    fixed_point = bool(args.fixed_point)
+    seed_map = args.seed_map
+
+    if args.epochs is None and climate_change:
+        epochs = [[2051, 2060]]
+    elif args.epochs is not None and climate_change:
+        list_years = args.epochs.split(",")
+        epochs = [[int(x), int(y)]
+                  for x, y in zip(list_years[0::2], list_years[1::2])]
+    else:
+        epochs = None
 
-        if os.path.isdir(path_file_in):
+    print("\r\nInvoking indra for {0}.\r\n".format(station_code))
 
-            list_wfiles = [glob.glob(os.path.join(path_file_in, "*." + x))
-                           for x in WEATHER_FMTS]
-            list_wfiles = sum(list_wfiles, [])
+    if store_path == "SyntheticWeather":
+        store_path = store_path + '_' + station_code
 
-        else:
-            list_wfiles = [path_file_in]
-
-        _, locdata, header = wf.get_weather(            station_code, list_wfiles[0])
-
-        # Save / write-out synthetic time series.
-        wf.give_weather(sample, locdata, station_code, header,
-                        file_type=file_type,
-                        path_file_out=path_file_out,
-                        masterfile=list_wfiles[0])
-
-
-
-# Define a parser.
-PARSER = argparse.ArgumentParser(
-    description="This is INDRA, a generator of synthetic weather " +
-    "time series. This function both 'learns' the structure of data " +
-    "and samples from the learnt model. Both run modes need 'seed' " +
-    "data, i.e., some input weather data.\r\n", prog='INDRA',
-    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-
-PARSER.add_argument("--train", type=int, choices=[0, 1], default=0,
-                    help="Enter 0 for no seed data (sampling mode), " +
-                    "or 1 if you are passing seed data (training or " +
-                    "initalisation mode).")
-PARSER.add_argument("--station_code", type=str, default="abc",
-                    help="Make up a station code. " +
-                    "If you are not passing seed data, and want me to " +
-                    "pick up a saved model, please use the station code" +
-                    " of the saved model.")
-PARSER.add_argument("--n_samples", type=int, default=10,
-                    help="How many samples do you want out?")
-PARSER.add_argument("--path_file_in", type=str, help="Path to a weather " +
-                    "file (seed file).", default="wf_in.a")
-PARSER.add_argument("--path_file_out", type=str, help="Path to where the " +
-                    "synthetic data will be written. If you ask for more " +
-                    "than one sample, I will append an integer to the name.",
-                    default="wf_out.a")
-PARSER.add_argument("--file_type", type=str, default="espr",
-                    help=("What kind of input weather file "
-                          "are you giving me? Default is the ESP-r ascii "
-                          "format [espr]. For now, I can read EPW [epw] and "
-                          "ESP-r ascii files. If you pass a plain csv [csv] "
-                          "or python pickle [py] file, it must contain a "
-                          "table with the requisite data in the correct "
-                          "order. See file data_in_spec.txt for the format."))
-# Indra needs the data to be a numpy nd-array arranged exactly so:
-# month, day of year, hour, tdb, tdp, rh, ghi, dni, dhi, wspd, wdr
-PARSER.add_argument("--store_path", type=str, default="SyntheticWeather",
-                    help="Path to the folder where all outputs will go." +
-                    " Default behaviour is to create a folder in the " +
-                    "present working directory called SyntheticWeather.")
-PARSER.add_argument("--climate_change", type=int, choices=[0, 1], default=0,
-                    help="Enter 0 to not include climate change models, or" +
-                    " 1 to do so. If you want to use a CC model, you have" +
-                    " to pass a path to the file containing those outputs.")
-PARSER.add_argument("--epochs", type=str, default=None,
-                    help='Future epochs (decades usually) if using a ' +
-                    'climate model to add a signal that shifts the ' +
-                    'current distribution. Enter as pairs of numbers ' +
-                    'separated by commas, e.g., 2015, 2060')
-PARSER.add_argument("--path_cc_file", type=str, default="ccfile.p",
-                    help="Path to the file containing CC model outputs.")
-# PARSER.add_argument("--station_coordinates", type=str, default="[0, 0, 0]",
-#                     help="Station latitude, longitude, altitude. " +
-#                     "Not currently used.")
-PARSER.add_argument("--randseed", type=int, default=42,
-                    help="Set the seed for this sampling " +
-                    "run. If you don't know what this " +
-                    "is, don't worry. The default is 42. Obviously.")
-PARSER.add_argument("--arma_params", type=str, default="[2,2,1,1,24]",
-                    help=("A list of UPPER LIMITS of the number of SARMA "
-                          "terms [AR, MA, Seasonal AR, Seasonal MA, "
-                          "Seasonality] to use in the model. Input should "
-                          "look like a python list, i.e., a,b,c , WITHOUT "
-                          "SPACES. If you don't know what this is, " +
-                          "don't worry. The default is 2,2,1,1,24. "
-                          "The default frequency of Indra is hours, so "
-                          "seasonality should be declared in hours."))
-PARSER.add_argument("--bounds", type=str, default="[1,99]",
-                    help=("Lower and upper bound percentile values to "
-                          "use for cleaning the synthetic data. Input "
-                          "should look like a python list, i.e., [a,b,c], "
-                          "WITHOUT SPACES. The defaults bounds are the "
-                          "1 and 99 percentiles, i.e., [1, 99]."))
-
-ARGS = PARSER.parse_args()
-
-train = bool(ARGS.train)
-station_code = ARGS.station_code.lower()
-n_samples = ARGS.n_samples
-path_file_in = ARGS.path_file_in
-path_file_out = ARGS.path_file_out
-file_type = ARGS.file_type
-store_path = ARGS.store_path
-# station_coordinates = [float(x.strip("[").strip("]"))
-#                        for x in ARGS.station_coordinates.split(",")]
-climate_change = ARGS.climate_change
-epochs = ARGS.epochs
-path_cc_file = ARGS.path_cc_file
-randseed = ARGS.randseed
-arma_params = [int(x.strip("[").strip("]"))
-               for x in ARGS.arma_params.split(",")]
-bounds = [float(x.strip("[").strip("]")) for x in ARGS.bounds.split(",")]
-
-if ARGS.epochs is None and climate_change:
-    epochs = [2051, 2060]
-elif ARGS.epochs is not None and climate_change:
-    list_years = ARGS.epochs.split(",")
-    epochs = [[int(x), int(y)]
-              for x, y in zip(list_years[0::2], list_years[1::2])]
-else:
-    epochs = None
-
-
-print("\r\nInvoking indra for {0}.\r\n".format(station_code))
-
-if store_path == "SyntheticWeather":
-    store_path = store_path + '_' + station_code
-
-# Call indra using the processed arguments.
-if __name__ == "__main__":
+    # Call indra using the processed arguments.
     indra(train, station_code=station_code,
           n_samples=n_samples,
           path_file_in=path_file_in,
@@ -413,6 +671,15 @@ if __name__ == "__main__":
           store_path=store_path,
           climate_change=climate_change,
           path_cc_file=path_cc_file,
+          epochs=epochs,
           randseed=randseed,
           arma_params=arma_params,
-          bounds=bounds)
+          bounds=bounds, profile=profile,
+          profile_memory=profile_memory, checkpoints=checkpoints,
+          window=window, update=update, write_out=write_out,
+          writers=writers, compress=compress, bundle=bundle,
+          fixed_point=fixed_point, seed_map=seed_map)
+
+
+if __name__ == "__main__":
+    main()
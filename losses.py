@@ -3,6 +3,10 @@ import numpy as np
 Calculate loss functions for incoming vectors of error.
 Add any error functions below - just remember to explicitly
 import them in the script you are calling them from.
+
+The functions without 'loss' in their name work on whole ensembles at
+once: they take arrays with one row per sample and return one value per
+row (see skill.py).
 """
 
 
@@ -19,3 +23,51 @@ def rmseloss(x1, *args):
 
 def maeloss(e):
     return np.abs(e.mean())
+
+
+def rmse(x, y, axis=-1):
+    '''Root mean square error between x and y along axis, ignoring
+       missing values. y is broadcast against x, e.g., one recorded
+       series against many samples.'''
+    return np.sqrt(np.nanmean((x - y) ** 2, axis=axis))
+
+
+def mae(x, y, axis=-1):
+    '''Mean absolute error between x and y along axis, ignoring missing
+       values.'''
+    return np.nanmean(np.abs(x - y), axis=axis)
+
+
+def ks_distance(samples, reference):
+    '''Kolmogorov-Smirnov distance between the empirical distribution of
+       every row of samples, [samples, values], and that of the 1-D array
+       reference. Both are sorted here, and ties (e.g., the zeros of
+       solar radiation at night) are counted correctly.'''
+
+    samples = np.sort(samples, axis=-1)
+    reference = np.sort(reference)
+    n_values = samples.shape[-1]
+    position = np.arange(0, n_values)
+
+    # Number of values of the row below (left) and up to (right) each
+    # value, the same for all the values in a run of ties.
+    is_first = np.ones(samples.shape, dtype=bool)
+    is_first[:, 1:] = samples[:, 1:] != samples[:, :-1]
+    is_last = np.ones(samples.shape, dtype=bool)
+    is_last[:, :-1] = is_first[:, 1:]
+
+    left = np.maximum.accumulate(
+        np.where(is_first, position, -1), axis=-1)
+    right = np.minimum.accumulate(
+        np.where(is_last, position + 1, n_values + 1)[:, ::-1],
+        axis=-1)[:, ::-1]
+
+    # Distribution of the reference at, and just below, each value.
+    ref_left = np.searchsorted(reference, samples, side='left')
+    ref_right = np.searchsorted(reference, samples, side='right')
+
+    # The largest distance between two step functions is found at, or
+    # just below, one of the steps of the samples.
+    return np.maximum(
+        np.max(right / n_values - ref_right / len(reference), axis=-1),
+        np.max(ref_left / len(reference) - left / n_values, axis=-1))
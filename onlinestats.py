@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics of an ensemble of samples, gathered one batch at a time.
+
+petites.wstats needs all the data in one DataFrame. EnsembleStats instead
+keeps, for every variable and every (month, hour of day) group, a few
+running sums that are updated with each batch of samples:
+    - count, mean and sum of squared deviations, merged batch by batch
+      with the pairwise update of Chan et al., of which Welford's update
+      is the one-value case,
+    - minimum and maximum,
+    - a histogram with fixed bins, from which quantiles are interpolated.
+The memory used does not depend on the number of samples, so a whole
+ensemble can be summarised in one pass over it. Two EnsembleStats with
+the same bins can be merged, e.g., when samples were summarised in
+separate processes. Quantiles are accurate to about a bin width (see
+RANGES and N_BINS).
+
+Statistics are saved with the samples when a station is trained
+(store.paths), and can be computed from a stored or exported ensemble
+from the command line:
+    python onlinestats.py gen/syn.p --by month --out gen_stats.csv
+
+@author: Parag Rastogi
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import compression
+import ensemble
+
+# Range of the histogram of each variable. Values outside it are counted
+# in the first or last bin, so only quantiles in the tails beyond these
+# ranges lose accuracy.
+RANGES = dict(tdb=(-60., 60.), tdp=(-70., 40.), rh=(0., 100.),
+              ghi=(0., 1400.), dni=(0., 1400.), dhi=(0., 1000.),
+              wspd=(0., 60.), wdr=(0., 360.), atmpr=(50000., 110000.))
+
+# Number of histogram bins per variable and group.
+N_BINS = 600
+
+# Number of (month, hour) groups.
+N_GROUPS = 12 * 24
+
+# Statistics that summary can report, and the probability of each quantile.
+STATS = ('count', 'mean', 'std', 'min', 'max', 'q1', 'med', 'q3')
+QUANTILES = dict(q1=0.25, med=0.5, q3=0.75)
+
+# Samples handed to update at a time by add_ensemble.
+CHUNK = 64
+
+
+def group_of(index):
+    '''Group of every time stamp in a datetime index: (month - 1) * 24 +
+       hour of day.'''
+
+    return ((np.asarray(index.month) - 1) * 24 +
+            np.asarray(index.hour)).astype(np.intp)
+
+# ----------- END group_of function. -----------
+
+
+class EnsembleStats(object):
+    '''Running statistics of some variables per (month, hour) group. The
+       variables are those in RANGES unless given, and the ranges of the
+       histograms can be given for variables not in RANGES.'''
+
+    def __init__(self, variables=None, ranges=None, n_bins=N_BINS):
+
+        if variables is None:
+            variables = list(RANGES)
+
+        self.ranges = dict(RANGES)
+        if ranges is not None:
+            self.ranges.update(ranges)
+
+        missing = [x for x in variables if x not in self.ranges]
+        if missing:
+            raise ValueError("Please give the range of the histogram of "
+                             "{0}.".format(", ".join(missing)))
+
+        self.variables = list(variables)
+        self.n_bins = n_bins
+
+        self.count = dict()
+        self.mean = dict()
+        self.m2 = dict()
+        self.min = dict()
+        self.max = dict()
+        self.hist = dict()
+
+        for var in self.variables:
+            self.count[var] = np.zeros(N_GROUPS, dtype=np.int64)
+            self.mean[var] = np.zeros(N_GROUPS)
+            self.m2[var] = np.zeros(N_GROUPS)
+            self.min[var] = np.full(N_GROUPS, np.inf)
+            self.max[var] = np.full(N_GROUPS, -np.inf)
+            self.hist[var] = np.zeros([N_GROUPS, n_bins], dtype=np.int64)
+
+        self.n_samples = 0
+
+    def edges(self, var):
+        '''Edges of the histogram bins of var.'''
+        low, high = self.ranges[var]
+        return np.linspace(low, high, self.n_bins + 1)
+
+    def _merge(self, var, count, mean, m2):
+        '''Merge the count, mean and squared deviations of a batch into
+           those of var, group by group.'''
+
+        total = self.count[var] + count
+        seen = total > 0
+        delta = mean - self.mean[var]
+
+        weight = np.zeros(N_GROUPS)
+        weight[seen] = count[seen] / total[seen]
+
+        self.mean[var] = self.mean[var] + delta * weight
+        self.m2[var] = (self.m2[var] + m2 +
+                        delta ** 2 * self.count[var] * weight)
+        self.count[var] = total
+
+    def update(self, groups, values):
+        '''Add a batch of values. groups holds the group of every value
+           (see group_of), and values is a dictionary of arrays of the
+           same shape per variable. Missing values (NaN) are skipped.'''
+
+        groups = np.ravel(groups)
+
+        for var in self.variables:
+
+            if var not in values:
+                continue
+
+            data = np.ravel(np.asarray(values[var], dtype=np.float64))
+            valid = np.isfinite(data)
+            data = data[valid]
+            these_groups = groups[valid]
+
+            count = np.bincount(these_groups, minlength=N_GROUPS)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.bincount(these_groups, weights=data,
+                                   minlength=N_GROUPS) / count
+            mean[count == 0] = 0.
+            m2 = np.bincount(these_groups,
+                             weights=(data - mean[these_groups]) ** 2,
+                             minlength=N_GROUPS)
+
+            self._merge(var, count, mean, m2)
+
+            np.minimum.at(self.min[var], these_groups, data)
+            np.maximum.at(self.max[var], these_groups, data)
+
+            low, high = self.ranges[var]
+            bins = np.clip(((data - low) / (high - low) *
+                            self.n_bins).astype(np.intp),
+                           0, self.n_bins - 1)
+            self.hist[var] += np.bincount(
+                these_groups * self.n_bins + bins,
+                minlength=N_GROUPS * self.n_bins).reshape(
+                    [N_GROUPS, self.n_bins])
+
+    def add_sample(self, sample):
+        '''Add one sample, a DataFrame with a datetime index.'''
+
+        self.update(group_of(sample.index),
+                    dict([(var, sample[var].values)
+                          for var in self.variables if var in sample]))
+        self.n_samples += 1
+
+    def add_ensemble(self, xout, chunk=CHUNK):
+        '''Add every sample of an Ensemble, of a list of samples, or of an
+           ensemble read with wfileio.get_ensemble, chunk samples at a
+           time.'''
+
+        n_samples, columns, months, hours = ensemble.describe(xout)
+        groups = (months - 1) * 24 + hours
+        variables = [x for x in self.variables if x in columns]
+
+        for first in range(0, n_samples, chunk):
+            last = min(first + chunk, n_samples)
+            self.update(np.tile(groups, last - first),
+                        dict([(var, ensemble.block(xout, var, first, last))
+                              for var in variables]))
+            self.n_samples += last - first
+
+    def merge(self, other):
+        '''Add the statistics of another EnsembleStats with the same
+           variables and bins.'''
+
+        for var in self.variables:
+
+            if (var not in other.variables or
+                    self.n_bins != other.n_bins or
+                    self.ranges[var] != other.ranges[var]):
+                raise ValueError("Only statistics with the same variables "
+                                 "and bins can be merged.")
+
+            self._merge(var, other.count[var], other.mean[var],
+                        other.m2[var])
+            self.min[var] = np.minimum(self.min[var], other.min[var])
+            self.max[var] = np.maximum(self.max[var], other.max[var])
+            self.hist[var] = self.hist[var] + other.hist[var]
+
+        self.n_samples += other.n_samples
+
+    def _grouped(self, var, by):
+        '''count, mean, m2, min, max and histogram of var, with the
+           (month, hour) groups merged into those of `by`.'''
+
+        if by == 'month_hour':
+            return (self.count[var], self.mean[var], self.m2[var],
+                    self.min[var], self.max[var], self.hist[var])
+
+        if by == 'month':
+            labels = np.arange(0, N_GROUPS) // 24
+        elif by == 'hour':
+            labels = np.arange(0, N_GROUPS) % 24
+        else:
+            labels = np.zeros(N_GROUPS, dtype=np.intp)
+
+        n_labels = labels.max() + 1
+
+        count = np.bincount(labels, weights=self.count[var],
+                            minlength=n_labels)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(labels, weights=self.count[var] *
+                               self.mean[var], minlength=n_labels) / count
+        mean[count == 0] = 0.
+        # Squared deviations within groups and between group means.
+        m2 = np.bincount(
+            labels, weights=(self.m2[var] + self.count[var] *
+                             (self.mean[var] - mean[labels]) ** 2),
+            minlength=n_labels)
+
+        low = np.full(n_labels, np.inf)
+        high = np.full(n_labels, -np.inf)
+        np.minimum.at(low, labels, self.min[var])
+        np.maximum.at(high, labels, self.max[var])
+
+        hist = np.zeros([n_labels, self.n_bins], dtype=np.int64)
+        np.add.at(hist, labels, self.hist[var])
+
+        return count, mean, m2, low, high, hist
+
+    def quantile(self, var, q, by='month_hour'):
+        '''Quantile q (0 to 1) of var per group of `by` ('month_hour',
+           'month', 'hour' or None for all values), interpolated within
+           the histogram bins and kept within the minimum and maximum.'''
+
+        count, _, _, low, high, hist = self._grouped(var, by)
+
+        edges = self.edges(var)
+        width = edges[1] - edges[0]
+        cumulative = np.cumsum(hist, axis=1)
+        target = q * count
+
+        # First bin at which the cumulative count reaches the target.
+        idx = np.argmax(cumulative >= target[:, None], axis=1)
+        rows = np.arange(0, hist.shape[0])
+        before = cumulative[rows, idx] - hist[rows, idx]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(hist[rows, idx] > 0,
+                                (target - before) / hist[rows, idx], 0.)
+
+        out = np.clip(edges[idx] + fraction * width, low, high)
+        out[count == 0] = np.nan
+
+        return out
+
+    def summary(self, by='month_hour', stats=STATS):
+        '''Table of the statistics of every variable, with one row per
+           group of `by` ('month_hour', 'month', 'hour' or None for all
+           values) and columns (variable, statistic).'''
+
+        if by == 'month_hour':
+            index = pd.MultiIndex.from_product(
+                [range(1, 13), range(0, 24)], names=['month', 'hour'])
+        elif by == 'month':
+            index = pd.Index(range(1, 13), name='month')
+        elif by == 'hour':
+            index = pd.Index(range(0, 24), name='hour')
+        else:
+            index = pd.Index(['all'])
+
+        table = dict()
+
+        for var in self.variables:
+
+            count, mean, m2, low, high, _ = self._grouped(var, by)
+
+            for stat in stats:
+                if stat == 'count':
+                    values = count
+                elif stat == 'mean':
+                    values = np.where(count > 0, mean, np.nan)
+                elif stat == 'std':
+                    # Sample standard deviation, as pandas computes it.
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        values = np.where(count > 1,
+                                          np.sqrt(m2 / (count - 1)), np.nan)
+                elif stat == 'min':
+                    values = np.where(count > 0, low, np.nan)
+                elif stat == 'max':
+                    values = np.where(count > 0, high, np.nan)
+                elif stat in QUANTILES:
+                    values = self.quantile(var, QUANTILES[stat], by)
+                else:
+                    raise ValueError("I do not know the statistic "
+                                     "{0}.".format(stat))
+                table[(var, stat)] = values
+
+        return pd.DataFrame(table, index=index)
+
+# ----------- END EnsembleStats class. -----------
+
+
+def load_ensemble(path):
+    '''A stored (pickle, compressed or not) or exported (npz or feather)
+       ensemble.'''
+
+    if path.split('.')[-1].lower() in ('npz', 'feather'):
+        # Imported here, so that the store can use this module without
+        # the readers of weather files.
+        import wfileio as wf
+        return wf.get_ensemble(path)
+
+    return compression.load_pickle(path)
+
+# ----------- END load_ensemble function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Statistics of the samples of an ensemble, per month "
+        "and hour, in one pass over the samples.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("path", type=str,
+                        help="Samples saved by training (syn*.p) or "
+                        "exported as npz or feather.")
+    parser.add_argument("--by", type=str, default='month',
+                        choices=['month_hour', 'month', 'hour', 'all'],
+                        help="Groups to report the statistics for.")
+    parser.add_argument("--out", type=str, default=None,
+                        help="Write the table to this CSV file.")
+    args = parser.parse_args()
+
+    stats = EnsembleStats()
+    stats.add_ensemble(load_ensemble(args.path))
+    table = stats.summary(by=None if args.by == 'all' else args.by)
+
+    if args.out is None:
+        with pd.option_context('display.max_columns', None,
+                               'display.width', 200):
+            print(table.round(2))
+    else:
+        table.to_csv(args.out)
+        print("Statistics of {0} samples written to {1}.".format(
+            stats.n_samples, args.out))
+
+
+if __name__ == "__main__":
+    main()
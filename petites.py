@@ -12,6 +12,9 @@ import numpy as np
 # from scipy import interpolate
 import pandas as pd
 
+import profiler
+import timeindex
+
 # Constants for Eq. 5, Temperature -200°C to 0°C.
 FROZEN_CONST = [-5.6745359 * 10**3, 6.3925247, -9.6778430 * 10**-3,
                 6.2215701 * 10**-7, 2.0747825 * 10**-9,
@@ -27,11 +30,12 @@ def setseed(randseed):
     script once and only once.'''
 
     np.random.seed(randseed)
-    random.seed = randseed
+    random.seed(randseed)
 
 # ----------- END setseed function. -----------
 
 
+@profiler.timed('quantilecleaner')
 def quantilecleaner(datain, xy_train, var, bounds=None):
     '''Generic cleaner based on quantiles. Needs a time series / dataset
        and cut-off quantiles. Also needs the name of the variable (var) in
@@ -44,13 +48,19 @@ def quantilecleaner(datain, xy_train, var, bounds=None):
 
     dataout = pd.DataFrame(datain)
 
-    for this_month in range(1, 13):
+    rec_months = timeindex.month_positions(xy_train.index)
+    rec_values = np.asarray(xy_train[var])
+
+    # Only the months in datain, which may not be a whole year.
+    for this_month, syn_hours in timeindex.month_positions(
+            datain.index).items():
 
-        idx_this_month_rec = xy_train.index.month == this_month
-        idx_this_month_syn = datain.index.month == this_month
+        idx_this_month_syn = np.zeros(datain.shape[0], dtype=bool)
+        idx_this_month_syn[syn_hours] = True
 
-        rec_quantiles = np.percentile(
-            xy_train[var].iloc[idx_this_month_rec], bounds)
+        # The record may have gaps, which are left out.
+        rec_quantiles = np.nanpercentile(
+            rec_values[rec_months[this_month]], bounds)
 
         # import ipdb; ipdb.set_trace()
 
@@ -137,21 +147,21 @@ def wstats(datain, key, stat):
 
     grouped_data = datain.groupby(key)
 
-    if stat is 'mean':
+    if stat == 'mean':
         dataout = grouped_data.mean()
-    elif stat is 'sum':
+    elif stat == 'sum':
         dataout = grouped_data.sum()
-    elif stat is 'max':
+    elif stat == 'max':
         dataout = grouped_data.max()
-    elif stat is 'min':
+    elif stat == 'min':
         dataout = grouped_data.min()
-    elif stat is 'std':
+    elif stat == 'std':
         dataout = grouped_data.std()
-    elif stat is 'q1':
+    elif stat == 'q1':
         dataout = grouped_data.quantile(0.25)
-    elif stat is 'q3':
+    elif stat == 'q3':
         dataout = grouped_data.quantile(0.75)
-    elif stat is 'med':
+    elif stat == 'med':
         dataout = grouped_data.median()
 
     return dataout
@@ -165,6 +175,7 @@ def calc_rh(tdb, tdp):
     return rhcleaner(rhout)
 
 
+@profiler.timed('calc_tdp')
 def calc_tdp(tdb, rh):
 
     '''Calculate dew point temperature using dry bulb temperature
@@ -297,9 +308,9 @@ def w2rh(w, tdb, ps=101325):
 
 
 def remove_leap_day(df):
-    '''Removes leap day using time index.'''
+    '''Removes leap day using time index (see timeindex.py).'''
 
-    return df[~((df.index.month == 2) & (df.index.day == 29))]
+    return timeindex.remove_leap_day(df)
 
 # ----------- END remove_leap_day function. -----------
 
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Write samples out while later samples are still being generated.
+
+Generating samples keeps the processor busy, while writing them out as
+weather files mostly waits on the disk. Instead of generating the whole
+ensemble first and writing it afterwards, one sample per call of indra,
+resampling.generate can make the samples a block at a time and hand
+every finished sample to a Pipeline:
+    - the samples go onto a bounded queue, and put() waits while the
+      queue is full, so generation never runs more than `maxsize`
+      samples ahead of the writers (backpressure),
+    - writer threads take the samples off the queue, format them and
+      write them out, one file per sample,
+    - progress() prints how many samples have been generated and
+      written so far, and how fast, and close() waits for the writers
+      and prints the totals.
+The writers share the interpreter with generation, so formatting the
+text of the files still takes turns with it, but waiting on the disk
+does not.
+
+In indra, `--train 1 --write_out 1` writes every sample out this way.
+The writers can also compress every file, or put them all into one zip
+archive (see compression.py), which takes the writers longer but not
+generation.
+
+@author: Parag Rastogi
+"""
+
+import os
+import queue
+import threading
+import time
+
+import compression
+import wfileio as wf
+
+# Samples generated together, in between which the writers catch up.
+BLOCK = 16
+
+# Samples waiting to be written, at most.
+MAXSIZE = 32
+
+# Writer threads.
+WRITERS = 2
+
+
+def sample_path(path_file_out, key):
+    '''Path of the file of the sample with key (GCM, year, variant), made
+       from path_file_out by adding the variant, and the GCM and year if
+       the sample comes from a climate model.'''
+
+    root, ext = os.path.splitext(path_file_out)
+    gcm, year, variant = key
+
+    if gcm:
+        return "{0}_{1}_{2:d}_{3:04d}{4}".format(root, gcm, year, variant,
+                                                 ext)
+
+    return "{0}_{1:04d}{2}".format(root, variant, ext)
+
+# ----------- END sample_path function. -----------
+
+
+class Pipeline(object):
+    '''Bounded queue of samples, and writer threads that write them out
+       with write(key, sample), which returns the path of the file it
+       wrote, or the number of bytes it wrote. Use it as a context
+       manager, or call start() and close(). block is the number of
+       samples that resampling.generate makes before putting them on the
+       queue.'''
+
+    def __init__(self, write, writers=WRITERS, maxsize=MAXSIZE,
+                 block=BLOCK):
+
+        self.write = write
+        self.block = block
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.threads = [threading.Thread(target=self._work, daemon=True)
+                        for _ in range(0, writers)]
+
+        self._lock = threading.Lock()
+        self.errors = list()
+        self.n_put = 0
+        self.n_written = 0
+        self.n_bytes = 0
+        # Time that put() spent waiting for room in the queue.
+        self.waited = 0.
+        self.tic = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(report=exc_type is None)
+        return False
+
+    def start(self):
+        self.tic = time.perf_counter()
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, key, sample):
+        '''Queue a sample for writing, waiting for room if the queue is
+           full. Raises the error of a writer that failed.'''
+
+        self._raise()
+
+        tic = time.perf_counter()
+        self.queue.put((key, sample))
+        self.waited += time.perf_counter() - tic
+        self.n_put += 1
+
+    def _work(self):
+        '''Loop of a writer thread, until it takes None off the queue.'''
+
+        while True:
+
+            item = self.queue.get()
+
+            if item is None:
+                self.queue.task_done()
+                return
+
+            key, sample = item
+
+            try:
+                path = self.write(key, sample)
+                if isinstance(path, int):
+                    size = path
+                elif path is not None and os.path.isfile(path):
+                    size = os.path.getsize(path)
+                else:
+                    size = 0
+                with self._lock:
+                    self.n_written += 1
+                    self.n_bytes += size
+            except Exception as err:
+                with self._lock:
+                    self.errors.append((key, err))
+            finally:
+                self.queue.task_done()
+
+    def _raise(self):
+        if self.errors:
+            key, err = self.errors[0]
+            raise RuntimeError("Could not write sample {0}: {1}".format(
+                key, err)) from err
+
+    def progress(self, n_total=None):
+        '''Print the number of samples generated and written so far, and
+           the rates at which they were.'''
+
+        wall = max(time.perf_counter() - self.tic, 1e-9)
+
+        with self._lock:
+            n_written, n_bytes = self.n_written, self.n_bytes
+
+        print(("Generated {0}{1} samples ({2:.1f}/s), written {3} "
+               "({4:.1f}/s, {5:.1f} MB/s), {6} waiting.\r\n").format(
+                   self.n_put, '' if n_total is None else '/{0}'.format(
+                       n_total),
+                   self.n_put / wall, n_written, n_written / wall,
+                   n_bytes / wall / 1e6, self.queue.qsize()))
+
+    def close(self, report=True):
+        '''Wait for the writers to write every queued sample, stop them,
+           and print the totals. Raises the error of a writer that
+           failed.'''
+
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        wall = max(time.perf_counter() - self.tic, 1e-9)
+
+        if report:
+            print(("Wrote {0} samples ({1:.1f} MB) in {2:.1f} s: "
+                   "{3:.1f} samples/s, {4:.1f} MB/s. Generation waited "
+                   "{5:.1f} s for the writers.\r\n").format(
+                       self.n_written, self.n_bytes / 1e6, wall,
+                       self.n_written / wall, self.n_bytes / wall / 1e6,
+                       self.waited))
+
+        self._raise()
+
+# ----------- END Pipeline class. -----------
+
+
+def weather_writer(locdata, stcode, header, file_type, path_file_out,
+                   masterfile=None, codec=None, bundle=None):
+    '''write function for a Pipeline that writes every sample as a
+       weather file with wfileio.give_weather, named by sample_path. The
+       file is then compressed with codec (see compression.CODECS), or
+       moved into bundle, a compression.ZipBundle, if either is given.
+       Every writer compresses its own file, so the files are compressed
+       in parallel.'''
+
+    def write(key, sample):
+
+        path = wf.give_weather(
+            sample, locdata, stcode, list(header), masterfile=masterfile,
+            file_type=file_type,
+            path_file_out=sample_path(path_file_out, key), verbose=False)
+
+        if path is None:
+            return None
+        if bundle is not None:
+            return bundle.add(path)
+        if codec is not None:
+            return compression.compress_file(path, codec, workers=1)
+
+        return path
+
+    return write
+
+# ----------- END weather_writer function. -----------
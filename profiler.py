@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Stage-level timing and memory instrumentation for indra runs.
+
+Wrap a pipeline stage in `with profiler.stage('name', **info):` (or
+decorate a function with `@profiler.timed('name')`). Nothing is recorded
+unless enable() has been called, in which case every stage is timed and
+report() writes a machine-readable JSON summary. When profiling is off,
+stage() returns a shared do-nothing object, so the overhead is one
+function call and one flag check.
+
+With enable(memory=True), every stage also records:
+    1. the peak and retained Python allocations (tracemalloc),
+    2. the peak resident set size (RSS) of the process, sampled by a
+       background thread while the stage is open,
+    3. for outermost stages, the source lines that retained the most
+       memory over the stage.
+tracemalloc slows the run down noticeably, so only switch it on to size
+jobs or chase a memory regression.
+
+@author: Parag Rastogi
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+# Switched on by enable(). Module-level so that every script sees it.
+ENABLED = False
+# Switched on by enable(memory=True).
+MEMORY = False
+
+# How often the RSS sampler looks at the process, in seconds.
+RSS_INTERVAL = 0.05
+# Number of allocation sites listed per outermost stage.
+TOP_SITES = 5
+
+# Stages that are currently open, outermost first.
+_STACK = list()
+# Aggregated timings, keyed by the slash-separated path of the stage.
+_TOTALS = dict()
+# Individual records of stages that were given extra information
+# (e.g., the order of a SARIMAX candidate or the month).
+_EVENTS = list()
+# Time at which profiling was enabled.
+_START = [None]
+# The RSS sampling thread and the event that stops it.
+_SAMPLER = [None, None]
+
+
+def rss_bytes():
+    '''Current resident set size of this process in bytes, or None if it
+       cannot be read on this platform.'''
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+# ----------- END rss_bytes function. -----------
+
+
+def max_rss_bytes():
+    '''Peak resident set size of this process so far, in bytes.'''
+
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes.
+    if sys.platform == 'darwin':
+        return maxrss
+    return maxrss * 1024
+
+# ----------- END max_rss_bytes function. -----------
+
+
+def _sample_rss(stop):
+    '''Body of the RSS sampling thread. Raises the RSS peak of every
+       stage that is open when the sample is taken.'''
+
+    while not stop.wait(RSS_INTERVAL):
+        rss = rss_bytes()
+        if rss is None:
+            return
+        for open_stage in list(_STACK):
+            if rss > open_stage.rss_peak:
+                open_stage.rss_peak = rss
+
+# ----------- END _sample_rss function. -----------
+
+
+class _Stage(object):
+    '''Times one pass through a stage and files it away on exit.'''
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self.path = None
+        self.start = None
+        self.mem_start = 0
+        self.mem_peak = 0
+        self.rss_peak = 0
+        self.snapshot = None
+
+    def __enter__(self):
+
+        if MEMORY:
+            # tracemalloc has only one peak counter. Hand the peak so far
+            # to the enclosing stage before resetting it for this one.
+            current, peak = tracemalloc.get_traced_memory()
+            if _STACK:
+                _STACK[-1].mem_peak = max(_STACK[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = self.mem_peak = current
+            self.rss_peak = rss_bytes() or 0
+            if not _STACK:
+                self.snapshot = tracemalloc.take_snapshot()
+
+        _STACK.append(self)
+        self.path = '/'.join([x.name for x in _STACK])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+
+        seconds = time.perf_counter() - self.start
+        _STACK.pop()
+
+        total = _TOTALS.setdefault(
+            self.path, dict(calls=0, seconds=0., min=None, max=None))
+        total['calls'] += 1
+        total['seconds'] += seconds
+        total['min'] = (seconds if total['min'] is None
+                        else min(total['min'], seconds))
+        total['max'] = (seconds if total['max'] is None
+                        else max(total['max'], seconds))
+
+        if MEMORY:
+            self._account(total)
+
+        if self.info:
+            event = dict(stage=self.path,
+                         start=self.start - _START[0],
+                         seconds=seconds)
+            event.update(self.info)
+            _EVENTS.append(event)
+
+        return False
+
+    def _account(self, total):
+        '''Add the memory used by this pass to the stage totals.'''
+
+        current, peak = tracemalloc.get_traced_memory()
+        self.mem_peak = max(self.mem_peak, peak)
+        self.rss_peak = max(self.rss_peak, rss_bytes() or 0)
+
+        # The enclosing stage saw everything this one did.
+        if _STACK:
+            _STACK[-1].mem_peak = max(_STACK[-1].mem_peak, self.mem_peak)
+            _STACK[-1].rss_peak = max(_STACK[-1].rss_peak, self.rss_peak)
+        tracemalloc.reset_peak()
+
+        total['peak_bytes'] = max(total.get('peak_bytes', 0),
+                                  self.mem_peak - self.mem_start)
+        total['retained_bytes'] = (total.get('retained_bytes', 0) +
+                                   current - self.mem_start)
+        total['peak_rss_bytes'] = max(total.get('peak_rss_bytes', 0),
+                                      self.rss_peak)
+
+        if self.snapshot is not None:
+            diffs = tracemalloc.take_snapshot().compare_to(
+                self.snapshot, 'lineno')
+            total['top_sites'] = [
+                dict(site=str(diff.traceback), size_diff=diff.size_diff,
+                     count_diff=diff.count_diff)
+                for diff in diffs[:TOP_SITES]]
+            self.snapshot = None
+
+    def note(self, **info):
+        '''Attach information that is only known once the stage has run,
+           e.g., the number of optimiser iterations.'''
+        self.info.update(info)
+
+
+class _NullStage(object):
+    '''Stand-in returned by stage() when profiling is off.'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def note(self, **info):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(memory=False):
+    '''Switch profiling on and clear anything recorded so far. Pass
+       memory=True to also account for memory use per stage.'''
+
+    global ENABLED, MEMORY
+
+    del _STACK[:]
+    _TOTALS.clear()
+    del _EVENTS[:]
+    _START[0] = time.perf_counter()
+
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if _SAMPLER[0] is None:
+            _SAMPLER[1] = threading.Event()
+            _SAMPLER[0] = threading.Thread(
+                target=_sample_rss, args=(_SAMPLER[1],), daemon=True)
+            _SAMPLER[0].start()
+
+    ENABLED = True
+    MEMORY = memory
+
+# ----------- END enable function. -----------
+
+
+def disable():
+    '''Switch profiling off. Recorded timings are kept for report().'''
+
+    global ENABLED, MEMORY
+
+    if MEMORY:
+        _SAMPLER[1].set()
+        _SAMPLER[0].join()
+        _SAMPLER[0] = None
+        tracemalloc.stop()
+
+    ENABLED = False
+    MEMORY = False
+
+# ----------- END disable function. -----------
+
+
+def stage(name, **info):
+    '''Context manager that times the enclosed block as stage `name`.
+       Keyword arguments are saved with the individual record.'''
+
+    if not ENABLED:
+        return _NULL_STAGE
+
+    return _Stage(name, info)
+
+# ----------- END stage function. -----------
+
+
+def timed(name):
+    '''Decorator version of stage() for functions called in many places,
+       like the cleaners.'''
+
+    def decorator(func):
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(name, dict()):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+# ----------- END timed function. -----------
+
+
+def report(path=None):
+    '''Summarise everything recorded since enable(). The summary is
+       returned as a dictionary and, if path is given, written there
+       as JSON.'''
+
+    summary = dict(
+        wall_seconds=(None if _START[0] is None
+                      else time.perf_counter() - _START[0]),
+        stages=[dict(stage=key, **val) for key, val in _TOTALS.items()],
+        events=list(_EVENTS))
+
+    if MEMORY:
+        current, _ = tracemalloc.get_traced_memory()
+        summary['memory'] = dict(traced_bytes=current,
+                                 rss_bytes=rss_bytes(),
+                                 max_rss_bytes=max_rss_bytes())
+
+    if path is not None:
+        with open(path, 'w') as open_file:
+            json.dump(summary, open_file, indent=1, default=float)
+
+    return summary
+
+# ----------- END report function. -----------
@@ -9,7 +9,6 @@ Translating, as faithfully as possible, the resampling method first proposed
 in (Rastogi, 2016, EPFL).
 """
 
-import pickle
 import copy
 
 from tqdm import tqdm
@@ -17,11 +16,20 @@ from tqdm import tqdm
 import numpy as np
 import pandas as pd
 
-from scipy.optimize import curve_fit
 from sklearn.preprocessing import StandardScaler
 
+import checkpoint
+import compression
+import ensemble
+import fixedpoint
 import fourier
-from ts_models import select_models
+import harmonics
+import onlinestats
+import profiler
+import store
+import streams
+import timeindex
+from ts_models import select_models, simulate_model, update_model
 # Useful small functions like solarcleaner.
 import petites as petite
 
@@ -31,6 +39,25 @@ NUM_VARS = 2
 # "Standard" length of output year.
 STD_LEN_OUT = 8760
 
+# Hours of noise simulated and thrown away before a window that does not
+# start on 1 January, so that the window does not start on the initial
+# state of the SARMA models.
+NOISE_WARMUP = 7 * 24
+
+# Variables whose monthly distributions in the record are kept, to check
+# new data against them when a station is updated (see updater).
+RECORD_VARS = ["tdb", "rh"]
+
+# Drift checks of updater, which trigger a full search of the SARMA
+# orders. The new data drifted if more of its values fall outside the
+# recorded monthly DRIFT_QUANTILES than DRIFT_EXCEEDANCE (two percent
+# would by chance), or if refitting the earlier orders improves the
+# log-likelihood of the new year by more than DRIFT_LLF per hour, i.e.,
+# if the earlier parameters do not fit the new data anymore.
+DRIFT_QUANTILES = (0.01, 0.99)
+DRIFT_EXCEEDANCE = 0.06
+DRIFT_LLF = 0.02
+
 # Number of nearest neighbours (of each synthetic day in array of recorded
 # days using daily mean temperature) from which to choose solar radiation.
 # NUM_NBOURS = 10
@@ -52,9 +79,189 @@ STD_LEN_OUT = 8760
 cc_cols = [["tdb", "tas"], ["rh", None], ["atmpr", "ps"],
            ["wspd", "sfcWind"], ["ghi", "rsds"]]
 
+# Columns that differ from one sample to the next, without and with
+# climate change. Everything else is stored once per ensemble.
+# The solar columns are filled from recorded days by nearest_neighbour,
+# and stored as donor days rather than values.
+VARYING = ["tdb", "rh"]
+VARYING_CC = ["tdb", "tdp", "rh", "ghi", "wspd", "atmpr"]
+
+
+def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data,
+            randseed=None, window=None, recordpath=None, pipeline=None,
+            seed_files=None):
+    """Train the model with this function. Every random draw comes from
+    a stream derived from randseed (see streams.py). The models are
+    always fitted to a whole year, but the samples only cover window, a
+    pair of 'MM-DD' dates, if it is given. If recordpath is given, the
+    summary of the recorded data that updater needs is saved there,
+    with seed_files, the seed files it was read from (see
+    record_files), if they are given. If a pipeline is given, the
+    samples are written out as they are made (see generate)."""
+
+    randseed = streams.run_seed(randseed)
+
+    # Every stage is checkpointed if checkpointing was started (see
+    # checkpoint.py), and skipped if an earlier run already finished it.
+    fits = checkpoint.cached('fit_means', fit_means, xy_train, cc_data,
+                             randseed)
+
+    # Fit ARIMA models.
+    selmdl = fit_models(arma_params, fits['sans_means'])
+
+    xout = generate(fits, selmdl, n_samples, picklepath, bounds, cc_data,
+                    randseed, window, pipeline)
+
+    if recordpath is not None:
+        store.save_record(recordpath,
+                          record_files(fits['record'], seed_files))
+
+    return fits['ffit'], selmdl, xout
+
+
+def record_files(record, seed_files=None):
+    """The summary of the recorded data with the seed files it was read
+    from, as checkpoint.file_stats gives them, so that updater only
+    needs the files that were added or changed since."""
+
+    if seed_files is None:
+        return record
+
+    return dict(record, files=seed_files)
+
+
+def epochs_trainer(xy_train, n_samples, picklepaths, arma_params, bounds,
+                   cc_epochs, randseed=None, window=None, recordpaths=None,
+                   pipeline=None, seed_files=None):
+    """Train for several future epochs in one go. cc_epochs holds the
+    climate model outputs of every epoch, and picklepaths (and
+    recordpaths) the files to save the samples (and the summary of the
+    recorded data, with seed_files, see trainer) of every epoch to. The
+    fourier series, the SARMA models and the noise series do not depend
+    on the epoch, so they are fitted and simulated once, and only the
+    climate model outputs are added, cleaned and given solar days for
+    every epoch. Every epoch
+    gets the samples that training for it alone would give. Returns the
+    fourier series, the selected models and the samples of every
+    epoch."""
+
+    randseed = streams.run_seed(randseed)
+
+    # The climate model outputs only decide which fourier series are
+    # fitted, which is the same for every epoch.
+    fits = checkpoint.cached('fit_means', fit_means, xy_train, cc_epochs[0],
+                             randseed)
+
+    selmdl = fit_models(arma_params, fits['sans_means'])
+
+    # Every GCM and epoch uses the same noise series.
+    with profiler.stage('noise_simulation'):
+        noise = checkpoint.cached(
+            'noise_simulation', simulate_noise, selmdl, n_samples,
+            randseed, timeindex.window_hours(window))
+
+    xouts = list()
+
+    for eidx, (cc_data, picklepath) in enumerate(zip(cc_epochs,
+                                                     picklepaths)):
+
+        with profiler.stage('epoch', epoch=eidx):
+            xouts.append(generate(
+                fits, selmdl, n_samples, picklepath, bounds, cc_data,
+                randseed, window, pipeline, noise=noise,
+                key='_epoch{0:d}'.format(eidx)))
+
+        if recordpaths is not None:
+            store.save_record(recordpaths[eidx],
+                              record_files(fits['record'], seed_files))
+
+    return fits['ffit'], selmdl, xouts
+
+
+def fit_models(arma_params, sans_means):
+    """Select a SARMA model, within the orders in arma_params, for
+    every de-meaned series in sans_means."""
+
+    selmdl = list()
+
+    for idx, ser in enumerate(sans_means):
+        with profiler.stage('select_models', variable=ser):
+            mdl_temp, _ = select_models(
+                arma_params, sans_means[ser], key=ser)
+        selmdl.append(mdl_temp)
+
+    return selmdl
+
+
+def updater(xy_new, record, models, n_samples, picklepath, arma_params,
+            bounds, cc_data, randseed=None, window=None, recordpath=None,
+            pipeline=None, seed_files=None):
+    """Update a trained station with newly recorded data, without going
+    through the data it was trained on again. record is the summary of
+    the recorded data saved by trainer (or an earlier update), and
+    models the saved SARMA models (see store.save_model). Only the rows
+    of xy_new after the end of the record are used. The fourier series
+    are refitted from the updated sums of the harmonic regression, and
+    the SARMA models keep their orders and are refitted, warm-started,
+    to the newest whole year. A full search of the orders is only made
+    if the new data drifted from the record (see DRIFT_EXCEEDANCE and
+    DRIFT_LLF). The samples are then generated (and written out to the
+    pipeline, if one is given) as by trainer, and the updated summary
+    is saved to recordpath, with seed_files, if it is given."""
+
+    randseed = streams.run_seed(randseed)
+
+    with profiler.stage('update_means'):
+        fits, exceedance = update_means(xy_new, record, cc_data)
+
+    drifted = [var for var in exceedance
+               if exceedance[var] > DRIFT_EXCEEDANCE]
+    for var in drifted:
+        print(("{0:.1%} of the new {1} values are outside the recorded "
+               "monthly range, so I will search all the orders "
+               "again.\r\n").format(exceedance[var], var))
+
+    sans_means = fits['sans_means']
+    selmdl = list()
+
+    for idx, ser in enumerate(sans_means):
+
+        mdl_temp = None
+
+        # Saved ARIMA models have no seasonal order to start from.
+        if ser not in drifted and 'seasonal_order' in models:
+            mdl_temp, gain = update_model(
+                sans_means[ser], models['order'][idx],
+                models['seasonal_order'][idx], models['params'][idx])
+            if mdl_temp is None or gain > DRIFT_LLF:
+                print(("The earlier {0} model does not fit the new data, "
+                       "so I will search all the orders "
+                       "again.\r\n").format(ser))
+                mdl_temp = None
+
+        if mdl_temp is None:
+            with profiler.stage('select_models', variable=ser):
+                mdl_temp, _ = select_models(
+                    arma_params, sans_means[ser], key=ser)
+
+        selmdl.append(mdl_temp)
+
+    xout = generate(fits, selmdl, n_samples, picklepath, bounds, cc_data,
+                    randseed, window, pipeline)
+
+    if recordpath is not None:
+        store.save_record(recordpath,
+                          record_files(fits['record'], seed_files))
+
+    return fits['ffit'], selmdl, xout
+
 
-def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
-    """Train the model with this function."""
+def fit_means(xy_train, cc_data, randseed):
+    """First part of trainer: pick the year to fit the SARMA models to,
+    fit the fourier series, and remove them from that year. Returns a
+    dictionary with everything that generate needs, including the
+    de-meaned series (sans_means) to fit the SARMA models to, and the
+    summary of the recorded data (record) that updater starts from."""
 
     # Save a copy of all data to calculate quantiles later.
     xy_train_all = xy_train
@@ -66,55 +273,138 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
     all_years = np.unique(xy_train_all.index.year)
 
     xy_train = pd.DataFrame()
+    rng = streams.stream(randseed, 'fit_year')
 
     while xy_train.shape[0] < STD_LEN_OUT:
 
-        select_year = all_years[np.random.randint(0, len(all_years), 1)[0]]
+        select_year = all_years[rng.integers(0, len(all_years))]
 
         # Keep only that one year of data.
         xy_train = xy_train_all[str(select_year) + '-01-01':
                                 str(select_year) + '-12-31']
 
-        xy_train = petite.remove_leap_day(xy_train)
+        xy_train = timeindex.remove_leap_day(xy_train)
 
         if xy_train.shape[0] > STD_LEN_OUT:
             xy_train = xy_train.iloc[0:STD_LEN_OUT, :]
 
     x_calc_params = np.arange(0, xy_train_all.shape[0])
-    x_fit_models = np.arange(0, STD_LEN_OUT)
 
     # Fit fourier functions to the tdb and rh series.
 
-    # The curve_fit function outputs two things: parameters of the fit and
-    # the estimated covariance. We only use the first.
-    # Inputs are the function to fit (fourier in this case),
-    # xdata, and ydata.
-    # Use all the data available to calculate these parameters.
-    params = [curve_fit(fourier.fit_tdb, x_calc_params, xy_train_all['tdb']),
-              curve_fit(fourier.fit_rh, x_calc_params, xy_train_all['rh'])]
+    # The fourier series are linear in their coefficients, so they are
+    # fitted in closed form. The design matrix is built once, over all
+    # the data available, and reduced to sums from which every harmonic
+    # set is solved. The sums are kept, so that new data can be added
+    # to them later (see update_means).
+    # The columns are taken one at a time, which leaves a memory-mapped
+    # record (see seedmap.py) on its mapped files.
+    with profiler.stage('fourier_fit'):
+        hstats = harmonics.harmonic_stats(
+            x_calc_params, pd.concat([xy_train_all['tdb'],
+                                      xy_train_all['rh']], axis=1))
+
+    fits = remove_means(hstats, xy_train, cc_data)
+
+    # Everything that updater needs to know about the recorded data.
+    fits['record'] = dict(
+        harmonics=hstats, n_rows=xy_train_all.shape[0],
+        last_stamp=xy_train_all.index.max(), xy_train=xy_train,
+        donors=donor_days(xy_train_all, 'tdb', 'ghi'),
+        stats=record_stats(xy_train_all))
+
+    return fits
+
+
+def update_means(xy_new, record, cc_data):
+    """First part of updater: add the rows of xy_new after the end of the
+    record to the summary of the record, refit the fourier series, and
+    remove them from the year to fit the SARMA models to, which is the
+    newest whole year of xy_new (or the earlier year, if xy_new has no
+    whole year). Returns the same dictionary as fit_means, with the
+    updated summary, and the share of the new values of every variable
+    in RECORD_VARS outside the recorded monthly DRIFT_QUANTILES."""
+
+    # Only new data is added.
+    xy_new = xy_new[xy_new.index > record['last_stamp']]
+
+    if xy_new.shape[0] == 0:
+        raise ValueError("There is no data after {0}, the end of the "
+                         "recorded data of this station.".format(
+                             record['last_stamp']))
+
+    # Check the new data against the record before it is added.
+    exceedance = drift_share(record['stats'], xy_new)
+
+    # The fourier series continue from the last row of the record.
+    x_calc_params = np.arange(record['n_rows'],
+                              record['n_rows'] + xy_new.shape[0])
+
+    with profiler.stage('fourier_fit'):
+        new_stats = harmonics.harmonic_stats(
+            x_calc_params, xy_new[['tdb', 'rh']])
+        hstats = dict(record['harmonics'])
+        for key in ['gram', 'xty', 'n_obs']:
+            hstats[key] = hstats[key] + new_stats[key]
+
+    stats = copy.deepcopy(record['stats'])
+    stats.merge(record_stats(xy_new))
+
+    new_donors = donor_days(xy_new, record['donors']['basevar'],
+                            record['donors']['othervar'])
+    donors = dict(record['donors'])
+    for key in ['table', 'month', 'means']:
+        donors[key] = np.concatenate([donors[key], new_donors[key]])
+
+    # The newest whole year, if there is one.
+    xy_train = record['xy_train']
+
+    for select_year in np.unique(xy_new.index.year)[::-1]:
+
+        this_year = timeindex.remove_leap_day(
+            xy_new[str(select_year) + '-01-01':
+                   str(select_year) + '-12-31'])
+
+        if this_year.shape[0] >= STD_LEN_OUT:
+            xy_train = this_year.iloc[0:STD_LEN_OUT, :]
+            break
+
+    fits = remove_means(hstats, xy_train, cc_data)
+
+    fits['record'] = dict(
+        harmonics=hstats, n_rows=record['n_rows'] + xy_new.shape[0],
+        last_stamp=xy_new.index.max(), xy_train=xy_train, donors=donors,
+        stats=stats)
+
+    return fits, exceedance
+
+
+def remove_means(hstats, xy_train, cc_data):
+    """Solve the fourier series from the sums of the harmonic regression
+    hstats, and remove them from the year xy_train to get the series to
+    fit the SARMA models to."""
+
+    x_fit_models = np.arange(0, STD_LEN_OUT)
+
+    fstrs = ['tdb', 'rh']
+    if cc_data is not None:
+        fstrs += ['tdb_low', 'tdb_high', 'rh_low', 'rh_high']
+
+    params = {fstr: harmonics.solve_harmonics(hstats, fstr)
+              for fstr in fstrs}
 
     # Call the fourier fit function with the calculated
     # parameters to get the values of the fourier fit at each time step
-    ffit = [fourier.fit('tdb', x_fit_models, *params[0][0]),
-            fourier.fit('rh', x_fit_models, *params[1][0])]
+    ffit = [fourier.fit('tdb', x_fit_models, *params['tdb']),
+            fourier.fit('rh', x_fit_models, *params['rh'])]
 
     if cc_data is not None:
 
-        params_cc = [
-            curve_fit(fourier.fit_tdb_low, x_calc_params,
-                      xy_train_all['tdb']),
-            curve_fit(fourier.fit_tdb_high, x_calc_params,
-                      xy_train_all['tdb']),
-            curve_fit(fourier.fit_rh_low, x_calc_params,
-                      xy_train_all['rh']),
-            curve_fit(fourier.fit_rh_high, x_calc_params,
-                      xy_train_all['rh'])
-            ]
-
-        ffit_cc = [fourier.fit('tdb_low', x_fit_models, *params_cc[0][0]),
-                   fourier.fit('tdb_high', x_fit_models, *params_cc[1][0]),
-                   fourier.fit('rh_low', x_fit_models, *params_cc[2][0]),
-                   fourier.fit('rh_high', x_fit_models, *params_cc[3][0])]
+        ffit_cc = [fourier.fit(fstr, x_fit_models, *params[fstr])
+                   for fstr in fstrs[2:]]
+
+    else:
+        ffit_cc = None
 
     # Now subtract the low- and high-frequency fourier fits
     # (whichever is applicable) from the raw values to get the
@@ -126,133 +416,168 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
                            axis=1)
     sans_means.index = xy_train.index
 
-    # Fit ARIMA models.
+    return dict(xy_train=xy_train, ffit=ffit, ffit_cc=ffit_cc,
+                sans_means=sans_means)
 
-    selmdl = list()
-    resid = np.zeros([sans_means["tdb"].shape[0], NUM_VARS])
 
-    for idx, ser in enumerate(sans_means):
-        mdl_temp, resid[:, idx] = select_models(
-            arma_params, sans_means[ser])
-        selmdl.append(mdl_temp)
+def record_stats(rec):
+    """Statistics per month and hour of the variables in RECORD_VARS of
+    recorded data, which can be merged with those of newer data."""
 
-    print(("Done with fitting models to TDB and RH.\r\n"
-           "Simulating the learnt model to get synthetic noise series. "
-           "This might take some time.\r\n"))
+    stats = onlinestats.EnsembleStats(
+        variables=[x for x in RECORD_VARS if x in rec])
+    stats.add_sample(rec)
 
-    resampled = np.zeros([STD_LEN_OUT, NUM_VARS, n_samples])
-
-    for midx, mdl in enumerate(selmdl):
-        for sample_num in range(0, n_samples):
-            resampled_temp = mdl.simulate(nsimulations=STD_LEN_OUT)
-            resampled[:, midx, sample_num] = ((resampled_temp-np.mean(resampled_temp))/np.std(resampled_temp))*np.std(resid) + np.mean(resid)
-        # End n for loop.
-    # End mdl for loop.
+    return stats
 
-    # Add the resampled time series back to the fourier series.
 
-    if cc_data is None:
+def drift_share(stats, rec):
+    """Share of the values of every variable of stats in recorded data
+    rec that are outside the DRIFT_QUANTILES of their month in stats.
+    Months that stats has not seen are left out."""
 
-        xout = create_future_no_cc(
-            xy_train, sans_means, ffit, resampled, n_samples, bounds)
+    month = np.asarray(rec.index.month) - 1
+    share = dict()
 
-    else:
+    for var in stats.variables:
 
-        cc_models = set(cc_data.index.get_level_values(0))
-        xout = list()  # ([xy_train] * n_samples)
+        low, high = [stats.quantile(var, q, by='month')[month]
+                     for q in DRIFT_QUANTILES]
+        values = rec[var].values
+        valid = np.isfinite(values) & np.isfinite(low)
 
-        for model in tqdm(cc_models):
+        if valid.any():
+            share[var] = float(np.mean(
+                (values[valid] < low[valid]) |
+                (values[valid] > high[valid])))
 
-            this_cc_out = cc_data.loc[model]
-            gcm_years = np.unique(this_cc_out.index.year)
+    return share
 
-            for yidx, future_year in enumerate(gcm_years):
 
-                # Select only this year of cc model outputs.
-                cctable = this_cc_out[str(future_year) + '-01-01':
-                                      str(future_year) + '-12-31']
-                # leap_idx = [idx for idx, x in enumerate(cctable.index)
-                # if x == pd.to_datetime(str(future_year) + '-02-29 12:00:00')]
-                # cctable = cctable.drop(cctable.index[leap_idx])
-                cctable = petite.remove_leap_day(cctable)
+def donor_days(rec, basevar, othervar):
+    """The whole days of recorded data that nearest_neighbour can pick
+    othervar (and its companions, e.g., the other solar components)
+    from: a table of donor days, [days, 24, columns], with the month of
+    every day and the daily means of basevar and othervar. Days with
+    no values of either are left out."""
 
-                if cctable.shape[0] < 365:
-                    continue
+    if othervar == 'ghi':
+        columns = [x for x in rec if x in ['ghi', 'dhi', 'dni']]
+    elif othervar == 'wspd':
+        columns = [x for x in rec if x in ['wspd', 'wdir']]
+    else:
+        columns = [x for x in rec if x in [othervar]]
+
+    n_days = rec.shape[0] // 24
+    rec = rec.iloc[0:n_days * 24]
+
+    # One column at a time, see fit_means.
+    days = np.reshape(np.column_stack(
+        [rec[x].values.astype(np.float64) for x in [basevar, othervar]]),
+                      [n_days, 24, 2])
+    count = np.isfinite(days).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.nansum(days, axis=1) / count
+    keep = (count > 0).all(axis=1)
+
+    return dict(
+        basevar=basevar, othervar=othervar, columns=columns,
+        table=np.reshape(np.column_stack(
+            [rec[x].values.astype(np.float32) for x in columns]),
+                         [n_days, 24, len(columns)])[keep],
+        month=np.asarray(rec.index.month[::24])[keep],
+        means=means[keep])
+
+
+def generate(fits, selmdl, n_samples, picklepath, bounds, cc_data,
+             randseed, window=None, pipeline=None, noise=None, key=''):
+    """Second part of trainer: simulate the selected SARMA models, add
+    the fourier series (and climate model outputs) back, pick the solar
+    days and save the samples to picklepath. Only the hours of window
+    (the whole year by default) are generated. If a pipeline is given
+    (see pipeline.py), the samples are made a block at a time (a GCM at
+    a time with climate change), and every finished sample is put on it
+    to be written out while the next block is made. The samples are the
+    same either way. With climate change, noise can be the noise series
+    of the samples, simulated once for several epochs (see
+    epochs_trainer), and key tells the checkpoints of the epochs
+    apart."""
+
+    xy_train = fits['xy_train']
+
+    hours = timeindex.window_hours(window)
 
-                for nidx in range(0, n_samples):
+    print(("Done with fitting models to TDB and RH.\r\n"
+           "Simulating the learnt model to get synthetic noise series. "
+           "This might take some time.\r\n"))
 
-                    xout_temp = copy.deepcopy(xy_train)
+    # Blocks of samples, as (first sample, last sample + 1, climate
+    # model outputs), and the suffix of their checkpoints.
+    if pipeline is None:
+        blocks = [(0, n_samples, cc_data, '')]
+    elif cc_data is None:
+        blocks = [(first, min(first + pipeline.block, n_samples), None,
+                   '_{0:d}'.format(first))
+                  for first in range(0, n_samples, pipeline.block)]
+    else:
+        blocks = [(0, n_samples, cc_data.loc[[model]], '_' + str(model))
+                  for model in sorted(set(cc_data.index.get_level_values(0)))]
 
-                    future_index = pd.date_range(
-                        start=str(future_year) + "-01-01 00:00:00",
-                        end=str(future_year) + "-12-31 23:00:00",
-                        freq='1H')
-                    # Remove leap days.
-                    future_index = future_index[
-                        ~((future_index.month == 2) &
-                          (future_index.day == 29))]
-                    xout_temp.index = future_index
-                    xout_temp['year'] = future_index.year
+    parts = list()
+    resampled = None if cc_data is None else noise
 
-                    for idx, var in enumerate(cc_cols):
+    for first, last, this_cc, tag in blocks:
 
-                        if var[0] == "rh":
-                            huss = cctable["huss"].values
-                            # Convert specific humifity to humidity ratio.
-                            w = -huss / (huss - 1)
+        # Every GCM uses the same noise series.
+        if cc_data is None or resampled is None:
+            with profiler.stage('noise_simulation'):
+                resampled = checkpoint.cached(
+                    'noise_simulation' + (tag if cc_data is None else ''),
+                    simulate_noise, selmdl, last - first, randseed, hours,
+                    first)
 
-                            # Convert humidity ratio (w) to
-                            # Relative Humidity (RH).
-                            rh = petite.w2rh(
-                                w, cctable["tas"].values,
-                                cctable["ps"].values)
+        # Add the resampled time series back to the fourier series.
 
-                            # Is there some way to replace the fourier fit at
-                            # a finer grain instead of repeating the daily
-                            # mean value 24 times?
-                            ccvar = np.repeat(rh, [24], axis=0)
+        if cc_data is None:
 
-                        elif var[0] == "tdb":
-                            ccvar = np.repeat(
-                                cctable[var[1]].values - 273.15, [24],
-                                axis=0)
+            with profiler.stage('create_future'):
+                xout = checkpoint.cached(
+                    'create_future' + key + tag, create_future_no_cc,
+                    xy_train, fits['sans_means'], fits['ffit'], resampled,
+                    last - first, bounds, randseed, hours, first)
 
-                        else:
-                            ccvar = np.repeat(
-                                cctable[var[1]].values, [24], axis=0)
+        else:
 
-                        # Add the resampled time series to the high-frequency
-                        # fourier fit and the cc model output.
+            with profiler.stage('create_future'):
+                xout = checkpoint.cached(
+                    'create_future' + key + tag, create_future_cc,
+                    xy_train, this_cc, fits['ffit_cc'], resampled,
+                    n_samples, hours)
 
-                        if var[0] == 'tdb':
-                            xout_temp[var[0]] = (
-                                resampled[:, idx, nidx] + ffit_cc[1] -
-                                ffit_cc[0] + ccvar)
+        # End for loop.
 
-                        elif var[0] == 'rh':
-                            xout_temp[var[0]] = (
-                                resampled[:, idx, nidx] + ffit_cc[3] -
-                                ffit_cc[2] + ccvar)
-                        else:
-                            xout_temp[var[0]] = ccvar
+        # End loop over samples.
 
-                        xout_temp[var[0]] = petite.quantilecleaner(
-                            xout_temp[var[0]], xy_train, var[0])
+        # A GCM may not have a whole year in the epoch.
+        if len(xout) == 0:
+            continue
 
-                    xout_temp['tdp'] = petite.calc_tdp(
-                        xout_temp["tdb"], xout_temp["rh"])
-                    xout_temp['tdp'] = petite.quantilecleaner(
-                        xout_temp['tdp'], xy_train, 'tdp')
+        # Calculate TDP.
 
-                    xout.append(xout_temp)
+        with profiler.stage('nearest_neighbour'):
+            xout = checkpoint.cached(
+                'nearest_neighbour' + key + tag, nearest_neighbour, xout,
+                fits['record']['donors'], 'tdb', 'ghi', randseed)
 
-    # End for loop.
+        if pipeline is not None:
+            for k in range(0, len(xout)):
+                pipeline.put(xout.key(k), xout.frame(k))
+            pipeline.progress(n_samples if cc_data is None else None)
 
-    # End loop over samples.
+        parts.append(xout)
 
-    # Calculate TDP.
+    xout = ensemble.concatenate(parts)
 
-    xout = nearest_neighbour(xout, xy_train_all, 'tdb', 'ghi')
     # xout = nearest_neighbour(xout, xy_train_all, 'tdb', 'wspd')
 
     # tdp = (np.asarray([x.loc[:, 'tdp'] for x in xout])).T
@@ -264,12 +589,51 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
     #         df["tdp"] = petite.tdpcleaner(df['tdp'], df['tdb'])
     #         xout[idx] = df
 
-    # Save the outputs as a pickle.
-    pickle.dump(xout, open(picklepath, 'wb'))
+    # Save the outputs as a pickle, in fixed point if fixedpoint.enable
+    # has been called, and compressed if compression.enable has been
+    # called. The samples returned stay as they are.
+    with profiler.stage('save_samples'):
+        compression.dump_pickle(
+            fixedpoint.pack(xout) if fixedpoint.ENABLED else xout,
+            picklepath)
 
     # End nidx loop.
 
-    return ffit, selmdl, xout
+    return xout
+
+
+def simulate_noise(selmdl, n_samples, randseed, hours=None, first=0):
+    """Simulate n_samples noise series from each selected model, rescaled
+    to the spread of the residuals of all the models, for samples first
+    onwards. The series of model m and sample n comes from stream
+    ('noise', m, n). Only as many
+    hours as the slice hours holds are kept (a whole year by default),
+    after a warm-up if the slice does not start on 1 January."""
+
+    if hours is None:
+        hours = slice(0, STD_LEN_OUT)
+
+    n_hours = hours.stop - hours.start
+    warmup = 0 if hours.start == 0 else NOISE_WARMUP
+
+    # Residuals are missing wherever the recorded data was.
+    resid = np.column_stack([mdl.resid for mdl in selmdl])
+    resid = resid[np.isfinite(resid)]
+
+    resampled = np.zeros([n_hours, NUM_VARS, n_samples])
+
+    for midx, mdl in enumerate(selmdl):
+        for sample_num in range(0, n_samples):
+            resampled_temp = simulate_model(
+                mdl, warmup + n_hours,
+                streams.stream(randseed, 'noise', midx,
+                               first + sample_num))
+            resampled_temp = resampled_temp[warmup:]
+            resampled[:, midx, sample_num] = ((resampled_temp-np.mean(resampled_temp))/np.std(resampled_temp))*np.std(resid) + np.mean(resid)
+        # End n for loop.
+    # End mdl for loop.
+
+    return resampled
 
 
 def sampler(picklepath, year=0, n=0, counter=0):
@@ -277,14 +641,18 @@ def sampler(picklepath, year=0, n=0, counter=0):
 
     try:
 
-        if isinstance(picklepath, list):
+        if isinstance(picklepath, (list, ensemble.Ensemble)):
             xout = picklepath
         else:
-            xout = pickle.load(open(picklepath, 'rb'))
+            xout = compression.load_pickle(picklepath)
 
         if np.logical_not(year == 0 and n == 0):
-            yidx = [idx for idx, x in enumerate(xout)
-                    if np.unique(x.index.year) == year]
+            if isinstance(xout, ensemble.Ensemble):
+                yidx = np.flatnonzero(xout.years == year)
+            else:
+                # Pickles saved before ensembles were lists of frames.
+                yidx = [idx for idx, x in enumerate(xout)
+                        if np.unique(x.index.year) == year]
 
             sample = xout[yidx[n]]
 
@@ -300,28 +668,34 @@ def sampler(picklepath, year=0, n=0, counter=0):
     return sample
 
 
-def create_future_no_cc(rec, sans_means, ffit, resampled, n_samples, bounds):
+def create_future_no_cc(rec, sans_means, ffit, resampled, n_samples, bounds,
+                        randseed, hours=None, first=0):
     # First make the xout array using all variables. Variables other
     # than RH and TDB are just repeated from the incoming files.
-    xout = list()
-
     all_years = np.unique(rec.index.year)
 
     if len(all_years) == 1:
         select_year = all_years[0]
     else:
         all_years = all_years[:-1]
-        select_year = all_years[np.random.randint(0, len(all_years), 1)[0]]
+        rng = streams.stream(randseed, 'base_year')
+        select_year = all_years[rng.integers(0, len(all_years))]
 
     # Keep only that one year of data.
     rec_year = rec[str(select_year) + '-01-01':
                    str(select_year) + '-12-31']
 
-    rec_year = petite.remove_leap_day(rec_year)
+    rec_year = timeindex.remove_leap_day(rec_year)
 
     if rec_year.shape[0] > STD_LEN_OUT:
         rec_year = rec_year.iloc[0:STD_LEN_OUT, :]
 
+    if hours is None:
+        hours = slice(0, STD_LEN_OUT)
+
+    # Only the window is generated.
+    rec_year = rec_year.iloc[hours]
+
     # Clean the generated temperature values using extreme percentiles
     # as proxies for 'outliers'.
 
@@ -330,144 +704,242 @@ def create_future_no_cc(rec, sans_means, ffit, resampled, n_samples, bounds):
     # Add the fourier fits from the training data to the
     # resampled/resimulated ARMA model outputs.
 
-    for nidx in range(0, n_samples):
+    # Every sample starts as a copy of the master datatable. The
+    # samples are numbered from first.
+    xout = ensemble.Ensemble(rec_year, VARYING, n_samples,
+                             variants=np.arange(first, first + n_samples))
 
-        # Copy the master datatable of all values.
-        xout_temp = copy.deepcopy(rec_year)
+    syn_index = timeindex.noleap_index(2223)[hours]
+
+    for nidx in range(0, n_samples):
 
         for idx, var in enumerate(sans_means[["tdb", "rh"]]):
 
-            syn = pd.Series(data=resampled[:, idx, nidx] + ffit[idx],
-                            index=pd.date_range(
-                                start="2223-01-01 00:00:00",
-                                end="2223-12-31 23:00:00",
-                                freq='1H'))
+            syn = pd.Series(data=resampled[:, idx, nidx] + ffit[idx][hours],
+                            index=syn_index)
 
             # Replace only var (tdb or rh).
             # Also send it to the quantile cleaner.
-            xout_temp[var] = petite.quantilecleaner(
+            xout.column(var)[nidx] = petite.quantilecleaner(
                 syn, rec, var, bounds=bounds)
 
-        xout.append(xout_temp)
-
     return xout
 
 
-def nearest_neighbour(syn, rec, basevar, othervar):
+def create_future_cc(xy_train, cc_data, ffit_cc, resampled, n_samples,
+                     hours=None):
+    """Add the climate model outputs to the high-frequency fourier fits
+    and the resampled noise, for every GCM and future year in cc_data.
+    Only the hours in the slice hours (whole days) are generated."""
 
-    # Calculate daily means of temperature.
-    mean_list = {basevar: list(), othervar: list()}
+    if hours is None:
+        hours = slice(0, STD_LEN_OUT)
 
-    for var in [basevar, othervar]:
-        for df in syn:
+    # The climate model outputs are daily.
+    days = slice(hours.start // 24, hours.stop // 24)
+    ffit_cc = [x[hours] for x in ffit_cc]
 
-            df_dm = df[var].resample('1D').mean()
+    cc_models = sorted(set(cc_data.index.get_level_values(0)))
 
-            if len(df_dm) > 365:
-                df_dm = petite.remove_leap_day(df_dm)
+    # Find the complete GCM years first, so that the ensemble can be
+    # allocated in one go.
+    cc_years = list()
 
-            mean_list[var].append(df_dm)
+    for model in cc_models:
 
-    if othervar == 'ghi':
-        othervar_idx = [x for x, y in enumerate(rec)
-                        if y in ['ghi', 'dhi', 'dni']]
-    elif othervar == 'wspd':
-        othervar_idx = [x for x, y in enumerate(rec)
-                        if y in ['wspd', 'wdir']]
-    else:
-        othervar_idx = [x for x, y in enumerate(rec)
-                        if y in [othervar]]
+        this_cc_out = cc_data.loc[model]
+        gcm_years = np.unique(this_cc_out.index.year)
 
-    # Number of nearest neighbours to keep when varying solar quantities.
-    nn_top = 10
-    # days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+        for future_year in gcm_years:
+
+            # Select only this year of cc model outputs.
+            cctable = this_cc_out[str(future_year) + '-01-01':
+                                  str(future_year) + '-12-31']
+            # leap_idx = [idx for idx, x in enumerate(cctable.index)
+            # if x == pd.to_datetime(str(future_year) + '-02-29 12:00:00')]
+            # cctable = cctable.drop(cctable.index[leap_idx])
+            cctable = timeindex.remove_leap_day(cctable)
+
+            if cctable.shape[0] < 365:
+                continue
+
+            cc_years.append((model, future_year, cctable.iloc[days]))
+
+    xout = ensemble.Ensemble(
+        xy_train.iloc[hours], VARYING_CC, len(cc_years) * n_samples,
+        years=np.repeat([x[1] for x in cc_years], n_samples),
+        gcms=np.repeat([str(x[0]) for x in cc_years], n_samples),
+        variants=np.tile(np.arange(0, n_samples), len(cc_years)))
+
+    for cidx, (model, future_year, cctable) in enumerate(tqdm(cc_years)):
+
+        # Samples of this GCM and year in the ensemble.
+        this_block = slice(cidx * n_samples, (cidx + 1) * n_samples)
+        gcm_key = 'gcm_{0}_{1:d}'.format(model, int(future_year))
+
+        found = checkpoint.load(gcm_key)
+        if found is not checkpoint.MISSING:
+            xout.values[this_block] = found
+            continue
 
-    for this_month in range(1, 13):
+        with profiler.stage('gcm_year', gcm=str(model),
+                            year=int(future_year)):
 
-        print('Month ' + str(this_month))
+            for nidx in range(0, n_samples):
 
-        # This month's indices.
-        idx_this_month_rec = rec.index.month == this_month
+                kidx = cidx * n_samples + nidx
 
-        rec_this_month = rec.iloc[idx_this_month_rec, :]
+                for idx, var in enumerate(cc_cols):
 
-        rec_means_this_month = (np.asarray(
-            [rec_this_month[basevar].resample(
-                '1D').mean().dropna(),
-             rec_this_month[othervar].resample(
-                 '1D').mean().dropna()])).T
+                    if var[0] == "rh":
+                        huss = cctable["huss"].values
+                        # Convert specific humifity to humidity ratio.
+                        w = -huss / (huss - 1)
 
-        # Find the solar data for this month.
-        othervar_this_month = np.asarray(
-            [rec_this_month.iloc[:, x]
-             for x in othervar_idx]).T
-        # Reshape into day-sized blocks.
-        othervar_this_month = np.reshape(
-            othervar_this_month, [-1, 24, len(othervar_idx)])
+                        # Convert humidity ratio (w) to
+                        # Relative Humidity (RH).
+                        rh = petite.w2rh(
+                            w, cctable["tas"].values,
+                            cctable["ps"].values)
 
-        # Scale values for calculating the nearest neighbour.
-        scaler_rec = StandardScaler()
-        scaler_rec.fit(rec_means_this_month)
-        rec_means_scaled = scaler_rec.transform(rec_means_this_month)
+                        # Is there some way to replace the fourier fit at
+                        # a finer grain instead of repeating the daily
+                        # mean value 24 times?
+                        ccvar = np.repeat(rh, [24], axis=0)
+
+                    elif var[0] == "tdb":
+                        ccvar = np.repeat(
+                            cctable[var[1]].values - 273.15, [24],
+                            axis=0)
+
+                    else:
+                        ccvar = np.repeat(
+                            cctable[var[1]].values, [24], axis=0)
+
+                    # Add the resampled time series to the high-frequency
+                    # fourier fit and the cc model output.
+
+                    this_var = xout.column(var[0])
+
+                    if var[0] == 'tdb':
+                        this_var[kidx] = (
+                            resampled[:, idx, nidx] + ffit_cc[1] -
+                            ffit_cc[0] + ccvar)
+
+                    elif var[0] == 'rh':
+                        this_var[kidx] = (
+                            resampled[:, idx, nidx] + ffit_cc[3] -
+                            ffit_cc[2] + ccvar)
+                    else:
+                        this_var[kidx] = ccvar
+
+                    this_var[kidx] = petite.quantilecleaner(
+                        xout.series(kidx, var[0]), xy_train, var[0])
+
+                xout.column('tdp')[kidx] = petite.calc_tdp(
+                    xout.column('tdb')[kidx], xout.column('rh')[kidx])
+                xout.column('tdp')[kidx] = petite.quantilecleaner(
+                    xout.series(kidx, 'tdp'), xy_train, 'tdp')
+
+        checkpoint.save(gcm_key, xout.values[this_block])
+
+    return xout
+
+
+def nearest_neighbour(syn, rec, basevar, othervar, randseed=None):
+    """Replace othervar (and its companions, e.g., the other solar
+    components) in every sample of the ensemble syn with whole recorded
+    days, chosen among the nearest neighbours of each synthetic day.
+    rec is the recorded data, or its donor days (see donor_days).
+    The recorded days become the donor table of the ensemble, and only
+    the index of the chosen day is kept per sample and day. The choices
+    of every sample come from its own stream, keyed by the GCM, year and
+    variant of the sample."""
+
+    randseed = streams.run_seed(randseed)
+    rngs = [streams.stream(randseed, 'neighbours', *syn.key(k))
+            for k in range(0, len(syn))]
+
+    # Calculate daily means of temperature. Every sample is a year
+    # without leap day, so the days are whole blocks of 24 hours and
+    # fall in the same months in every sample.
+    mean_list = dict([(var, np.reshape(syn.column(var),
+                                       [len(syn), -1, 24]).mean(axis=2))
+                      for var in [basevar, othervar]])
+    month_of_day = timeindex.MONTH[
+        syn.first_hour:syn.first_hour + syn.n_hours:24]
+
+    if isinstance(rec, pd.DataFrame):
+        rec = donor_days(rec, basevar, othervar)
+    elif (rec['basevar'], rec['othervar']) != (basevar, othervar):
+        raise ValueError("These donor days were chosen by {0} and {1}, "
+                         "not {2} and {3}.".format(
+                             rec['basevar'], rec['othervar'], basevar,
+                             othervar))
+
+    # Every recorded day can be a donor. Samples only keep the index
+    # of their donor day in this table.
+    donor_month = rec['month']
+    picks = syn.add_donors(rec['columns'], rec['table'])
+
+    # Number of nearest neighbours to keep when varying solar quantities.
+    nn_top = 10
+    # days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
 
-        # Cycle through each array of daily means.
-        for sample_idx, (syn_sample_tdb, syn_sample_ghi) in enumerate(zip(
-                mean_list[basevar], mean_list[othervar])):
+    # Only the months in the samples, which may cover a window of the
+    # year.
+    for this_month in np.unique(month_of_day):
 
-            idx_this_month_syn = syn_sample_tdb.index.month == this_month
+        with profiler.stage('month', month=int(this_month)):
 
-            syn_sample = np.asarray(
-                [syn_sample_tdb[idx_this_month_syn].values,
-                 syn_sample_ghi[idx_this_month_syn].values]).T
+            print('Month ' + str(this_month))
 
-            scaler_syn = StandardScaler()
-            scaler_syn.fit(syn_sample)
-            syn_sample_scaled = scaler_syn.transform(syn_sample)
+            # Find the donor days for this month, and their daily means.
+            donors_this_month = np.flatnonzero(donor_month == this_month)
+            rec_means_this_month = rec['means'][donors_this_month]
 
-            nearest_nbours = list()
+            # Scale values for calculating the nearest neighbour.
+            scaler_rec = StandardScaler()
+            scaler_rec.fit(rec_means_this_month)
+            rec_means_scaled = scaler_rec.transform(rec_means_this_month)
 
-            for day_sample in syn_sample_scaled:
+            idx_this_month_syn = month_of_day == this_month
 
-                # Sort samples by Euclidean distance.
-                # argsort gives the arguments (indices) from sorting.
-                nbours = np.argsort(
-                    np.asarray([petite.euclidean(day_sample, x)
-                                for x in rec_means_scaled]))
+            # Cycle through each array of daily means.
+            for sample_idx, (syn_sample_tdb, syn_sample_ghi) in enumerate(
+                    zip(mean_list[basevar], mean_list[othervar])):
 
-                # Keep only the first nn_top samples.
-                nbours = nbours[:nn_top]
-                # Select only one of those.
-                nbours = nbours[np.random.randint(0, len(nbours), size=1)]
-                # Save it as an integer.
-                nearest_nbours.append(int(nbours))
+                syn_sample = np.asarray(
+                    [syn_sample_tdb[idx_this_month_syn],
+                     syn_sample_ghi[idx_this_month_syn]]).T
 
-            # Array to store the hourly samples.
-            othervar_samples = np.zeros([len(nearest_nbours),
-                                         24, len(othervar_idx)])
+                scaler_syn = StandardScaler()
+                scaler_syn.fit(syn_sample)
+                syn_sample_scaled = scaler_syn.transform(syn_sample)
 
-            # Cycle through the nearest neighbours.
-            for ng_idx, nbour_idx in enumerate(nearest_nbours):
-                othervar_samples[ng_idx, :, :] = othervar_this_month[
-                    nbour_idx, :, :]
+                nearest_nbours = list()
 
-            # Reshape solar samples to be continuous.
-            othervar_samples = np.reshape(
-                othervar_samples, [-1, len(othervar_idx)])
+                for day_sample in syn_sample_scaled:
 
-            # Put the solar samples back in to syn.
-            for sidx, othervar_col in enumerate(othervar_idx):
-                cleaned_solar = petite.solarcleaner(
-                    pd.Series(othervar_samples[:, sidx]),
-                    rec.iloc[:, othervar_col])
+                    # Sort samples by Euclidean distance.
+                    # argsort gives the arguments (indices) from sorting.
+                    nbours = np.argsort(
+                        np.asarray([petite.euclidean(day_sample, x)
+                                    for x in rec_means_scaled]))
 
-                this_month_idx = [idx for idx, x in
-                                  enumerate(syn[sample_idx].index.month)
-                                  if x == this_month]
+                    # Keep only the first nn_top samples.
+                    nbours = nbours[:nn_top]
+                    # Select only one of those, and save it as an integer.
+                    nearest_nbours.append(int(nbours[
+                        rngs[sample_idx].integers(0, len(nbours))]))
 
-                syn[sample_idx].iloc[this_month_idx,
-                                     othervar_col] = cleaned_solar.values
+                # Point the days of this month to their donor days. The
+                # negative values are set to zero when the sample is
+                # materialised, as solarcleaner did.
+                picks[sample_idx, idx_this_month_syn] = donors_this_month[
+                    nearest_nbours]
 
-        # End syn_sample loop
+            # End syn_sample loop
 
     # End month loop.
 
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic seed records for load testing.
+
+Makes realistic multi-decade hourly records, with the statistics of the
+bundled Geneva file, and writes them out with the usual writers in
+wfileio, one file per year, in EPW, ESP-r, fin4 or CSV format. A folder of
+these files can be passed to indra as path_file_in like any folder of
+recorded data.
+
+How a record is made:
+    1. Temperature and RH are the harmonic fits (see harmonics.py) of the
+       Geneva year, plus AR(1) noise with the lag-1 correlation and
+       spread of the Geneva residuals. Every year also gets a random
+       offset in temperature and a linear warming trend.
+    2. Solar radiation and wind are copied a whole day at a time from a
+       random day in the same month of the Geneva year.
+    3. Dew point is calculated from temperature and RH. Pressure is the
+       standard pressure at the Geneva altitude plus some noise.
+    4. Gaps: gap_rate outages per year, of gap_hours hours on average, in
+       which the meteorological variables are missing, so that the
+       readers and trainer have to deal with them. They are written as
+       the missing-value codes of EPW files and as empty fields in CSV
+       files. ESP-r and fin4 files have no way of marking missing
+       values, so they get the gaps linearly interpolated between their
+       ends, as in a gap-filled record, which gap_fill does for every
+       format. A fraction missing_years of the years are left out
+       altogether.
+All of this is drawn from one random generator seeded with randseed, so
+the same arguments always give the same files.
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+import fourier
+import harmonics
+import petites as petite
+import timeindex
+import wfileio as wf
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PATH_ESPR = os.path.join(HERE, 'gen', 'che_geneva.iwec.a')
+
+# Columns of every generated record.
+STD_COLS = ["year", "month", "day", "hour", "tdb", "tdp", "rh",
+            "ghi", "dni", "dhi", "wspd", "wdr", "atmpr"]
+
+# Columns of fin4 files (see wfileio.read_fin4), plus rh, which the
+# fin4 writer drops.
+FIN4_COLS = ["year", "month", "day", "hour", "tdb", "tdp", "atmpr", "sky",
+             "osky", "wspd", "wdir", "ghi", "dni", "Pres", "Rain", "vis",
+             "chgt", "solarz", "rh"]
+
+# Variables that are missing in gaps (or interpolated across them).
+GAP_VARS = ["tdb", "rh", "wspd", "wdr", "atmpr"]
+
+# Geneva is 420 m above sea level.
+ALTITUDE = 420.
+
+# Header of EPW files written without a master file.
+EPW_HEADER = [
+    "LOCATION,{loc},-,-,indra seedgen,{wmo},{lat},{long},{tz},{alt}\n",
+    "DESIGN CONDITIONS,0\n",
+    "TYPICAL/EXTREME PERIODS,0\n",
+    "GROUND TEMPERATURES,0\n",
+    "HOLIDAYS/DAYLIGHT SAVINGS,No,0,0,0\n",
+    "COMMENTS 1,Synthetic seed record made by seedgen.py\n",
+    "COMMENTS 2,Statistics taken from {source}\n",
+    "DATA PERIODS,1,1,Data,Sunday, 1/ 1,12/31\n"]
+
+# Header of fin4 files written without a master file.
+FIN4_HEADER = ["{loc} synthetic seed record made by seedgen.py\n",
+               "lat {lat} long {long} alt {alt}\n",
+               "yr mo dy hr tdb tdp atmpr sky osky wspd wdir ghi dni "
+               "pres rain vis chgt solarz\n"]
+
+
+def ar1(rng, n_steps, phi, sigma, start=0.):
+    '''AR(1) series of length n_steps with coefficient phi and innovation
+       standard deviation sigma, continuing from the value start.'''
+
+    shocks = rng.normal(0, sigma, n_steps)
+
+    return lfilter([1.], [1., -phi], shocks, zi=[phi * start])[0]
+
+# ----------- END ar1 function. -----------
+
+
+def seed_statistics(path_espr=PATH_ESPR):
+    '''Harmonic fits, residual AR(1) parameters and daily blocks of solar
+       and wind data from a one-year ESP-r file.'''
+
+    wdata, locdata, header, _ = wf.read_espr(path_espr)
+
+    x_calc = np.arange(0, wdata.shape[0])
+    hstats = harmonics.harmonic_stats(x_calc, wdata[['tdb', 'rh']])
+
+    stats = dict(locdata=locdata, source=os.path.basename(path_espr),
+                 days=dict())
+
+    for var in ['tdb', 'rh']:
+        coefs = harmonics.solve_harmonics(hstats, var)
+        resid = wdata[var].values - fourier.fit(var, x_calc, *coefs)
+        phi = np.corrcoef(resid[1:], resid[:-1])[0, 1]
+        stats[var] = dict(coefs=coefs, phi=phi,
+                          sigma=np.std(resid) * np.sqrt(1 - phi ** 2))
+
+    # Solar and wind data in day-sized blocks, by month.
+    blocks = np.reshape(wdata[['ghi', 'dni', 'dhi', 'wspd', 'wdr']].values,
+                        [-1, 24, 5])
+    day_month = wdata['month'].values[::24].astype(int)
+    for month in range(1, 13):
+        stats['days'][month] = blocks[day_month == month, :, :]
+
+    return stats
+
+# ----------- END seed_statistics function. -----------
+
+
+def fill_gaps(year_data, rng, gap_rate, gap_hours, interpolate=False):
+    '''Cut gap_rate gaps (on average) of about gap_hours hours each into
+       one year of data, leaving them missing, or interpolating linearly
+       across them if interpolate is True.'''
+
+    n_hours = year_data.shape[0]
+
+    for _ in range(0, rng.poisson(gap_rate)):
+        length = min(rng.geometric(1. / gap_hours), n_hours // 4)
+        start = rng.randint(1, n_hours - length - 1)
+        year_data.iloc[start:start + length,
+                       [year_data.columns.get_loc(x) for x in GAP_VARS]
+                       ] = np.nan
+
+    if interpolate:
+        year_data[GAP_VARS] = year_data[GAP_VARS].interpolate(
+            method='linear')
+
+    return year_data
+
+# ----------- END fill_gaps function. -----------
+
+
+def interpolate_gaps(year_data):
+    '''Copy of one year of data with its gaps interpolated linearly, and
+       the dew point calculated again, for the formats that cannot mark
+       missing values.'''
+
+    year_data = year_data.copy()
+    year_data[GAP_VARS] = year_data[GAP_VARS].interpolate(method='linear')
+    year_data['tdp'] = petite.calc_tdp(year_data['tdb'].values,
+                                       year_data['rh'].values)
+
+    return year_data
+
+# ----------- END interpolate_gaps function. -----------
+
+
+def make_record(years=30, start_year=1991, randseed=0, gap_rate=0.,
+                gap_hours=6., missing_years=0., trend=0.03, year_sd=0.6,
+                path_espr=PATH_ESPR, gap_fill=False):
+    '''Make a synthetic hourly record of `years` years starting in
+       start_year. Returns a list of DataFrames, one per year that was
+       not left out, with the columns in STD_COLS.'''
+
+    rng = np.random.RandomState(randseed)
+    stats = seed_statistics(path_espr)
+
+    x_fit = np.arange(0, 8760)
+    means = dict([(var, fourier.fit(var, x_fit, *stats[var]['coefs']))
+                  for var in ['tdb', 'rh']])
+
+    # Carry the noise over from one year to the next.
+    noise_end = dict(tdb=0., rh=0.)
+
+    record = list()
+
+    for yidx in range(0, years):
+
+        year = start_year + yidx
+        index = timeindex.noleap_index(year)
+
+        year_data = pd.DataFrame(index=index, columns=STD_COLS, dtype=float)
+        year_data['year'] = year
+        year_data['month'] = index.month
+        year_data['day'] = index.day
+        year_data['hour'] = index.hour
+
+        offset = rng.normal(0, year_sd) + trend * yidx
+
+        for var in ['tdb', 'rh']:
+            noise = ar1(rng, index.shape[0], stats[var]['phi'],
+                        stats[var]['sigma'], noise_end[var])
+            noise_end[var] = noise[-1]
+            year_data[var] = means[var] + noise
+
+        year_data['tdb'] += offset
+        year_data['rh'] = np.clip(year_data['rh'], 5, 100)
+
+        # Whole days of solar and wind from the same month of the seed.
+        days = list()
+        for month in index.month.values[::24]:
+            pool = stats['days'][month]
+            days.append(pool[rng.randint(0, pool.shape[0])])
+        year_data[['ghi', 'dni', 'dhi', 'wspd', 'wdr']] = np.reshape(
+            np.asarray(days), [-1, 5])
+
+        year_data['atmpr'] = (101325 * np.exp(-ALTITUDE / 8434.) +
+                              ar1(rng, index.shape[0], 0.999, 15.))
+
+        if gap_rate > 0:
+            year_data = fill_gaps(year_data, rng, gap_rate, gap_hours,
+                                  interpolate=gap_fill)
+
+        year_data['tdp'] = petite.calc_tdp(year_data['tdb'].values,
+                                           year_data['rh'].values)
+        # calc_tdp gives a number even where the gaps leave none.
+        year_data.loc[year_data[['tdb', 'rh']].isna().any(axis=1),
+                      'tdp'] = np.nan
+
+        # Draw the decision to leave this year out last, so that the
+        # years that are kept do not depend on missing_years.
+        if rng.uniform() < missing_years:
+            continue
+
+        record.append(year_data)
+
+    return record
+
+# ----------- END make_record function. -----------
+
+
+def to_epw(year_data):
+    '''Lay one year of a record out in the columns of an EPW file, with
+       the EPW missing-value codes in the columns indra does not use.'''
+
+    cols = [x.lower() for x in wf.epw_colnames[:-3]]
+    epw_data = pd.DataFrame(0., index=year_data.index, columns=cols)
+
+    for col in ["year", "month", "day", "tdb", "tdp", "rh", "atmpr",
+                "ghi", "dni", "dhi", "wspd", "wdr"]:
+        epw_data[col] = year_data[col].values
+
+    # Gaps get the missing-value codes.
+    for col, code in wf.epw_missing.items():
+        epw_data[col] = epw_data[col].fillna(code)
+
+    # EPW hours run from 1 to 24.
+    epw_data['hour'] = year_data['hour'].values + 1
+    epw_data['minute'] = 60
+    epw_data['qualflags'] = ("?9?9?9?9E0?9?9?9?9?9?9?9?9?9?9?9?9?9?9?9"
+                             "*9*9?9?9?9")
+    epw_data['etrh'] = 9999.
+    epw_data['etrn'] = 9999.
+    epw_data['hir'] = 9999.
+    epw_data['ghe'] = 999999.
+    epw_data['dne'] = 999999.
+    epw_data['dhe'] = 999999.
+    epw_data['zl'] = 9999.
+    epw_data['tsky'] = 99.
+    epw_data['osky'] = 99.
+    epw_data['vis'] = 9999.
+    epw_data['chgt'] = 99999.
+    epw_data['pwo'] = 9.
+    epw_data['pwc'] = 999999999.
+    epw_data['pwt'] = 999.
+    epw_data['aopt'] = 0.999
+    epw_data['sdpt'] = 999.
+    epw_data['slast'] = 99.
+
+    return epw_data
+
+# ----------- END to_epw function. -----------
+
+
+def to_fin4(year_data):
+    '''Lay one year of a record out in the columns of a fin4 file.'''
+
+    fin_data = pd.DataFrame(0., index=year_data.index, columns=FIN4_COLS)
+
+    for col in ["year", "month", "day", "hour", "tdb", "tdp", "atmpr",
+                "wspd", "ghi", "dni", "rh"]:
+        fin_data[col] = year_data[col].values
+
+    fin_data['wdir'] = year_data['wdr'].values
+    fin_data['Pres'] = year_data['atmpr'].values / 100
+    fin_data['vis'] = 30.
+    fin_data['chgt'] = 777.
+
+    return fin_data
+
+# ----------- END to_fin4 function. -----------
+
+
+def write_record(record, out_dir, file_type='epw', stcode='syn',
+                 masterfile=None, source=os.path.basename(PATH_ESPR)):
+    '''Write every year of a record to out_dir with give_weather. ESP-r
+       files need a master file, which defaults to the bundled Geneva
+       file. The other formats get a generic header if there is no
+       master. Returns the paths of the files written.'''
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    if file_type == 'espr' and masterfile is None:
+        masterfile = PATH_ESPR
+
+    locdata = dict(loc=stcode, lat="46.25", long="6.13", tz="1.0",
+                   alt="{:.1f}".format(ALTITUDE), wmo="067000")
+
+    paths = list()
+
+    for year_data in record:
+
+        if file_type in ('espr', 'fin4'):
+            year_data = interpolate_gaps(year_data)
+
+        year = int(year_data['year'].values[0])
+        path_file_out = os.path.join(
+            out_dir, '{0}_{1:04d}.{2}'.format(stcode, year, file_type))
+
+        if file_type == 'epw':
+            df = to_epw(year_data)
+            header = [x.format(source=source, **locdata) for x in EPW_HEADER]
+        elif file_type == 'fin4':
+            df = to_fin4(year_data)
+            header = [x.format(**locdata) for x in FIN4_HEADER]
+        else:
+            df = year_data[STD_COLS[:-1]].copy()
+            header = None
+
+        wf.give_weather(df, locdata, stcode, header,
+                        masterfile=masterfile, file_type=file_type,
+                        path_file_out=path_file_out)
+
+        paths.append(path_file_out)
+
+    return paths
+
+# ----------- END write_record function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic multi-year seed record, with the "
+        "statistics of the bundled Geneva file, for load testing indra.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--out_dir", type=str, default="seed_syn",
+                        help="Folder to write the yearly files to.")
+    parser.add_argument("--file_type", type=str, default="epw",
+                        help="Output format(s): epw, espr, fin4 or csv. "
+                        "Separate several with commas.")
+    parser.add_argument("--years", type=int, default=30,
+                        help="Length of the record in years.")
+    parser.add_argument("--start_year", type=int, default=1991,
+                        help="First year of the record.")
+    parser.add_argument("--randseed", type=int, default=0,
+                        help="Seed of the random generator.")
+    parser.add_argument("--gap_rate", type=float, default=0.,
+                        help="Average number of gaps per year.")
+    parser.add_argument("--gap_hours", type=float, default=6.,
+                        help="Average length of a gap in hours.")
+    parser.add_argument("--gap_fill", type=int, choices=[0, 1], default=0,
+                        help="Enter 1 to interpolate across the gaps "
+                        "instead of leaving them missing.")
+    parser.add_argument("--missing_years", type=float, default=0.,
+                        help="Fraction of years to leave out.")
+    parser.add_argument("--trend", type=float, default=0.03,
+                        help="Warming trend in degrees C per year.")
+    parser.add_argument("--masterfile", type=str, default=None,
+                        help="Master file for the writers.")
+    parser.add_argument("--stcode", type=str, default="syn",
+                        help="Station code used in the file names.")
+    args = parser.parse_args()
+
+    record = make_record(years=args.years, start_year=args.start_year,
+                         randseed=args.randseed, gap_rate=args.gap_rate,
+                         gap_hours=args.gap_hours,
+                         gap_fill=bool(args.gap_fill),
+                         missing_years=args.missing_years, trend=args.trend)
+
+    for file_type in args.file_type.split(','):
+        paths = write_record(record, os.path.join(args.out_dir, file_type),
+                             file_type=file_type, stcode=args.stcode,
+                             masterfile=args.masterfile)
+        print("Wrote {0} {1} files to {2}.".format(
+            len(paths), file_type, os.path.dirname(paths[0])))
+
+
+if __name__ == "__main__":
+    main()
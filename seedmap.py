@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped copy of the recorded (seed) data of a station.
+
+Decades of hourly recorded data take a lot of memory as a DataFrame, and
+every training run on the same seed files holds its own copy of it. The
+seed files can be read once into a folder of column files instead:
+    - write() saves the time stamps and every numeric column of the
+      record in its own .npy file, and the text columns (e.g., the data
+      source flags of EPW files), location and header in a small pickle,
+    - read() maps the column files back, read-only, and builds a
+      DataFrame on top of the mapped columns without copying them, so
+      the operating system pages the data in as it is used, and the
+      runs on one host share the same pages,
+    - get_seed() works like wfileio.get_seed, but through such a folder,
+      which is reused as long as the seed files do not change.
+The columns are mapped one by one, so pandas keeps every column in its
+own block. Code that works off a mapped record should take its columns
+one at a time (rec[var]) rather than together (rec[[var1, var2]]),
+which makes pandas copy all the columns of the same type into one block
+in memory. The record is read-only, so anything that changes it has to
+copy it first.
+
+In indra, `--seed_map FOLDER` trains off a mapped record.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import checkpoint
+import wfileio as wf
+
+# Files in the folder of a mapped record, besides one file per numeric
+# column.
+META_FILE = 'meta.p'
+INDEX_FILE = 'index.npy'
+
+
+def column_file(path_map, pos):
+    '''File of the column at position pos of the record.'''
+    return os.path.join(path_map, 'col_{0:03d}.npy'.format(pos))
+
+# ----------- END column_file function. -----------
+
+
+def write(path_map, xy, locdata, header, source=None):
+    '''Save the record xy (a DataFrame with a datetime index), with its
+       location data and header, as a folder of column files at
+       path_map. source identifies the files it was read from. The folder
+       is written under a temporary name and renamed when it is complete,
+       so other processes never map half of it.'''
+
+    path_map = os.path.abspath(path_map)
+    parent = os.path.dirname(path_map)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    path_temp = tempfile.mkdtemp(
+        dir=parent, prefix='.' + os.path.basename(path_map) + '.')
+
+    try:
+        np.save(os.path.join(path_temp, INDEX_FILE),
+                np.asarray(xy.index.asi8))
+
+        objects = dict()
+        for pos, col in enumerate(xy.columns):
+            values = xy.iloc[:, pos].values
+            if values.dtype.kind in 'biuf':
+                np.save(column_file(path_temp, pos),
+                        np.ascontiguousarray(values))
+            else:
+                objects[col] = values
+
+        meta = dict(columns=list(xy.columns), objects=objects,
+                    locdata=locdata, header=header, source=source,
+                    freq=xy.index.freqstr)
+        with open(os.path.join(path_temp, META_FILE), 'wb') as open_file:
+            pickle.dump(meta, open_file)
+
+        # Processes that still map an older copy keep their pages when
+        # it is removed.
+        if os.path.isdir(path_map):
+            path_old = tempfile.mkdtemp(
+                dir=parent, prefix='.' + os.path.basename(path_map) + '.')
+            os.replace(path_map, path_old)
+            shutil.rmtree(path_old)
+
+        try:
+            os.replace(path_temp, path_map)
+        except OSError:
+            # Another process saved the record first.
+            shutil.rmtree(path_temp)
+
+    except BaseException:
+        if os.path.isdir(path_temp):
+            shutil.rmtree(path_temp)
+        raise
+
+# ----------- END write function. -----------
+
+
+def read_meta(path_map):
+    '''Columns, text columns, location data, header, source and index
+       frequency of a mapped record, or None if there is none at
+       path_map.'''
+
+    path_meta = os.path.join(path_map, META_FILE)
+
+    if not os.path.isfile(path_meta):
+        return None
+
+    with open(path_meta, 'rb') as open_file:
+        return pickle.load(open_file)
+
+# ----------- END read_meta function. -----------
+
+
+def read(path_map, meta=None):
+    '''Map the record saved at path_map. Returns the record, as a
+       DataFrame whose numeric columns are read-only views of the mapped
+       files, its location data and its header, like wfileio.get_seed.'''
+
+    if meta is None:
+        meta = read_meta(path_map)
+
+    if meta is None:
+        raise ValueError(
+            "There is no mapped record at {0}.".format(path_map))
+
+    # Views as plain arrays, so that pickling a part of the record
+    # saves its values rather than a memmap.
+    # The frequency of the index, if the record has one, is not in the
+    # time stamps themselves.
+    index = pd.DatetimeIndex(np.load(
+        os.path.join(path_map, INDEX_FILE), mmap_mode='r').view(
+            np.ndarray).view('datetime64[ns]'), freq=meta.get('freq'))
+
+    data = dict()
+    for pos, col in enumerate(meta['columns']):
+        if col in meta['objects']:
+            data[col] = meta['objects'][col]
+        else:
+            data[col] = np.load(column_file(path_map, pos),
+                                mmap_mode='r').view(np.ndarray)
+
+    # copy=False keeps one block per column, on the mapped files.
+    xy = pd.DataFrame(data, index=index, columns=meta['columns'],
+                      copy=False)
+
+    return xy, meta['locdata'], meta['header']
+
+# ----------- END read function. -----------
+
+
+def get_seed(stcode, fpath, path_map):
+    '''wfileio.get_seed through a mapped record at path_map: the seed
+       file, or folder of files, at fpath is read and saved there the
+       first time, and mapped from there as long as it does not
+       change.'''
+
+    source = dict(path=os.path.abspath(fpath),
+                  files=checkpoint.file_stats(fpath))
+
+    meta = read_meta(path_map)
+
+    if meta is None or meta['source'] != source:
+        xy, locdata, header = wf.get_seed(stcode, fpath)
+        write(path_map, xy, locdata, header, source)
+        meta = read_meta(path_map)
+    else:
+        print("Mapping the seed data saved in {0}.\r\n".format(path_map))
+
+    xy, locdata, header = read(path_map, meta)
+    if locdata is not None:
+        locdata['loc'] = stcode
+
+    return xy, locdata, header
+
+# ----------- END get_seed function. -----------
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Sample trained stations from python, keeping them loaded between calls.
+
+Every call of indra() in sampling mode finds the files of the station
+again, unpickles its counter and all of its samples to hand out one of
+them, and reads the seed file for the location and header of the file
+it writes. Pulling thousands of samples that way spends most of its time
+loading the same pickles over and over. A Session keeps stations loaded
+instead:
+    - a Station reads the samples, counter, model and statistics
+      (climatology) of a trained station the first time they are asked
+      for, and the location and header of its seed file the first time
+      a sample is written, and keeps them,
+    - sample(), samples() and write() hand out and write samples from
+      memory. Samples taken in turn (without saying which) follow the
+      counter of the station, as indra does: once they have all been
+      handed out, the next one is None and the counter starts over. The
+      counter is saved when the station is closed, so that indra
+      carries on from there,
+    - a Session keeps the last max_stations stations used, and closes
+      the one used least recently when it needs room for another. A
+      station whose samples have been trained again since it was loaded
+      is loaded again, and its old counter is dropped.
+
+Typical use:
+    with session.Session(max_stations=4) as sess:
+        gen = sess.station('gen', store_path='gen',
+                           path_file_in='gen/che_geneva.iwec.a')
+        for k in range(0, 1000):
+            gen.write(k, 'gen/syn_{0:04d}.epw'.format(k), file_type='epw')
+        frames = gen.samples(range(0, 100))
+
+@author: Parag Rastogi
+"""
+
+import collections
+import glob
+import os
+import pickle
+
+import numpy as np
+
+import checkpoint
+import compression
+import ensemble
+import store
+import timeindex
+import wfileio as wf
+
+# Stations kept loaded by a Session.
+MAX_STATIONS = 8
+
+# Formats of the seed files, as in indra.
+WEATHER_FMTS = ["espr", "epw", "csv", "fin4"]
+
+
+class Station(object):
+    '''A trained station in store_path (station_code by default), with
+       climate change if epoch is given. path_file_in is its seed file,
+       or folder of files, which is only needed to write samples out.
+       Only the hours of window are handed out, if it is given.'''
+
+    def __init__(self, station_code, store_path='.', path_file_in=None,
+                 epoch=None, window=None):
+
+        self.station_code = station_code.lower()
+
+        if store_path == '.':
+            store_path = self.station_code
+
+        self.store_path = store_path
+        self.path_file_in = path_file_in
+        self.epoch = epoch
+        self.window = window
+        self.files = store.paths(store_path, epoch)
+
+        if not os.path.isfile(self.files['syn']):
+            raise ValueError(("I could not find the samples of station "
+                              "'{0}' in folder '{1}'. Please train it "
+                              "first.").format(self.station_code,
+                                               store_path))
+
+        self._ensemble = None
+        self._syn_stats = None
+        self._counter = None
+        self._counter_dirty = False
+        self._model = None
+        self._stats = None
+        self._weather = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.ensemble)
+
+    @property
+    def ensemble(self):
+        '''All the samples of the station, loaded the first time.'''
+
+        if self._ensemble is None:
+            self._syn_stats = checkpoint.file_stats(self.files['syn'])
+            self._ensemble = compression.load_pickle(self.files['syn'])
+
+        return self._ensemble
+
+    @property
+    def counter(self):
+        '''Counter of the samples handed out, loaded the first time.'''
+
+        if self._counter is None:
+            with open(self.files['counter'], 'rb') as open_file:
+                self._counter = pickle.load(open_file)
+
+        return self._counter
+
+    @property
+    def model(self):
+        '''Orders, parameters and fourier fits of the SARMA models.'''
+
+        if self._model is None:
+            with open(self.files['model'], 'rb') as open_file:
+                self._model = pickle.load(open_file)
+
+        return self._model
+
+    @property
+    def stats(self):
+        '''Statistics of the samples per month and hour (see
+           onlinestats.py).'''
+
+        if self._stats is None:
+            with open(self.files['stats'], 'rb') as open_file:
+                self._stats = pickle.load(open_file)
+
+        return self._stats
+
+    @property
+    def weather(self):
+        '''Location data and header of the seed file, and the seed file
+           itself, which is the master of the files written.'''
+
+        if self._weather is None:
+
+            if self.path_file_in is None:
+                raise ValueError(
+                    "Station '{0}' needs its path_file_in to write "
+                    "samples out.".format(self.station_code))
+
+            if os.path.isdir(self.path_file_in):
+                masterfile = sorted(sum(
+                    [glob.glob(os.path.join(self.path_file_in, "*." + x))
+                     for x in WEATHER_FMTS], []))[0]
+            else:
+                masterfile = self.path_file_in
+
+            _, locdata, header = wf.get_weather(self.station_code,
+                                                masterfile)
+            self._weather = (locdata, header, masterfile)
+
+        return self._weather
+
+    def changed(self):
+        '''Whether the samples have been saved again since they were
+           loaded, e.g., by training the station again.'''
+
+        if self._ensemble is None:
+            return False
+
+        return checkpoint.file_stats(self.files['syn']) != self._syn_stats
+
+    def index(self, year, variant=0):
+        '''Position of the variant-th sample of a future year, with
+           climate change.'''
+
+        xout = self.ensemble
+
+        if isinstance(xout, ensemble.Ensemble):
+            yidx = np.flatnonzero(xout.years == year)
+        else:
+            # Pickles saved before ensembles were lists of frames.
+            yidx = [idx for idx, x in enumerate(xout)
+                    if np.unique(x.index.year) == year]
+
+        if variant >= len(yidx):
+            raise IndexError(("Station '{0}' has {1} samples of {2}, "
+                              "not {3}.").format(self.station_code,
+                                                 len(yidx), year,
+                                                 variant + 1))
+
+        return yidx[variant]
+
+    def next_index(self):
+        '''Position of the next sample by the counter, which is moved on.
+           Once every sample has been handed out, the counter starts over
+           and None is returned, as indra does.'''
+
+        csave = self.counter
+
+        if csave['counter'] >= min(csave['n_samples'], len(self)):
+            print('You are asking me for more samples than I have. ' +
+                  'You generated {:d} '.format(csave['n_samples']) +
+                  'samples, I have given you ' +
+                  '{:d} samples.'.format(csave['counter']))
+            print('Next call will restart from the first sample.')
+            csave['counter'] = 0
+            self._counter_dirty = True
+            return None
+
+        k = csave['counter']
+        csave['counter'] += 1
+        self._counter_dirty = True
+
+        return k
+
+    def sample(self, k=None, year=None, variant=0):
+        '''Sample k, or the variant-th sample of a future year with
+           climate change, or the next sample by the counter if neither
+           is given, as a DataFrame. None if the counter has run out.'''
+
+        if year is not None:
+            k = self.index(year, variant)
+        elif k is None:
+            k = self.next_index()
+            if k is None:
+                return None
+
+        return window_sample(self.ensemble[k], self.window)
+
+    def samples(self, ks=None):
+        '''List of the samples in ks (e.g., a range), or of all of
+           them.'''
+
+        if ks is None:
+            ks = range(0, len(self))
+
+        return [self.sample(k) for k in ks]
+
+    def write(self, k, path_file_out, file_type='epw', compress=None):
+        '''Write sample k (or the next sample by the counter if k is None)
+           to path_file_out as a weather file of file_type, compressed
+           with compress (see compression.CODECS) if it is given. Returns
+           the path of the file written, or None if the counter has run
+           out.'''
+
+        locdata, header, masterfile = self.weather
+
+        sample = self.sample(k)
+        if sample is None:
+            return None
+
+        path_written = wf.give_weather(
+            sample, locdata, self.station_code, list(header),
+            masterfile=masterfile, file_type=file_type,
+            path_file_out=path_file_out, verbose=False)
+
+        if compress is not None and path_written is not None:
+            path_written = compression.compress_file(path_written,
+                                                     compress)
+
+        return path_written
+
+    def close(self):
+        '''Save the counter if samples were taken in turn, unless the
+           station has been trained again since it was loaded, and let go
+           of everything loaded.'''
+
+        if self._counter_dirty and not self.changed():
+            store.save_counter(self.files['counter'],
+                               self._counter['n_samples'],
+                               self._counter['randseed'],
+                               self._counter['counter'])
+
+        self.reset()
+
+    def reset(self):
+        '''Let go of everything loaded, without saving the counter.'''
+
+        self._counter_dirty = False
+        self._ensemble = None
+        self._syn_stats = None
+        self._counter = None
+        self._model = None
+        self._stats = None
+
+# ----------- END Station class. -----------
+
+
+class Session(object):
+    '''Stations kept loaded, at most max_stations of them. Use it as a
+       context manager, or call close() when done, so that the counters
+       are saved.'''
+
+    def __init__(self, max_stations=MAX_STATIONS):
+
+        self.max_stations = max_stations
+        self.stations = collections.OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def station(self, station_code, store_path='.', path_file_in=None,
+                epoch=None, window=None):
+        '''The Station in store_path, from memory if it is loaded and its
+           samples have not changed since, otherwise loaded and kept,
+           closing the station used least recently if there are too
+           many.'''
+
+        station_code = station_code.lower()
+        if store_path == '.':
+            store_path = station_code
+
+        key = (os.path.abspath(store_path),
+               None if epoch is None else tuple(epoch),
+               None if window is None else tuple(window))
+
+        if key in self.stations:
+            this_station = self.stations.pop(key)
+            if this_station.changed():
+                # The counter of the new samples is on disk already.
+                this_station.reset()
+            if path_file_in is not None:
+                this_station.path_file_in = path_file_in
+            self.stations[key] = this_station
+            return this_station
+
+        while len(self.stations) >= self.max_stations:
+            _, old_station = self.stations.popitem(last=False)
+            old_station.close()
+
+        this_station = Station(station_code, store_path, path_file_in,
+                               epoch, window)
+        self.stations[key] = this_station
+
+        return this_station
+
+    def close(self):
+        '''Close every station, which saves their counters.'''
+
+        while self.stations:
+            _, old_station = self.stations.popitem(last=False)
+            old_station.close()
+
+# ----------- END Session class. -----------
+
+
+def window_sample(sample, window=None):
+    '''The hours of sample in window, as indra writes them out. The
+       sample can be a whole year or a window itself.'''
+
+    if window is None:
+        return sample
+
+    hours = timeindex.window_hours(window)
+    sample_hours = timeindex.noleap_hours(sample.index)
+
+    return sample[(sample_hours >= hours.start) &
+                  (sample_hours < hours.stop)]
+
+# ----------- END window_sample function. -----------
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Skill of a whole ensemble of samples against the recorded (seed) data.
+
+Every sample is scored on each variable with:
+    - the RMSE and MAE of its monthly means against the recorded ones,
+    - the Kolmogorov-Smirnov distance between its values and the
+      recorded ones, month by month,
+    - the RMSE of its mean diurnal profile, month by month (12 x 24
+      hourly means), against the recorded one,
+    - the error of its extreme (and median) percentiles.
+The samples are scored a block at a time, all samples of a block at once
+with the array functions of losses.py, so memory stays bounded for large
+ensembles. Blocks can be spread over a pool of processes.
+
+The scores are kept per sample, and report() summarises them across
+samples (mean, median and 95th percentile) in a table and a JSON-able
+dictionary. From the command line:
+    python skill.py gen/syn.p gen/che_geneva.iwec.a --out skill.json
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import ensemble
+import losses
+import onlinestats
+import wfileio as wf
+
+# Variables scored by default, if they are in both the ensemble and the
+# record.
+VARIABLES = ('tdb', 'tdp', 'rh', 'ghi', 'wspd')
+
+# Percentiles of every sample compared to those of the record.
+PERCENTILES = (1, 5, 50, 95, 99)
+
+# Samples scored together.
+CHUNK = 256
+
+
+def reference(record, var, months):
+    '''Recorded statistics of var that the samples are scored against,
+       for the months (1 to 12) in months.'''
+
+    values = record[var]
+    month = record.index.month
+
+    return dict(
+        monthly_mean=values.groupby(month).mean().reindex(months).values,
+        diurnal=values.groupby([month, record.index.hour]).mean().unstack(
+            ).reindex(index=months, columns=range(0, 24)).values,
+        by_month=[np.sort(values[month == m].dropna().values)
+                  for m in months],
+        percentiles=np.nanpercentile(values.values, PERCENTILES))
+
+# ----------- END reference function. -----------
+
+
+def score_block(values, day_months, months, ref):
+    '''Scores of every sample in values, [samples, hours] of whole days,
+       against the recorded statistics ref of the same variable.
+       day_months is the month of every day of the samples.'''
+
+    days = np.reshape(values, [values.shape[0], -1, 24])
+
+    # Mean diurnal profile of every month, [samples, months, 24].
+    diurnal = np.stack([days[:, day_months == m, :].mean(axis=1)
+                        for m in months], axis=1)
+    monthly_mean = diurnal.mean(axis=2)
+
+    ks = np.stack([losses.ks_distance(
+        np.reshape(days[:, day_months == m, :], [values.shape[0], -1]),
+        ref['by_month'][midx]) for midx, m in enumerate(months)], axis=1)
+
+    return dict(
+        monthly_rmse=losses.rmse(monthly_mean, ref['monthly_mean']),
+        monthly_mae=losses.mae(monthly_mean, ref['monthly_mean']),
+        monthly_bias=monthly_mean - ref['monthly_mean'],
+        ks=ks,
+        diurnal_rmse=losses.rmse(
+            np.reshape(diurnal, [values.shape[0], -1]),
+            np.ravel(ref['diurnal'])),
+        percentile_error=(np.percentile(values, PERCENTILES, axis=1).T -
+                          ref['percentiles']))
+
+# ----------- END score_block function. -----------
+
+
+def score(xout, record, variables=None, workers=None, chunk=CHUNK):
+    '''Score every sample of xout (an Ensemble, a list of samples, or an
+       ensemble read with wfileio.get_ensemble) against record, the
+       recorded data as a DataFrame with a datetime index. Blocks of
+       chunk samples are scored in a pool of workers processes if
+       workers is more than one. Returns a dictionary with the months
+       scored, and one dictionary of scores per variable, with one row
+       per sample.'''
+
+    n_samples, columns, sample_months, _ = ensemble.describe(xout)
+
+    if variables is None:
+        variables = VARIABLES
+    variables = [x for x in variables if x in columns and x in record]
+
+    day_months = sample_months[::24]
+    months = [int(x) for x in np.unique(day_months)]
+
+    refs = dict([(var, reference(record, var, months))
+                 for var in variables])
+    blocks = [(first, min(first + chunk, n_samples))
+              for first in range(0, n_samples, chunk)]
+
+    scores = dict(months=months, percentiles=list(PERCENTILES),
+                  n_samples=n_samples)
+
+    if workers is not None and workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        pool = None
+
+    try:
+        for var in variables:
+
+            if pool is None:
+                results = [score_block(
+                    ensemble.block(xout, var, first, last), day_months,
+                    months, refs[var]) for first, last in blocks]
+            else:
+                results = [pool.submit(
+                    score_block, ensemble.block(xout, var, first, last),
+                    day_months, months, refs[var])
+                           for first, last in blocks]
+                results = [x.result() for x in results]
+
+            scores[var] = dict(
+                [(key, np.concatenate([x[key] for x in results]))
+                 for key in results[0]])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return scores
+
+# ----------- END score function. -----------
+
+
+def report(scores):
+    '''Summary of the scores across samples: a table with one row per
+       variable and columns (score, statistic), and a dictionary that
+       also has the per-month and per-percentile scores.'''
+
+    rows = dict()
+    detail = dict(months=scores['months'],
+                  percentiles=scores['percentiles'],
+                  n_samples=scores['n_samples'])
+
+    for var in [x for x in scores if isinstance(scores[x], dict)]:
+
+        this = scores[var]
+        # Worst month of every sample.
+        this = dict(this, ks_max=np.nanmax(this['ks'], axis=1))
+
+        rows[var] = dict()
+        detail[var] = dict()
+
+        for key in ['monthly_rmse', 'monthly_mae', 'diurnal_rmse',
+                    'ks_max']:
+            rows[var][(key, 'mean')] = float(np.nanmean(this[key]))
+            rows[var][(key, 'p95')] = float(np.nanpercentile(this[key], 95))
+            detail[var][key] = dict(
+                mean=float(np.nanmean(this[key])),
+                median=float(np.nanmedian(this[key])),
+                p95=float(np.nanpercentile(this[key], 95)))
+
+        detail[var]['monthly_bias'] = np.nanmean(
+            this['monthly_bias'], axis=0).tolist()
+        detail[var]['ks_by_month'] = dict(
+            mean=np.nanmean(this['ks'], axis=0).tolist(),
+            p95=np.nanpercentile(this['ks'], 95, axis=0).tolist())
+        detail[var]['percentile_error'] = dict(
+            mean=np.nanmean(this['percentile_error'], axis=0).tolist(),
+            mean_absolute=np.nanmean(
+                np.abs(this['percentile_error']), axis=0).tolist())
+
+    return pd.DataFrame(rows).T, detail
+
+# ----------- END report function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Score every sample of an ensemble against the "
+        "recorded data it was trained on.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("path", type=str,
+                        help="Samples saved by training (syn*.p) or "
+                        "exported as npz or feather.")
+    parser.add_argument("path_seed", type=str,
+                        help="Recorded weather file, or folder of files.")
+    parser.add_argument("--variables", type=str, default=",".join(VARIABLES),
+                        help="Variables to score.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes to score blocks of "
+                        "samples in.")
+    parser.add_argument("--out", type=str, default=None,
+                        help="Write the report to this JSON file.")
+    args = parser.parse_args()
+
+    record, _, _ = wf.get_seed('skill', args.path_seed)
+
+    scores = score(onlinestats.load_ensemble(args.path), record,
+                   variables=args.variables.split(","),
+                   workers=args.workers)
+    table, detail = report(scores)
+
+    with pd.option_context('display.max_columns', None,
+                           'display.width', 200):
+        print(table.round(3))
+
+    if args.out is not None:
+        with open(args.out, 'w') as open_file:
+            json.dump(detail, open_file, indent=1)
+        print("Report on {0} samples written to {1}.".format(
+            scores['n_samples'], args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+The files that make up a trained station in its store folder.
+
+A training run leaves six pickles in store_path: the model (orders,
+parameters and fourier fits of the SARMA models), the synthetic samples,
+their statistics per month and hour (see onlinestats.py), the temporal
+diagnostics of the models and samples (see diagnostics.py), a counter
+that keeps track of the samples handed out so far, and the summary of
+the recorded data that an update with newer data starts from (see
+resampling.updater). With
+climate change, the names carry the epoch, e.g., model_2051_2060.p.
+indra and the batch trainer both go through these functions, so that a
+station trained either way can be sampled by indra.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+
+import diagnostics
+import onlinestats
+
+
+def paths(store_path, epoch=None):
+    '''Paths of the model, samples, statistics, diagnostics, counter and
+       record pickles of a station.'''
+
+    if epoch is None:
+        suffix = ''
+    else:
+        suffix = '_{:d}_{:d}'.format(epoch[0], epoch[1])
+
+    return dict(
+        model=os.path.join(store_path, 'model{0}.p'.format(suffix)),
+        syn=os.path.join(store_path, 'syn{0}.p'.format(suffix)),
+        stats=os.path.join(store_path, 'stats{0}.p'.format(suffix)),
+        diagnostics=os.path.join(store_path,
+                                 'diagnostics{0}.p'.format(suffix)),
+        counter=os.path.join(store_path, 'counter{0}.p'.format(suffix)),
+        record=os.path.join(store_path, 'record{0}.p'.format(suffix)))
+
+# ----------- END paths function. -----------
+
+
+def save_model(path_model_save, selmdl, ffit, randseed):
+    '''Save the orders, parameters and endogenous series of the selected
+       models, along with the fourier fits and the random seed.'''
+
+    # The non-seasonal order of the model. This exists in both
+    # ARIMA and SARIMAX models, so it has to exist in the output
+    # of resampling.
+    order = [(p.model.k_ar, 0, p.model.k_ma) for p in selmdl]
+    # Also the endogenous variable.
+    endog = [p.model.endog for p in selmdl]
+
+    params = [p.params for p in selmdl]
+
+    try:
+        # Try to find the seasonal order. If it exists, save the
+        # sarimax model. This should almost always be the case.
+        seasonal_order = [
+            (int(mdl.model.k_seasonal_ar / mdl.model.seasonal_periods),
+             0,
+             int(mdl.model.k_seasonal_ma / mdl.model.seasonal_periods),
+             mdl.model.seasonal_periods)
+            for mdl in selmdl]
+
+        arma_save = dict(order=order, params=params,
+                         seasonal_order=seasonal_order,
+                         ffit=ffit, endog=endog,
+                         randseed=randseed)
+
+    except Exception:
+        # Otherwise, ask for forgiveness and save the ARIMA model.
+        arma_save = dict(order=order, params=params, endog=endog,
+                         ffit=ffit, randseed=randseed)
+
+    with open(path_model_save, "wb") as open_file:
+        pickle.dump(arma_save, open_file)
+
+    return arma_save
+
+# ----------- END save_model function. -----------
+
+
+def save_counter(path_counter_save, n_samples, randseed, counter=0):
+    '''Save the counter of samples handed out.'''
+
+    csave = dict(n_samples=n_samples, randseed=randseed, counter=counter)
+
+    with open(path_counter_save, "wb") as open_file:
+        pickle.dump(csave, open_file)
+
+    return csave
+
+# ----------- END save_counter function. -----------
+
+
+def save_stats(path_stats_save, xout):
+    '''Save the statistics of the samples, gathered in one pass over
+       them.'''
+
+    stats = onlinestats.EnsembleStats()
+    stats.add_ensemble(xout)
+
+    with open(path_stats_save, "wb") as open_file:
+        pickle.dump(stats, open_file)
+
+    return stats
+
+# ----------- END save_stats function. -----------
+
+
+def save_diagnostics(path_diagnostics_save, selmdl, ffit, xout):
+    '''Save the ACF, PACF and periodograms of the recorded series, the
+       residuals of the selected models and the samples.'''
+
+    diag = diagnostics.diagnose(selmdl, ffit, xout)
+
+    with open(path_diagnostics_save, "wb") as open_file:
+        pickle.dump(diag, open_file)
+
+    return diag
+
+# ----------- END save_diagnostics function. -----------
+
+
+def save_record(path_record_save, record):
+    '''Save the summary of the recorded data of a station (see
+       resampling.fit_means).'''
+
+    with open(path_record_save, "wb") as open_file:
+        pickle.dump(record, open_file)
+
+    return record
+
+# ----------- END save_record function. -----------
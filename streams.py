@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Independent random number streams for every stage and sample of a run.
+
+Drawing everything from numpy's one global generator ties every random
+number to the order in which the loops happen to run. Here, every stream
+is derived from the seed of the run and a key with numpy's
+SeedSequence. The keys used in resampling are ('fit_year',) and
+('base_year',), ('noise', model index, sample number), e.g.,
+('noise', 0, 3) for the fourth sample of the first model (tdb), and
+('neighbours', GCM, year, variant), e.g., ('neighbours', 'GCM_A',
+2051, 3). The numbers drawn for a sample then depend only on the seed
+and the key of that sample, so a sample is the same whether it is
+generated alone, in a loop with the others, or in another process.
+
+Parts of a key can be integers or strings (hashed with CRC-32).
+
+@author: Parag Rastogi
+"""
+
+import zlib
+
+import numpy as np
+
+
+def _word(part):
+    '''One part of a key as an unsigned 32-bit integer.'''
+
+    if isinstance(part, (int, np.integer)):
+        return int(part) % 2**32
+
+    return zlib.crc32(str(part).encode('utf-8'))
+
+# ----------- END _word function. -----------
+
+
+def run_seed(randseed=None):
+    '''The seed of a run. Callers that did not pass one get a seed drawn
+       from the global numpy generator, so that petites.setseed still
+       makes them repeatable.'''
+
+    if randseed is None:
+        return int(np.random.randint(0, 2**31 - 1))
+
+    return int(randseed)
+
+# ----------- END run_seed function. -----------
+
+
+def stream(randseed, *key):
+    '''Random number generator for `key` in the run seeded by randseed.'''
+
+    return np.random.default_rng(np.random.SeedSequence(
+        entropy=int(randseed), spawn_key=[_word(x) for x in key]))
+
+# ----------- END stream function. -----------
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures of the tests. The scripts of indra are flat modules in
+the root of the repository, so it is put on the path here. Training runs
+use the ESP-r file of Geneva in gen, with small models so that a run
+takes a few seconds.
+
+Run the tests from the root of the repository with
+    python -m pytest -q tests
+
+@author: Parag Rastogi
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import compression  # noqa: E402
+import indra  # noqa: E402
+
+# Seed file of the training runs.
+PATH_SEED = os.path.join(ROOT, 'gen', 'che_geneva.iwec.a')
+
+# Settings of the training runs.
+N_SAMPLES = 3
+RANDSEED = 3
+ARMA_PARAMS = [1, 0, 0, 0, 24]
+
+
+def train(store_path, path_file_out=None, randseed=RANDSEED,
+          n_samples=N_SAMPLES, **kwargs):
+    '''Train station gen on the seed file into store_path.'''
+
+    if path_file_out is None:
+        path_file_out = os.path.join(store_path, 'syn.a')
+
+    indra.indra(True, 'gen', n_samples, PATH_SEED, path_file_out, 'espr',
+                store_path=store_path, randseed=randseed,
+                arma_params=list(ARMA_PARAMS), **kwargs)
+
+# ----------- END train function. -----------
+
+
+def assert_same_samples(path_a, path_b):
+    '''The samples stored in path_a and path_b are identical.'''
+
+    xout_a = compression.load_pickle(path_a)
+    xout_b = compression.load_pickle(path_b)
+
+    assert len(xout_a) == len(xout_b)
+    np.testing.assert_array_equal(xout_a.values, xout_b.values)
+
+    for k in range(0, len(xout_a)):
+        assert xout_a.key(k) == xout_b.key(k)
+        pd.testing.assert_frame_equal(xout_a.frame(k), xout_b.frame(k))
+
+# ----------- END assert_same_samples function. -----------
+
+
+@pytest.fixture(scope='session')
+def trained(tmp_path_factory):
+    '''Store of an uninterrupted training run, without write out, that
+       the other runs are compared against.'''
+
+    store_path = str(tmp_path_factory.mktemp('trained'))
+    train(store_path)
+
+    return store_path
+
+
+def make_cc_data(years=(2050, 2053), gcms=('GCM_A', 'GCM_B'),
+                 scenarios=('rcp45', 'rcp85'), seed=0):
+    '''Daily outputs of some climate models, as the pickles of
+       wfileio.get_cc_data hold them: a dictionary of scenarios, each a
+       DataFrame indexed by GCM and day. Every GCM has a repeated day and
+       a day with a missing value, which get_cc_data cleans.'''
+
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('{0:04d}-01-01 12:00'.format(years[0]),
+                         '{0:04d}-12-31 12:00'.format(years[1]), freq='D')
+    season = np.cos(2 * np.pi * (days.dayofyear.values - 15) / 365)
+
+    cc_all = dict()
+
+    for sidx, scenario in enumerate(scenarios):
+        tables = list()
+        for gidx, gcm in enumerate(gcms):
+            n_days = days.shape[0]
+            table = pd.DataFrame(dict(
+                tas=(283 + sidx + gidx - 8 * season +
+                     rng.normal(0, 2, n_days)),
+                huss=0.006 - 0.002 * season + rng.normal(0, 5e-4, n_days),
+                ps=96000 + rng.normal(0, 300, n_days),
+                sfcWind=3.5 + rng.normal(0, 0.3, n_days),
+                rsds=150 + 100 * -season + rng.normal(0, 10, n_days)),
+                index=days)
+            table.iloc[40, 0] = np.nan
+            table = pd.concat([table, table.iloc[[100]] + 0.1])
+            table.index = pd.MultiIndex.from_arrays(
+                [[gcm] * table.shape[0], table.index])
+            tables.append(table)
+        cc_all[scenario] = pd.concat(tables)
+
+    return cc_all
+
+# ----------- END make_cc_data function. -----------
+
+
+@pytest.fixture(scope='session')
+def cc_file(tmp_path_factory):
+    '''Pickle of the outputs of make_cc_data.'''
+
+    path_cc_file = str(tmp_path_factory.mktemp('cc') / 'cc.p')
+    pd.to_pickle(make_cc_data(), path_cc_file)
+
+    return path_cc_file
+
+
+@pytest.fixture(scope='session')
+def seed_epw(tmp_path_factory):
+    '''An EPW seed file of one year from seedgen, for the runs that need
+       the atmospheric pressure (climate change), which the ESP-r file
+       does not have.'''
+
+    import seedgen
+
+    return seedgen.write_record(seedgen.make_record(years=1, randseed=1),
+                                str(tmp_path_factory.mktemp('seed_epw')),
+                                'epw')[0]
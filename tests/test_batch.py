@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of training many stations in one go with batch.py: every station of
+a manifest is trained as indra would train it on its own.
+
+@author: Parag Rastogi
+"""
+
+import json
+import os
+
+import pytest
+
+import batch
+import indra
+import seedgen
+import store
+
+from conftest import ARMA_PARAMS, N_SAMPLES, PATH_SEED, RANDSEED
+from conftest import assert_same_samples
+
+
+def test_two_stations(tmp_path):
+    '''A manifest of an ESP-r station and an EPW station, one of them
+       with a missing seed file, is trained with one worker. The stations
+       that can be trained end up with the stores indra makes, and the
+       other fails without stopping the batch.'''
+
+    path_epw = str(tmp_path / 'seed')
+    seedgen.write_record(seedgen.make_record(years=1, randseed=1),
+                         path_epw, 'epw')
+
+    entries = [dict(station_code='GEN', path_file_in=PATH_SEED,
+                    store_path=str(tmp_path / 'gen')),
+               dict(station_code='syn', path_file_in=path_epw,
+                    store_path=str(tmp_path / 'syn'), n_samples=2,
+                    bounds=[1, 99]),
+               dict(station_code='non', path_file_in=str(
+                   tmp_path / 'none.epw'), store_path=str(tmp_path / 'non'))]
+    for entry in entries:
+        entry.update(randseed=RANDSEED, arma_params=list(ARMA_PARAMS))
+    entries[0]['n_samples'] = N_SAMPLES
+
+    path_manifest = str(tmp_path / 'stations.json')
+    with open(path_manifest, 'w') as open_file:
+        json.dump(entries, open_file)
+
+    stations = batch.read_manifest(path_manifest)
+
+    assert [x['station_code'] for x in stations] == ['gen', 'syn', 'non']
+    assert stations[0]['bounds'] == batch.DEFAULTS['bounds']
+
+    summary = batch.run(stations, workers=1)
+
+    assert [x['status'] for x in summary] == ['done', 'done', 'failed']
+    assert summary[2]['error'].startswith('prepare')
+    for this_summary in summary[0:2]:
+        assert this_summary['error'] is None
+        assert this_summary['n_fits'] > 0
+
+    for station in stations[0:2]:
+
+        store_files = store.paths(station['store_path'], None)
+        for key in ['syn', 'model', 'counter', 'record']:
+            assert os.path.isfile(store_files[key])
+        assert not os.path.isfile(os.path.join(station['store_path'],
+                                               batch.STATE_FILE))
+
+        # indra trains the station the same way on its own.
+        store_path = station['store_path'] + '_indra'
+        os.makedirs(store_path)
+        indra.indra(True, station['station_code'], station['n_samples'],
+                    station['path_file_in'],
+                    os.path.join(store_path, 'syn.epw'), 'epw',
+                    store_path=store_path, randseed=RANDSEED,
+                    arma_params=list(ARMA_PARAMS),
+                    bounds=station['bounds'])
+
+        assert_same_samples(store_files['syn'],
+                            store.paths(store_path, None)['syn'])
+
+
+def test_manifest_needs_seed(tmp_path):
+    '''Stations without a seed file are refused.'''
+
+    path_manifest = str(tmp_path / 'stations.json')
+    with open(path_manifest, 'w') as open_file:
+        json.dump([dict(station_code='gen')], open_file)
+
+    with pytest.raises(KeyError):
+        batch.read_manifest(path_manifest)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of checkpointed training (checkpoint.py): a run that is stopped
+part-way through and resumed gives the same samples and model as a run
+that was not stopped.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import checkpoint
+import resampling
+
+from conftest import RANDSEED, assert_same_samples, train
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _interrupt(*args, **kwargs):
+    raise Interrupted()
+
+
+def _refit(*args, **kwargs):
+    raise AssertionError("A finished stage was computed again.")
+
+
+def test_resume_is_identical(trained, tmp_path, monkeypatch):
+    '''Stop a run in nearest_neighbour, after the means, models, noise
+       and samples have been checkpointed, and resume it.'''
+
+    store_path = str(tmp_path)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(resampling, 'nearest_neighbour', _interrupt)
+        with pytest.raises(Interrupted):
+            train(store_path, checkpoints=True)
+
+    # The checkpoints stay on disk, and the module lets go of them.
+    assert not checkpoint.ENABLED
+    assert os.path.isfile(os.path.join(store_path, 'checkpoints',
+                                       checkpoint.CONFIG_FILE))
+    assert not os.path.isfile(os.path.join(store_path, 'syn.p'))
+
+    # Nothing that was checkpointed is computed again.
+    with monkeypatch.context() as patch:
+        for func in ['fit_means', 'simulate_noise', 'create_future_no_cc']:
+            patch.setattr(resampling, func, _refit)
+        train(store_path, checkpoints=True)
+
+    assert not os.path.isdir(os.path.join(store_path, 'checkpoints'))
+    assert_same_samples(os.path.join(trained, 'syn.p'),
+                        os.path.join(store_path, 'syn.p'))
+
+    with open(os.path.join(trained, 'model.p'), 'rb') as open_file:
+        model_a = pickle.load(open_file)
+    with open(os.path.join(store_path, 'model.p'), 'rb') as open_file:
+        model_b = pickle.load(open_file)
+
+    assert model_a['order'] == model_b['order']
+    assert model_a['randseed'] == model_b['randseed']
+    for params_a, params_b in zip(model_a['params'], model_b['params']):
+        np.testing.assert_array_equal(params_a, params_b)
+    for ffit_a, ffit_b in zip(model_a['ffit'], model_b['ffit']):
+        np.testing.assert_array_equal(ffit_a, ffit_b)
+
+
+def test_other_settings_do_not_resume(tmp_path, monkeypatch):
+    '''Checkpoints of a run with another random seed are not used.'''
+
+    store_path = str(tmp_path)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(resampling, 'nearest_neighbour', _interrupt)
+        with pytest.raises(Interrupted):
+            train(store_path, checkpoints=True)
+
+    calls = []
+    fit_means = resampling.fit_means
+
+    def _counted(*args, **kwargs):
+        calls.append(1)
+        return fit_means(*args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(resampling, 'fit_means', _counted)
+        train(store_path, randseed=RANDSEED + 1, checkpoints=True)
+
+    assert calls
+
+
+def test_off_by_default(tmp_path, monkeypatch):
+    '''Training writes no checkpoints unless asked to.'''
+
+    def _start(*args, **kwargs):
+        raise AssertionError("Checkpointing was started.")
+
+    monkeypatch.setattr(checkpoint, 'start', _start)
+    train(str(tmp_path))
+
+    assert not os.path.isdir(os.path.join(str(tmp_path), 'checkpoints'))
+
+
+def test_start_clears_folders(tmp_path):
+    '''A new run clears the checkpoint folder, folders in it included.'''
+
+    path = str(tmp_path / 'checkpoints')
+    os.makedirs(os.path.join(path, 'old', 'deeper'))
+    with open(os.path.join(path, 'old_stage.p'), 'wb') as open_file:
+        open_file.write(b'old')
+
+    try:
+        assert checkpoint.start(path, dict(run=1), 5) == 5
+        assert os.listdir(path) == [checkpoint.CONFIG_FILE]
+    finally:
+        checkpoint.finish()
+
+    assert not os.path.isdir(path)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the compressed sample stores and weather files of
+compression.py: everything compressed reads back as it was written.
+
+@author: Parag Rastogi
+"""
+
+import gzip
+import lzma
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import compression
+import seedgen
+import wfileio as wf
+
+OPENERS = dict(gzip=gzip.open, lzma=lzma.open)
+
+
+@pytest.mark.parametrize('codec', compression.CODECS)
+@pytest.mark.parametrize('size', [0, 999, 1000, 25000])
+def test_chunked_writer_round_trip(tmp_path, codec, size):
+    '''Data written in pieces of any size, across several chunks or
+       none, is read back by the standard library and by open_read.'''
+
+    data = np.random.default_rng(size).integers(
+        0, 16, size, dtype=np.uint8).tobytes()
+    path = str(tmp_path / 'data.bin')
+
+    with compression.ChunkedWriter(path, codec, workers=3,
+                                   chunk=1000) as open_file:
+        for first in range(0, size, 777):
+            open_file.write(memoryview(data[first:first + 777]))
+
+    assert compression.codec_of(path) == codec
+
+    with OPENERS[codec](path, 'rb') as open_file:
+        assert open_file.read() == data
+    with compression.open_read(path) as open_file:
+        assert open_file.read() == data
+
+
+@pytest.mark.parametrize('codec', [None, 'gzip', 'lzma'])
+def test_pickle_round_trip(tmp_path, codec):
+    '''Pickles of arrays and frames load back unchanged, with the codec
+       given or the one enabled for the sample store.'''
+
+    obj = dict(values=np.random.default_rng(0).normal(
+        size=[3, 8760, 2]).astype(np.float32),
+        frame=pd.DataFrame(dict(tdb=np.arange(0., 100.))))
+    path = str(tmp_path / 'syn.p')
+
+    try:
+        if codec is not None:
+            compression.enable(codec)
+        compression.dump_pickle(obj, path)
+    finally:
+        compression.disable()
+
+    assert compression.CODEC is None
+    assert compression.codec_of(path) == codec
+
+    loaded = compression.load_pickle(path)
+    np.testing.assert_array_equal(loaded['values'], obj['values'])
+    pd.testing.assert_frame_equal(loaded['frame'], obj['frame'])
+
+
+@pytest.mark.parametrize('codec', compression.CODECS)
+def test_compressed_weather_files(tmp_path, codec):
+    '''Weather files compressed after they are written are read as the
+       original.'''
+
+    record = seedgen.make_record(years=1, randseed=1)
+    path = seedgen.write_record(record, str(tmp_path), 'epw')[0]
+    expected, _, _ = wf.get_weather('syn', path)
+
+    path_out = compression.compress_file(path, codec)
+
+    assert not os.path.isfile(path)
+    assert path_out == path + compression.EXTENSIONS[codec]
+    assert compression.strip_extension(path_out) == path
+
+    data, _, _ = wf.get_weather('syn', path_out)
+    pd.testing.assert_frame_equal(data, expected)
+
+
+def test_zip_bundle_from_threads(tmp_path):
+    '''Files added from several threads all end up in the archive.'''
+
+    contents = dict()
+    for k in range(0, 8):
+        path = str(tmp_path / 'syn_{0:04d}.epw'.format(k))
+        contents[os.path.basename(path)] = os.urandom(1000) * 20
+        with open(path, 'wb') as open_file:
+            open_file.write(contents[os.path.basename(path)])
+
+    with compression.ZipBundle(str(tmp_path / 'syn')) as bundle:
+        threads = [threading.Thread(target=bundle.add,
+                                    args=(str(tmp_path / name),))
+                   for name in contents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert bundle.path == str(tmp_path / 'syn.zip')
+
+    with zipfile.ZipFile(bundle.path) as archive:
+        assert sorted(archive.namelist()) == sorted(contents)
+        for name, data in contents.items():
+            assert archive.read(name) == data
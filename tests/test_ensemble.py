@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the binary ensemble files of wfileio.py (indra --file_type npz
+or feather): everything written by give_ensemble is read back by
+get_ensemble.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import compression
+import wfileio as wf
+
+from conftest import PATH_SEED
+
+WINDOW = ('06-01', '06-10')
+
+
+def _formats():
+    return [pytest.param(x, marks=pytest.mark.skipif(
+        x == 'feather' and wf.pyarrow is None, reason='needs pyarrow'))
+        for x in wf.ensemble_formats]
+
+
+@pytest.mark.parametrize('window', [None, WINDOW])
+@pytest.mark.parametrize('file_type', _formats())
+def test_round_trip(trained, tmp_path, file_type, window):
+    '''The values, columns, sample keys and donor days of every sample
+       are read back as they were written, for whole samples and for a
+       window of them.'''
+
+    xout = compression.load_pickle(os.path.join(trained, 'syn.p'))
+    _, locdata, _ = wf.get_weather('gen', PATH_SEED)
+
+    # The solar columns are filled with recorded days.
+    donated = sum([x[0] for x in xout.donors], [])
+    assert donated
+
+    path = wf.give_ensemble(xout, locdata, 'gen',
+                            str(tmp_path / 'ensemble.bin'),
+                            file_type=file_type, window=window)
+
+    assert path == str(tmp_path / ('ensemble.' + file_type))
+
+    loaded = wf.get_ensemble(path)
+    meta = loaded['meta']
+
+    frame = xout.frame(0)
+    if window is None:
+        rows = np.arange(0, xout.n_hours)
+    else:
+        year = frame.index.year[0]
+        rows = np.flatnonzero((frame.index >= '{0}-06-01'.format(year)) &
+                              (frame.index < '{0}-06-11'.format(year)))
+        assert rows.size == 240
+
+    assert meta['station_code'] == 'gen'
+    assert meta['n_samples'] == len(xout)
+    assert meta['n_hours'] == rows.size
+    assert sorted(meta['columns']) == sorted(
+        meta['sampled'] + meta['shared'])
+    assert set(xout.per_sample) <= set(meta['sampled'])
+    assert set(donated) <= set(meta['sampled'])
+
+    for k in range(0, len(xout)):
+        gcm, year, variant = xout.key(k)
+        assert loaded['sample_gcm'][k] == gcm
+        assert loaded['sample_year'][k] == year
+        assert loaded['sample_variant'][k] == variant
+
+    for col in wf.calendar_cols:
+        np.testing.assert_array_equal(loaded[col],
+                                      frame[col].values[rows])
+
+    for k in range(0, len(xout)):
+        frame = xout.frame(k)
+        for col in meta['sampled']:
+            assert loaded[col].dtype == np.float32
+            np.testing.assert_array_equal(
+                loaded[col][k], frame[col].values[rows].astype(np.float32))
+
+    for col in meta['shared']:
+        np.testing.assert_array_equal(
+            loaded[col], frame[col].values[rows].astype(np.float32))
+
+    if file_type == 'npz':
+        # The arrays are mapped, not read into memory.
+        assert isinstance(loaded['tdb'], np.memmap)
+
+
+def test_unknown_format(trained, tmp_path):
+    '''Only the ensemble formats are written as ensembles.'''
+
+    xout = compression.load_pickle(os.path.join(trained, 'syn.p'))
+
+    with pytest.raises(ValueError):
+        wf.give_ensemble(xout, dict(), 'gen', str(tmp_path / 'ensemble'),
+                         file_type='epw')
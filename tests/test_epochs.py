@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of training several future epochs in one pass (indra epochs):
+every epoch gets the record summary, models and samples of a run for
+that epoch alone.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+import indra
+import store
+
+from conftest import ARMA_PARAMS, RANDSEED, assert_same_samples
+
+EPOCHS = [[2050, 2051], [2052, 2053]]
+
+
+def _train(seed_epw, cc_file, store_path, **kwargs):
+    indra.indra(True, 'syn', 2, seed_epw,
+                os.path.join(store_path, 'syn.epw'), 'epw',
+                store_path=store_path, randseed=RANDSEED,
+                arma_params=list(ARMA_PARAMS), climate_change=True,
+                path_cc_file=cc_file, cc_scenario='rcp85', **kwargs)
+
+
+def _load(path):
+    with open(path, 'rb') as open_file:
+        return pickle.load(open_file)
+
+
+def test_epochs_equal_single_runs(seed_epw, cc_file, tmp_path):
+    '''One run over both epochs against one run per epoch.'''
+
+    path_multi = str(tmp_path / 'multi')
+    _train(seed_epw, cc_file, path_multi, epochs=EPOCHS)
+
+    for epoch in EPOCHS:
+
+        path_single = str(tmp_path / 'single_{0}'.format(epoch[0]))
+        _train(seed_epw, cc_file, path_single, epoch=epoch)
+
+        files_multi = store.paths(path_multi, epoch)
+        files_single = store.paths(path_single, epoch)
+
+        rec_multi = _load(files_multi['record'])
+        rec_single = _load(files_single['record'])
+
+        assert rec_multi['n_rows'] == rec_single['n_rows']
+        assert rec_multi['last_stamp'] == rec_single['last_stamp']
+        for key in ['gram', 'xty']:
+            np.testing.assert_array_equal(rec_multi['harmonics'][key],
+                                          rec_single['harmonics'][key])
+
+        model_multi = _load(files_multi['model'])
+        model_single = _load(files_single['model'])
+
+        assert model_multi['order'] == model_single['order']
+        assert (model_multi['seasonal_order'] ==
+                model_single['seasonal_order'])
+        for key in ['params', 'ffit']:
+            for part_multi, part_single in zip(model_multi[key],
+                                               model_single[key]):
+                np.testing.assert_array_equal(part_multi, part_single)
+
+        assert_same_samples(files_multi['syn'], files_single['syn'])
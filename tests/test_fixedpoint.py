@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the fixed-point codec of fixedpoint.py: values read back are
+within the maximum errors stated in its docstring.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import compression
+import fixedpoint
+
+from conftest import train
+
+# Maximum errors in the table of the docstring of fixedpoint.py.
+STATED_ERRORS = dict(tdb=0.0025, tdp=0.0025, rh=0.002, ghi=0.02,
+                     dni=0.02, dhi=0.02, wspd=0.0025, wdr=0.005,
+                     wdir=0.005, atmpr=1.)
+
+
+def _bound(var, values):
+    '''Largest error allowed for values of var: half a scale, and the
+       rounding of the float32 product and sum that decode them.'''
+
+    offset = fixedpoint.FORMATS[var][1]
+
+    return (fixedpoint.max_error(var) + np.finfo(np.float32).eps *
+            (np.abs(values - offset) + abs(offset)))
+
+
+def _range(var):
+    scale, offset = fixedpoint.FORMATS[var]
+    return (offset - fixedpoint.CODE_MAX * scale,
+            offset + fixedpoint.CODE_MAX * scale)
+
+
+def test_stated_errors():
+    '''max_error gives the errors stated in the docstring.'''
+
+    assert sorted(STATED_ERRORS) == sorted(fixedpoint.FORMATS)
+    for var, error in STATED_ERRORS.items():
+        assert fixedpoint.max_error(var) == pytest.approx(error)
+
+
+@pytest.mark.parametrize('var', sorted(fixedpoint.FORMATS))
+def test_error_bounds(var):
+    '''Values anywhere in the range of var, its ends included, are read
+       back within the maximum error.'''
+
+    low, high = _range(var)
+    scale, offset = fixedpoint.FORMATS[var]
+
+    values = np.concatenate([
+        np.random.default_rng(0).uniform(low, high, 100000),
+        [low, high, offset, offset + scale / 2, offset - scale / 2]])
+
+    codes = fixedpoint.encode(values[:, None], [scale], [offset])
+    back = fixedpoint.decode(codes, [scale], [offset])[:, 0]
+
+    assert codes.dtype == np.int16
+    assert back.dtype == np.float32
+    assert (np.abs(back - values) <= _bound(var, values)).all()
+    # The rounding of float32 stays below 1e-4 of a unit.
+    assert (np.abs(back - values) <=
+            fixedpoint.max_error(var) + 1e-4).all()
+
+
+def test_missing_and_out_of_range():
+    '''Missing values stay missing, and values beyond the range are read
+       back as its nearest end.'''
+
+    scale, offset = fixedpoint.FORMATS['tdb']
+    low, high = _range('tdb')
+
+    values = np.array([[np.nan], [np.inf], [-1000.], [1000.], [20.]])
+    back = fixedpoint.decode(fixedpoint.encode(values, [scale], [offset]),
+                             [scale], [offset])[:, 0]
+
+    assert np.isnan(back[0:2]).all()
+    np.testing.assert_allclose(back[2:4], [low, high], rtol=1e-6)
+    assert abs(back[4] - 20.) <= fixedpoint.max_error('tdb')
+
+
+def test_packed_ensemble(trained):
+    '''An Ensemble packed and pickled loads back as float32 values, and
+       donor days, within the maximum errors.'''
+
+    xout = compression.load_pickle(os.path.join(trained, 'syn.p'))
+
+    packed = fixedpoint.pack(xout)
+    assert packed.values.dtype == np.int16
+    # The Ensemble itself is left alone.
+    assert xout.values.dtype == np.float32
+
+    loaded = pickle.loads(pickle.dumps(packed))
+
+    assert loaded.values.dtype == np.float32
+    assert 'fixed_point' not in loaded.__dict__
+
+    for vidx, var in enumerate(xout.varying):
+        values = xout.values[:, :, vidx]
+        assert (np.abs(loaded.values[:, :, vidx] - values) <=
+                _bound(var, values)).all()
+
+    for (columns, table, picks), (_, table_back, picks_back) in zip(
+            xout.donors, loaded.donors):
+        np.testing.assert_array_equal(picks_back, picks)
+        for cidx, var in enumerate(columns):
+            values = table[..., cidx]
+            assert (np.abs(table_back[..., cidx] - values) <=
+                    _bound(var, values)).all()
+
+
+def test_fixed_point_training(trained, tmp_path):
+    '''Samples trained with --fixed_point are within the maximum errors
+       of those trained without, and later runs store floats again.'''
+
+    store_path = str(tmp_path)
+    train(store_path, fixed_point=True)
+
+    assert not fixedpoint.ENABLED
+
+    # The values are stored as int16 codes.
+    assert (os.path.getsize(os.path.join(store_path, 'syn.p')) <
+            os.path.getsize(os.path.join(trained, 'syn.p')))
+
+    xout = compression.load_pickle(os.path.join(trained, 'syn.p'))
+    xout_fp = compression.load_pickle(os.path.join(store_path, 'syn.p'))
+
+    for k in range(0, len(xout)):
+        frame, frame_fp = xout.frame(k), xout_fp.frame(k)
+        for var in xout.per_sample:
+            values = frame[var].values
+            assert (np.abs(frame_fp[var].values - values) <=
+                    _bound(var, values)).all()
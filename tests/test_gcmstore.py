@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the store of climate model outputs of gcmstore.py: reading an
+epoch through the store gives what the pickle gives.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import gcmstore
+import wfileio as wf
+
+
+@pytest.mark.parametrize('cc_scenario', ['rcp45', 'rcp85'])
+@pytest.mark.parametrize('epoch', [[2050, 2053], [2051, 2052], [2053, 2060]])
+def test_store_equals_pickle(cc_file, tmp_path, cc_scenario, epoch):
+    '''get_cc_data returns the same frame from the store and from the
+       pickle.'''
+
+    path_store = str(tmp_path / 'ccs')
+    index = gcmstore.build(cc_file, path_store)
+
+    assert gcmstore.is_store(path_store)
+    assert not gcmstore.is_store(os.path.dirname(cc_file))
+    assert (index['scenarios'][cc_scenario]['GCM_A']['years'] ==
+            [2050, 2051, 2052, 2053])
+
+    expected = wf.get_cc_data(cc_file, cc_scenario, epoch)
+    cc_data = wf.get_cc_data(path_store, cc_scenario, epoch)
+
+    pd.testing.assert_frame_equal(cc_data, expected)
+    assert cc_data.index.is_unique
+    assert not cc_data.isna().any(axis=None)
+
+
+def test_epoch_without_data(cc_file, tmp_path):
+    '''An epoch that no GCM covers is an error.'''
+
+    path_store = str(tmp_path / 'ccs')
+    gcmstore.build(cc_file, path_store)
+
+    with pytest.raises(ValueError):
+        gcmstore.load(path_store, 'rcp85', [2100, 2110])
+    with pytest.raises(KeyError):
+        gcmstore.load(path_store, 'rcp26', [2050, 2053])
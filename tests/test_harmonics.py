@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the closed-form harmonic regression in harmonics.py.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import curve_fit
+
+import fourier
+import harmonics
+
+
+def _data(n_hours=8760, seed=0):
+    '''An hourly year of tdb and rh made of harmonics and noise.'''
+
+    rng = np.random.default_rng(seed)
+    x = np.arange(0, n_hours, dtype=float)
+
+    tdb = (10 - 8 * np.cos(2 * np.pi * x / 8760) +
+           np.sin(2 * np.pi * x / 4380) -
+           3 * np.cos(2 * np.pi * x / 24) + rng.normal(0, 2, n_hours))
+    rh = (70 + 10 * np.cos(2 * np.pi * x / 8760) +
+          8 * np.sin(2 * np.pi * x / 24) + rng.normal(0, 5, n_hours))
+
+    return x, pd.DataFrame(dict(tdb=tdb, rh=rh))
+
+
+@pytest.mark.parametrize('fstr', sorted(harmonics.HARMONIC_SETS))
+def test_solve_harmonics_matches_lstsq(fstr):
+    '''Every named fit equals the least-squares fit on its own design
+       matrix.'''
+
+    x, ydata = _data()
+    var = fstr.split('_')[0]
+
+    coefs = harmonics.solve_harmonics(harmonics.harmonic_stats(x, ydata),
+                                      fstr)
+
+    dmat = harmonics.design_matrix(x, harmonics.HARMONIC_SETS[fstr])
+    expected = np.linalg.lstsq(dmat, ydata[var].values, rcond=None)[0]
+
+    np.testing.assert_allclose(coefs, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_coefficients_follow_fourier():
+    '''The coefficients are in the order fourier.fit expects, so the fit
+       evaluated by fourier.py is the fitted series.'''
+
+    x, ydata = _data()
+
+    for fstr in harmonics.HARMONIC_SETS:
+        var = fstr.split('_')[0]
+        periods = harmonics.HARMONIC_SETS[fstr]
+        coefs = harmonics.solve_harmonics(
+            harmonics.harmonic_stats(x, ydata), fstr)
+
+        np.testing.assert_allclose(
+            fourier.fit(fstr, x, *coefs),
+            harmonics.design_matrix(x, periods) @ coefs,
+            rtol=1e-9, atol=1e-9, err_msg=var)
+
+
+def test_missing_rows_and_combined_stats():
+    '''Rows with missing values are dropped, and the statistics of two
+       stretches add up to those of the whole.'''
+
+    x, ydata = _data()
+    ydata.iloc[100:150, 0] = np.nan
+
+    whole = harmonics.harmonic_stats(x, ydata)
+    first = harmonics.harmonic_stats(x[:4000], ydata.iloc[:4000])
+    second = harmonics.harmonic_stats(x[4000:], ydata.iloc[4000:])
+
+    assert whole['n_obs'] == 8760 - 50
+    assert first['n_obs'] + second['n_obs'] == whole['n_obs']
+    np.testing.assert_allclose(first['gram'] + second['gram'],
+                               whole['gram'])
+    np.testing.assert_allclose(first['xty'] + second['xty'], whole['xty'])
+
+    keep = np.isfinite(ydata.values).all(axis=1)
+    dmat = harmonics.design_matrix(x[keep], harmonics.ALL_PERIODS)
+    expected = np.linalg.lstsq(dmat, ydata['tdb'].values[keep],
+                               rcond=None)[0]
+
+    np.testing.assert_allclose(harmonics.solve_harmonics(whole, 'tdb'),
+                               expected, rtol=1e-9, atol=1e-9)
+
+
+def test_matches_curve_fit():
+    '''The closed form gives the coefficients curve_fit converged to
+       before.'''
+
+    x, ydata = _data()
+    stats = harmonics.harmonic_stats(x, ydata)
+
+    for fstr, func in [('tdb', fourier.fit_tdb), ('rh', fourier.fit_rh)]:
+        var = fstr.split('_')[0]
+        expected = curve_fit(func, x, ydata[var].values)[0]
+
+        np.testing.assert_allclose(harmonics.solve_harmonics(stats, fstr),
+                                   expected, rtol=1e-6, atol=1e-6)
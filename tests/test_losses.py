@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the ensemble loss functions of losses.py.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+from scipy import stats
+
+import losses
+
+
+def _ensemble(seed=0):
+    '''Samples and a reference with ties, like the zeros of solar
+       radiation at night, and samples without ties.'''
+
+    rng = np.random.default_rng(seed)
+
+    reference = np.maximum(rng.normal(100, 200, 500), 0)
+    samples = np.maximum(rng.normal(120, 180, [6, 400]), 0)
+    samples[0] = 0
+    samples[1] = rng.normal(0, 1, 400)
+    samples[2] = np.round(samples[2], -2)
+
+    return samples, reference
+
+
+def test_ks_distance_matches_scipy():
+    '''Every row gives the statistic of scipy's two-sample test.'''
+
+    samples, reference = _ensemble()
+
+    expected = [stats.ks_2samp(row, reference).statistic
+                for row in samples]
+
+    np.testing.assert_allclose(losses.ks_distance(samples, reference),
+                               expected, rtol=0, atol=1e-15)
+
+
+def test_ks_distance_of_identical_data():
+    '''The distance of data to itself is zero, ties or not.'''
+
+    samples, reference = _ensemble()
+
+    np.testing.assert_array_equal(
+        losses.ks_distance(reference[None, :], reference), [0.])
+    np.testing.assert_array_equal(
+        losses.ks_distance(samples[2:3], samples[2]), [0.])
+
+
+def test_rmse_and_mae_per_row():
+    '''The batched errors equal those of each row, skipping missing
+       values.'''
+
+    samples, reference = _ensemble()
+    reference = reference[:400].copy()
+    reference[::7] = np.nan
+
+    keep = np.isfinite(reference)
+
+    for k, row in enumerate(samples):
+        error = row[keep] - reference[keep]
+        np.testing.assert_allclose(losses.rmse(samples, reference)[k],
+                                   np.sqrt(np.mean(error ** 2)))
+        np.testing.assert_allclose(losses.mae(samples, reference)[k],
+                                   np.mean(np.abs(error)))
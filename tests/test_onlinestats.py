@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the streaming ensemble statistics of onlinestats.py against
+pandas.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+import pandas as pd
+
+import onlinestats
+import timeindex
+
+
+def _samples(n_samples=10, seed=0):
+    '''A list of samples of tdb and rh, with a few missing values.'''
+
+    rng = np.random.default_rng(seed)
+    index = timeindex.noleap_index(2001)
+    x = np.arange(0, index.shape[0])
+
+    samples = list()
+    for _ in range(0, n_samples):
+        tdb = (10 - 8 * np.cos(2 * np.pi * x / 8760) +
+               rng.normal(0, 3, x.shape[0]))
+        rh = np.clip(70 + rng.normal(0, 15, x.shape[0]), 0, 100)
+        tdb[rng.integers(0, x.shape[0], 50)] = np.nan
+        samples.append(pd.DataFrame(dict(tdb=tdb, rh=rh), index=index))
+
+    return samples
+
+
+def _stats(samples, chunk=onlinestats.CHUNK):
+    stats = onlinestats.EnsembleStats(['tdb', 'rh'])
+    stats.add_ensemble(samples, chunk=chunk)
+    return stats
+
+
+def test_summary_matches_pandas():
+    '''Counts, means, standard deviations, minima and maxima are those
+       of pandas, and the quantiles are within a bin width.'''
+
+    samples = _samples()
+    summary = _stats(samples, chunk=3).summary(by='month_hour')
+
+    data = pd.concat(samples)
+    grouped = data.groupby([data.index.month, data.index.hour])
+
+    for var in ['tdb', 'rh']:
+        width = np.diff(onlinestats.RANGES[var])[0] / onlinestats.N_BINS
+
+        np.testing.assert_array_equal(summary[(var, 'count')].values,
+                                      grouped[var].count().values)
+        np.testing.assert_allclose(summary[(var, 'mean')].values,
+                                   grouped[var].mean().values, rtol=1e-10)
+        np.testing.assert_allclose(summary[(var, 'std')].values,
+                                   grouped[var].std().values, rtol=1e-10)
+        np.testing.assert_array_equal(summary[(var, 'min')].values,
+                                      grouped[var].min().values)
+        np.testing.assert_array_equal(summary[(var, 'max')].values,
+                                      grouped[var].max().values)
+
+        # The histogram finds the value of rank q * count, which is in the
+        # same bin as the quantile of the inverse of the distribution.
+        for stat, q in onlinestats.QUANTILES.items():
+            expected = grouped[var].agg(
+                lambda x: np.quantile(x.dropna(), q, method='inverted_cdf'))
+            assert (np.abs(summary[(var, stat)].values - expected.values) <=
+                    width).all()
+
+
+def test_merge_equals_one_pass():
+    '''Statistics gathered in two parts and merged are those of one pass
+       over all the samples.'''
+
+    samples = _samples()
+    whole = _stats(samples)
+
+    merged = _stats(samples[:4])
+    merged.merge(_stats(samples[4:]))
+
+    assert merged.n_samples == whole.n_samples == len(samples)
+
+    for var in ['tdb', 'rh']:
+        np.testing.assert_array_equal(merged.count[var], whole.count[var])
+        np.testing.assert_allclose(merged.mean[var], whole.mean[var],
+                                   rtol=1e-12)
+        np.testing.assert_allclose(merged.m2[var], whole.m2[var],
+                                   rtol=1e-10)
+        np.testing.assert_array_equal(merged.min[var], whole.min[var])
+        np.testing.assert_array_equal(merged.max[var], whole.max[var])
+        np.testing.assert_array_equal(merged.hist[var], whole.hist[var])
+
+    for by in ['month', 'hour', None]:
+        pd.testing.assert_frame_equal(merged.summary(by=by),
+                                      whole.summary(by=by))
+
+
+def test_grouped_summaries_match_pandas():
+    '''Statistics per month, per hour and overall come from the (month,
+       hour) groups without loss.'''
+
+    samples = _samples(n_samples=3)
+    stats = _stats(samples)
+    data = pd.concat(samples)
+
+    for by, labels in [('month', data.index.month),
+                       ('hour', data.index.hour),
+                       (None, np.zeros(data.shape[0], dtype=int))]:
+        summary = stats.summary(by=by, stats=('count', 'mean', 'std'))
+        grouped = data.groupby(labels)['tdb']
+
+        np.testing.assert_array_equal(summary[('tdb', 'count')].values,
+                                      grouped.count().values)
+        np.testing.assert_allclose(summary[('tdb', 'mean')].values,
+                                   grouped.mean().values, rtol=1e-10)
+        np.testing.assert_allclose(summary[('tdb', 'std')].values,
+                                   grouped.std().values, rtol=1e-10)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the background writer of pipeline.py: training with write out
+gives the same samples as training without, and the files it writes are
+those written one sample at a time afterwards.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import pipeline
+import session
+
+from conftest import N_SAMPLES, PATH_SEED, assert_same_samples, train
+
+
+def test_sample_path():
+    '''Files of samples with and without a climate model.'''
+
+    assert (pipeline.sample_path('out/syn.epw', ('', 2001, 3)) ==
+            'out/syn_0003.epw')
+    assert (pipeline.sample_path('out/syn.epw', ('GCM_A', 2051, 3)) ==
+            'out/syn_GCM_A_2051_0003.epw')
+
+
+def test_pipeline_output_is_identical(trained, tmp_path):
+    '''Samples stored and written with the pipeline equal those of a run
+       without it, written afterwards.'''
+
+    store_path = str(tmp_path / 'store')
+    out_path = tmp_path / 'out'
+    out_path.mkdir()
+
+    train(store_path, path_file_out=str(out_path / 'syn.a'),
+          write_out=True, writers=2)
+
+    assert_same_samples(os.path.join(trained, 'syn.p'),
+                        os.path.join(store_path, 'syn.p'))
+
+    written = sorted(os.listdir(str(out_path)))
+    assert len(written) == N_SAMPLES
+
+    again_path = tmp_path / 'again'
+    again_path.mkdir()
+
+    with session.Station('gen', store_path=trained,
+                         path_file_in=PATH_SEED) as station:
+        for k in range(0, N_SAMPLES):
+            path_written = station.write(
+                k, pipeline.sample_path(str(again_path / 'syn.a'),
+                                        station.ensemble.key(k)),
+                file_type='espr')
+
+            with open(path_written, 'rb') as open_file:
+                expected = open_file.read()
+            with open(os.path.join(str(out_path),
+                                   os.path.basename(path_written)),
+                      'rb') as open_file:
+                assert open_file.read() == expected
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the synthetic seed records of seedgen.py.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import compression
+import indra
+import seedgen
+import wfileio as wf
+
+# Quantiles (in %) the samples are clipped to, as indra's defaults.
+BOUNDS = [0.01, 99.9]
+
+
+def test_gaps_are_left_missing():
+    '''Gaps are missing in every gap variable and in the dew point, and
+       are interpolated only if asked.'''
+
+    record = seedgen.make_record(years=2, randseed=1, gap_rate=5)
+    filled = seedgen.make_record(years=2, randseed=1, gap_rate=5,
+                                 gap_fill=True)
+
+    for year_data, year_filled in zip(record, filled):
+        gaps = year_data[seedgen.GAP_VARS].isna()
+        assert gaps.values.any()
+        # The same hours are missing in all the gap variables.
+        assert (gaps.values == gaps.values[:, :1]).all()
+        np.testing.assert_array_equal(year_data['tdp'].isna().values,
+                                      gaps.values[:, 0])
+        assert not year_filled[seedgen.GAP_VARS + ['tdp']].isna().any(
+            axis=None)
+
+
+def test_epw_gaps_are_read_as_missing(tmp_path):
+    '''Gaps written to EPW files come back missing, and the other hours
+       come back to the precision of the file.'''
+
+    record = seedgen.make_record(years=1, randseed=1, gap_rate=5)
+    paths = seedgen.write_record(record, str(tmp_path), 'epw')
+
+    data, _, _ = wf.get_weather('syn', paths[0])
+
+    for var in ['tdb', 'rh', 'tdp']:
+        np.testing.assert_array_equal(data[var].isna().values,
+                                      record[0][var].isna().values)
+        np.testing.assert_allclose(data[var].values,
+                                   record[0][var].values,
+                                   atol=0.051, equal_nan=True)
+
+
+def test_missing_years_keep_the_other_years():
+    '''Leaving years out does not change the years that are kept.'''
+
+    record = seedgen.make_record(years=2, randseed=1, gap_rate=5)
+    some = seedgen.make_record(years=2, randseed=1, gap_rate=5,
+                               missing_years=0.5)
+
+    kept = dict([(int(x['year'].values[0]), x) for x in record])
+
+    assert 0 < len(some) < len(record)
+    for year_data in some:
+        pd.testing.assert_frame_equal(
+            year_data, kept[int(year_data['year'].values[0])])
+
+
+def test_training_on_gaps_keeps_the_bounds(tmp_path):
+    '''Samples trained on a record with gaps, January included, stay
+       within the monthly quantiles of the record that the cleaner clips
+       them to.'''
+
+    record = seedgen.make_record(years=2, randseed=1, gap_rate=3)
+    january = np.flatnonzero(record[0].index.month == 1)[100:110]
+    record[0].iloc[january, [record[0].columns.get_loc(x)
+                             for x in seedgen.GAP_VARS + ['tdp']]] = np.nan
+
+    seed_path = str(tmp_path / 'seed')
+    seedgen.write_record(record, seed_path, 'epw')
+    store_path = str(tmp_path / 'store')
+
+    indra.indra(True, 'syn', 3, seed_path, str(tmp_path / 'syn.epw'),
+                'epw', store_path=store_path, randseed=3,
+                arma_params=[1, 0, 0, 0, 24], bounds=BOUNDS)
+
+    xout = compression.load_pickle(os.path.join(store_path, 'syn.p'))
+
+    # The samples are clipped to the year the models were fitted to,
+    # which is the year of the samples.
+    rec, _, _ = wf.get_seed('syn', seed_path)
+    rec = rec[rec.index.year == xout.base_year]
+    assert rec.loc[rec.index.month == 1, 'tdb'].isna().any()
+
+    for k in range(0, len(xout)):
+        sample = xout.frame(k)
+        for month in range(1, 13):
+            for var in ['tdb', 'rh']:
+                low, high = np.nanpercentile(
+                    rec.loc[rec.index.month == month, var], BOUNDS)
+                values = sample.loc[sample.index.month == month, var]
+                assert np.isfinite(values).all()
+                assert values.min() >= low - 1e-4, (var, month)
+                assert values.max() <= high + 1e-4, (var, month)
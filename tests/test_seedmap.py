@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the memory-mapped seed records of seedmap.py (indra --seed_map):
+a mapped record is the record wfileio reads, and it is saved again when
+the seed files change.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import seedgen
+import seedmap
+import wfileio as wf
+
+from conftest import PATH_SEED
+
+
+def _assert_same_seed(mapped, read):
+    pd.testing.assert_frame_equal(mapped[0], read[0])
+    assert mapped[1] == read[1]
+    assert mapped[2] == read[2]
+
+
+@pytest.mark.parametrize('seed', ['folder', 'espr'])
+def test_mapped_seed_is_the_record(tmp_path, seed):
+    '''A folder of EPW files, with gaps and text columns, and an ESP-r
+       file are mapped as wfileio.get_seed reads them.'''
+
+    if seed == 'folder':
+        path_seed = str(tmp_path / 'seed')
+        seedgen.write_record(seedgen.make_record(years=2, randseed=1),
+                             path_seed, 'epw')
+    else:
+        path_seed = PATH_SEED
+
+    path_map = str(tmp_path / 'map')
+    mapped = seedmap.get_seed('syn', path_seed, path_map)
+
+    _assert_same_seed(mapped, wf.get_seed('syn', path_seed))
+
+    # The numeric columns are read-only views of the mapped files.
+    assert not mapped[0]['tdb'].values.flags.writeable
+
+    # The second time, the saved record is mapped as it is.
+    stamp = os.path.getmtime(os.path.join(path_map, seedmap.META_FILE))
+    _assert_same_seed(seedmap.get_seed('syn', path_seed, path_map),
+                      wf.get_seed('syn', path_seed))
+    assert os.path.getmtime(
+        os.path.join(path_map, seedmap.META_FILE)) == stamp
+
+
+def test_changed_seed_is_mapped_again(tmp_path):
+    '''A seed file that changes, or one that is added, replaces the
+       saved record.'''
+
+    path_seed = str(tmp_path / 'seed')
+    path_map = str(tmp_path / 'map')
+
+    record = seedgen.make_record(years=3, randseed=1)
+    paths = seedgen.write_record(record[0:2], path_seed, 'epw')
+
+    first = seedmap.get_seed('syn', path_seed, path_map)[0].copy()
+
+    # Rewrite the second year with other values, and make sure its time
+    # stamp changes even on coarse file systems.
+    changed = [record[1].copy()]
+    changed[0]['tdb'] = changed[0]['tdb'] + 1.
+    assert seedgen.write_record(changed, path_seed, 'epw') == paths[1:2]
+    os.utime(paths[1], (os.path.getatime(paths[1]),
+                        os.path.getmtime(paths[1]) + 10))
+
+    mapped = seedmap.get_seed('syn', path_seed, path_map)
+    _assert_same_seed(mapped, wf.get_seed('syn', path_seed))
+
+    second = mapped[0].index.year == 1992
+    np.testing.assert_allclose(mapped[0].loc[second, 'tdb'].values,
+                               first.loc[second, 'tdb'].values + 1.,
+                               atol=0.11)
+
+    # A year added to the folder is mapped too.
+    seedgen.write_record(record[2:3], path_seed, 'epw')
+
+    mapped = seedmap.get_seed('syn', path_seed, path_map)
+    _assert_same_seed(mapped, wf.get_seed('syn', path_seed))
+    assert sorted(set(mapped[0].index.year)) == [1991, 1992, 1993]
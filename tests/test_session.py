@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the in-process session API of session.py: samples come from
+memory, counters follow indra, and stations trained again are loaded
+again.
+
+@author: Parag Rastogi
+"""
+
+import os
+import pickle
+import shutil
+
+import pandas as pd
+
+import compression
+import indra
+import session
+
+from conftest import N_SAMPLES, PATH_SEED, RANDSEED, train
+
+
+def _counter(store_path):
+    with open(os.path.join(store_path, 'counter.p'), 'rb') as open_file:
+        return pickle.load(open_file)
+
+
+def test_samples_come_from_the_store(trained, tmp_path):
+    '''Samples by number and in turn are the stored ones, and the counter
+       runs out and starts over as in indra.'''
+
+    store_path = str(tmp_path / 'store')
+    shutil.copytree(trained, store_path)
+
+    xout = compression.load_pickle(os.path.join(store_path, 'syn.p'))
+
+    with session.Station('gen', store_path=store_path) as station:
+
+        assert len(station) == N_SAMPLES
+        pd.testing.assert_frame_equal(station.sample(1), xout.frame(1))
+
+        for k in range(0, N_SAMPLES):
+            pd.testing.assert_frame_equal(station.sample(), xout.frame(k))
+
+        # Every sample has been handed out.
+        assert station.sample() is None
+        pd.testing.assert_frame_equal(station.sample(), xout.frame(0))
+
+    assert _counter(store_path)['counter'] == 1
+
+
+def test_written_sample_matches_indra(trained, tmp_path):
+    '''A sample written by a station is the file indra writes for it.'''
+
+    with session.Station('gen', store_path=trained,
+                         path_file_in=PATH_SEED) as station:
+        path_written = station.write(2, str(tmp_path / 'session.a'),
+                                     file_type='espr')
+
+    # indra hands out samples in turn, so the third one is sample 2.
+    store_copy = str(tmp_path / 'store')
+    shutil.copytree(trained, store_copy)
+
+    for k in range(0, 3):
+        indra.indra(False, 'gen', N_SAMPLES, PATH_SEED,
+                    str(tmp_path / 'indra_{0}.a'.format(k)), 'espr',
+                    store_path=store_copy)
+
+    with open(path_written, 'rb') as open_file:
+        expected = open_file.read()
+    with open(str(tmp_path / 'indra_2'), 'rb') as open_file:
+        assert open_file.read() == expected
+
+
+def test_retrained_station_keeps_the_new_counter(tmp_path):
+    '''A station trained again while it is loaded is loaded again, and
+       its old counter does not overwrite the new one.'''
+
+    store_path = str(tmp_path)
+    train(store_path)
+
+    with session.Session() as sess:
+
+        station = sess.station('gen', store_path=store_path)
+        station.sample()
+        station.sample()
+
+        train(store_path, n_samples=2, randseed=RANDSEED + 1)
+
+        station = sess.station('gen', store_path=store_path)
+        assert len(station) == 2
+        assert station.counter == dict(n_samples=2,
+                                       randseed=RANDSEED + 1, counter=0)
+
+        station.sample()
+
+    assert _counter(store_path) == dict(n_samples=2, randseed=RANDSEED + 1,
+                                        counter=1)
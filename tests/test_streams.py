@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the random number streams of streams.py: a sample does not
+depend on the samples generated with it.
+
+@author: Parag Rastogi
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import compression
+import streams
+
+from conftest import train
+
+
+def test_streams_depend_on_seed_and_key_only():
+    '''A stream gives the same numbers whenever it is made, and other
+       seeds or keys give other numbers.'''
+
+    first = streams.stream(5, 'noise', 0, 2).standard_normal(100)
+
+    # Drawing from other streams in between changes nothing.
+    streams.stream(5, 'noise', 0, 1).standard_normal(1000)
+    np.testing.assert_array_equal(
+        streams.stream(5, 'noise', 0, 2).standard_normal(100), first)
+
+    for other in [streams.stream(6, 'noise', 0, 2),
+                  streams.stream(5, 'noise', 1, 2),
+                  streams.stream(5, 'noise', 0, 3),
+                  streams.stream(5, 'neighbours', 0, 2)]:
+        assert not np.array_equal(other.standard_normal(100), first)
+
+
+def test_samples_do_not_depend_on_n_samples(trained, tmp_path):
+    '''The first samples of a run are those of a run with fewer
+       samples.'''
+
+    store_path = str(tmp_path)
+    train(store_path, n_samples=2)
+
+    xout_a = compression.load_pickle(os.path.join(trained, 'syn.p'))
+    xout_b = compression.load_pickle(os.path.join(store_path, 'syn.p'))
+
+    assert len(xout_b) == 2
+    for k in range(0, len(xout_b)):
+        assert xout_a.key(k) == xout_b.key(k)
+        pd.testing.assert_frame_equal(xout_a.frame(k), xout_b.frame(k))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the shared calendar of the 8760-hour year in timeindex.py
+against pandas.
+
+@author: Parag Rastogi
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import timeindex
+
+# The 8760 hours of a year without a leap day, from pandas.
+CALENDAR = pd.date_range('2001-01-01 00:00', '2001-12-31 23:00', freq='h')
+
+
+def test_tables_match_pandas():
+    '''Month, day, hour and day of the year of every hour.'''
+
+    np.testing.assert_array_equal(timeindex.MONTH, CALENDAR.month)
+    np.testing.assert_array_equal(timeindex.DAY, CALENDAR.day)
+    np.testing.assert_array_equal(timeindex.HOUR, CALENDAR.hour)
+    np.testing.assert_array_equal(timeindex.DAY_OF_YEAR,
+                                  CALENDAR.dayofyear)
+
+
+def test_day_of_month():
+    '''Every day of the year maps to its month and day and back,
+       including the first and last days of the months.'''
+
+    days = np.arange(1, 366)
+    month, day = timeindex.day_of_month(days)
+
+    np.testing.assert_array_equal(month, CALENDAR.month[::24])
+    np.testing.assert_array_equal(day, CALENDAR.day[::24])
+    np.testing.assert_array_equal(timeindex.day_of_year(month, day), days)
+
+    assert [int(x) for x in timeindex.day_of_month(365)] == [12, 31]
+    assert [int(x) for x in timeindex.day_of_month(1)] == [1, 1]
+    assert [int(x) for x in timeindex.day_of_month(59)] == [2, 28]
+    assert [int(x) for x in timeindex.day_of_month(60)] == [3, 1]
+
+
+@pytest.mark.parametrize('year', [2001, 2004, 2100])
+def test_noleap_index_and_hours(year):
+    '''A year without its leap day has 8760 hours, numbered 0 to 8759
+       whether the year is a leap year or not.'''
+
+    index = timeindex.noleap_index(year)
+
+    assert index.shape[0] == timeindex.N_HOURS
+    assert not timeindex.is_leap_day(index).any()
+    np.testing.assert_array_equal(timeindex.noleap_hours(index),
+                                  np.arange(0, timeindex.N_HOURS))
+
+    full = timeindex.year_index(year)
+    np.testing.assert_array_equal(
+        timeindex.noleap_hours(full[~timeindex.is_leap_day(full)]),
+        np.arange(0, timeindex.N_HOURS))
+
+    part = timeindex.noleap_index(year, periods=48, start=24 * 59)
+    assert (part[0].month, part[0].day) == (3, 1)
+
+
+def test_window_and_month_hours():
+    '''Windows include both of their days, and months cover their
+       hours.'''
+
+    hours = timeindex.window_hours(('06-01', '08-31'))
+    window = CALENDAR[hours]
+
+    first, last = window[0], window[-1]
+
+    assert (first.month, first.day, first.hour) == (6, 1, 0)
+    assert (last.month, last.day, last.hour) == (8, 31, 23)
+    assert timeindex.window_hours(None) == slice(0, timeindex.N_HOURS)
+
+    with pytest.raises(ValueError):
+        timeindex.window_hours(('12-01', '01-31'))
+
+    for month in range(1, 13):
+        np.testing.assert_array_equal(
+            timeindex.MONTH[timeindex.month_hours(month)], month)
+        assert ((timeindex.month_hours(month).stop -
+                 timeindex.month_hours(month).start) ==
+                24 * timeindex.MONTH_DAYS[month - 1])
+
+    positions = timeindex.month_positions(CALENDAR[::-1])
+    for month, pos in positions.items():
+        assert (CALENDAR[::-1][pos].month == month).all()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of updating a trained station with newly recorded data (indra
+--update): training on one year and updating with the next gives the
+summary of the record, and the fourier series, of training on both.
+
+@author: Parag Rastogi
+"""
+
+import glob
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import indra
+import seedgen
+import wfileio as wf
+
+from conftest import ARMA_PARAMS, RANDSEED
+
+
+def _run(path_file_in, store_path, train=True, update=False):
+    indra.indra(train, 'syn', 2, path_file_in,
+                os.path.join(store_path, 'syn.epw'), 'epw',
+                store_path=store_path, randseed=RANDSEED,
+                arma_params=list(ARMA_PARAMS), update=update)
+
+
+def _load(store_path, name):
+    with open(os.path.join(store_path, name), 'rb') as open_file:
+        return pickle.load(open_file)
+
+
+def test_seed_folder_is_read_in_order(tmp_path, monkeypatch):
+    '''The years of a folder of files come out in order, whatever order
+       the files are found in.'''
+
+    record = seedgen.make_record(years=3, randseed=1)
+    seedgen.write_record(record, str(tmp_path), 'epw')
+
+    found = glob.glob
+    monkeypatch.setattr(glob, 'glob', lambda x: found(x)[::-1])
+
+    xy, _, _ = wf.get_seed('syn', str(tmp_path))
+
+    assert xy.index.is_monotonic_increasing
+    assert xy.index.max() == pd.Timestamp('1993-12-31 23:00')
+
+
+def test_update_equals_training_on_all(tmp_path):
+    '''Train on 1991, update with 1992, and compare with training on
+       1991 and 1992 at once.'''
+
+    record = seedgen.make_record(years=2, randseed=1)
+
+    seed_all = str(tmp_path / 'seed_all')
+    seedgen.write_record(record, seed_all, 'epw')
+    seed_update = str(tmp_path / 'seed_update')
+    seedgen.write_record(record[0:1], seed_update, 'epw')
+
+    store_all = str(tmp_path / 'store_all')
+    store_update = str(tmp_path / 'store_update')
+
+    _run(seed_all, store_all)
+    _run(seed_update, store_update)
+
+    assert (_load(store_update, 'record.p')['last_stamp'] ==
+            pd.Timestamp('1991-12-31 23:00'))
+
+    seedgen.write_record(record[1:2], seed_update, 'epw')
+    _run(seed_update, store_update, train=False, update=True)
+
+    rec_all = _load(store_all, 'record.p')
+    rec_update = _load(store_update, 'record.p')
+
+    assert rec_update['last_stamp'] == rec_all['last_stamp']
+    assert rec_update['last_stamp'] == pd.Timestamp('1992-12-31 23:00')
+    assert rec_update['n_rows'] == rec_all['n_rows']
+    assert (rec_update['harmonics']['n_obs'] ==
+            rec_all['harmonics']['n_obs'])
+    for key in ['gram', 'xty']:
+        np.testing.assert_allclose(rec_update['harmonics'][key],
+                                   rec_all['harmonics'][key], rtol=1e-10,
+                                   atol=1e-8)
+
+    for key in ['table', 'month']:
+        np.testing.assert_array_equal(rec_update['donors'][key],
+                                      rec_all['donors'][key])
+
+    model_all = _load(store_all, 'model.p')
+    model_update = _load(store_update, 'model.p')
+
+    for ffit_all, ffit_update in zip(model_all['ffit'],
+                                     model_update['ffit']):
+        np.testing.assert_allclose(ffit_update, ffit_all, rtol=1e-9,
+                                   atol=1e-9)
+
+    # Nothing is left to add.
+    _run(seed_update, store_update, train=False, update=True)
+    assert _load(store_update, 'record.p')['n_rows'] == rec_all['n_rows']
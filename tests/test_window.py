@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of generating and writing only a window of the year (indra
+--window).
+
+@author: Parag Rastogi
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import compression
+import indra
+import session
+import timeindex
+import wfileio as wf
+
+from conftest import N_SAMPLES, PATH_SEED, train
+
+WINDOW = ('06-01', '06-10')
+
+
+@pytest.mark.parametrize('window, n_hours', [
+    (WINDOW, 240), (('02-27', '03-02'), 96), (('01-01', '12-31'), 8760),
+    (('12-31', '12-31'), 24)])
+def test_window_hours(window, n_hours):
+    '''Windows hold 24 hours for every day, both ends included, and no
+       leap day.'''
+
+    hours = timeindex.window_hours(window)
+
+    assert hours.stop - hours.start == n_hours
+
+
+def test_windowed_training(tmp_path):
+    '''Training with a window makes samples of the window only.'''
+
+    store_path = str(tmp_path)
+    train(store_path, window=list(WINDOW))
+
+    xout = compression.load_pickle(os.path.join(store_path, 'syn.p'))
+
+    assert len(xout) == N_SAMPLES
+    assert xout.n_hours == 240
+    for k in range(0, len(xout)):
+        index = xout.index(k)
+        assert (index[0].month, index[0].day, index[0].hour) == (6, 1, 0)
+        assert (index[-1].month, index[-1].day, index[-1].hour) == (6, 10,
+                                                                    23)
+        assert np.isfinite(xout.frame(k)[['tdb', 'rh']].values).all()
+
+
+def test_windowed_csv(trained, tmp_path):
+    '''A window of a stored sample is written as a CSV file of 240 rows,
+       by indra and by a station.'''
+
+    store_copy = str(tmp_path / 'store')
+    shutil.copytree(trained, store_copy)
+
+    path_file_out = str(tmp_path / 'indra.csv')
+    indra.indra(False, 'gen', N_SAMPLES, PATH_SEED, path_file_out, 'csv',
+                store_path=store_copy, window=list(WINDOW))
+
+    written = pd.read_csv(path_file_out)
+    assert written.shape[0] == 240
+
+    with session.Station('gen', store_path=trained, path_file_in=PATH_SEED,
+                         window=WINDOW) as station:
+        path_written = station.write(0, str(tmp_path / 'station.csv'),
+                                     file_type='csv')
+
+    pd.testing.assert_frame_equal(pd.read_csv(path_written), written)
+
+
+def test_espr_window_raises(trained, tmp_path):
+    '''ESP-r files hold whole years, so a window cannot be written as
+       one.'''
+
+    sample = session.window_sample(
+        compression.load_pickle(os.path.join(trained, 'syn.p')).frame(0),
+        WINDOW)
+    _, locdata, header = wf.get_weather('gen', PATH_SEED)
+
+    with pytest.raises(ValueError):
+        wf.give_weather(sample, locdata, 'gen', list(header),
+                        masterfile=PATH_SEED, file_type='espr',
+                        path_file_out=str(tmp_path / 'window.a'))
+
+    assert not os.listdir(str(tmp_path))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end throughput and scaling harness for indra.
+
+This is vali.py turned into a measurement: train on a seed record,
+generate n_samples, then ask for every sample in turn, as the command
+line does, and write it out in every output format. Each run is repeated
+over a matrix of record lengths, n_samples, arma_params and worker counts.
+With w workers, w independent stations run at once in separate processes,
+which is how a batch of stations would share a machine.
+
+For each point of the matrix the harness reports:
+    1. wall time and samples per second over all workers,
+    2. time to first sample, i.e., from the start of a run until the
+       first output file is on disk,
+    3. wall time per pipeline stage (from profiler),
+    4. peak RSS of the worker processes.
+
+Typical use:
+    python throughput.py --n_samples 10,100 --workers 1,2,4 \
+        --save throughput.json
+
+@author: Parag Rastogi
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import wfileio as wf
+import petites as petite
+import resampling
+import profiler
+import seedgen
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Master files used to write each output format. The writers copy the
+# header (and, for ESP-r and EPW, the layout) of these files.
+MASTERS = dict(epw=os.path.join(HERE, 'gen', 'gen_iwec.epw'),
+               espr=os.path.join(HERE, 'gen', 'che_geneva.iwec.a'),
+               csv=None, fin4=None)
+
+
+def seed_format(path_seed):
+    '''Output format that matches the extension of a seed file.'''
+
+    ext = os.path.splitext(path_seed)[1].lower().lstrip('.')
+    return dict(a='espr').get(ext, ext)
+
+# ----------- END seed_format function. -----------
+
+
+def pipeline(path_seed, n_samples, arma_params, formats, store_path,
+             randseed=42):
+    '''One station, from seed file (or folder of seed files) to written
+       samples. Runs in a worker process and returns its timings.'''
+
+    tic = time.perf_counter()
+    ttfs = None
+    written = dict([(fmt, 0) for fmt in formats])
+    errors = dict()
+
+    if os.path.isdir(path_seed):
+        path_master = sorted(glob.glob(os.path.join(path_seed, '*')))[0]
+    else:
+        path_master = path_seed
+
+    profiler.enable()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        petite.setseed(randseed)
+
+        xy_train, locdata, header = wf.get_seed('gen', path_seed)
+
+        path_syn_save = os.path.join(store_path, 'syn.p')
+
+        resampling.trainer(
+            xy_train, n_samples=n_samples, picklepath=path_syn_save,
+            arma_params=arma_params, bounds=[1, 99], cc_data=None)
+
+        for counter in range(0, n_samples):
+
+            with profiler.stage('sampler'):
+                sample = resampling.sampler(
+                    picklepath=path_syn_save, counter=counter)
+
+            for fmt in formats:
+                # Prefer the seed itself as master for its own format.
+                masterfile = MASTERS[fmt]
+                if masterfile is None or seed_format(path_master) == fmt:
+                    masterfile = path_master
+                path_file_out = os.path.join(
+                    store_path, 'syn_{0:04d}.{1}'.format(counter, fmt))
+                try:
+                    with profiler.stage('give_weather', file_type=fmt):
+                        wf.give_weather(
+                            sample.copy(), locdata, 'gen', header,
+                            file_type=fmt, path_file_out=path_file_out,
+                            masterfile=masterfile)
+                    written[fmt] += 1
+                except Exception as err:
+                    errors[fmt] = repr(err)
+                    continue
+
+                if ttfs is None:
+                    ttfs = time.perf_counter() - tic
+
+    wall = time.perf_counter() - tic
+    timings = profiler.report()
+    profiler.disable()
+
+    return dict(wall_seconds=wall, time_to_first_sample=ttfs,
+                written=written, errors=errors,
+                stages=dict([(x['stage'], x['seconds'])
+                             for x in timings['stages']
+                             if '/' not in x['stage']]),
+                peak_rss_bytes=profiler.max_rss_bytes())
+
+# ----------- END pipeline function. -----------
+
+
+def run_point(path_seed, years, n_samples, arma_params, workers, formats):
+    '''Run one point of the matrix: `workers` stations at once. Records
+       longer than one year are made by seedgen and written, one file per
+       year, in the format of the seed.'''
+
+    scratch = tempfile.mkdtemp(prefix='indra_tput_')
+
+    try:
+        if years > 1:
+            path_record = os.path.join(scratch, 'seed')
+            with contextlib.redirect_stdout(io.StringIO()):
+                seedgen.write_record(
+                    seedgen.make_record(years=years), path_record,
+                    file_type=seed_format(path_seed), stcode='gen')
+            path_seed = path_record
+
+        tic = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = list()
+            for widx in range(0, workers):
+                store_path = os.path.join(scratch, 'st{:02d}'.format(widx))
+                os.makedirs(store_path)
+                futures.append(pool.submit(
+                    pipeline, path_seed, n_samples, arma_params, formats,
+                    store_path, 42 + widx))
+            runs = [f.result() for f in futures]
+
+        wall = time.perf_counter() - tic
+
+    finally:
+        shutil.rmtree(scratch)
+
+    stages = dict()
+    for this_run in runs:
+        for key, val in this_run['stages'].items():
+            stages[key] = max(stages.get(key, 0.), val)
+
+    ttfs = [x['time_to_first_sample'] for x in runs
+            if x['time_to_first_sample'] is not None]
+
+    return dict(
+        years=years, n_samples=n_samples, arma_params=arma_params,
+        workers=workers, wall_seconds=wall,
+        samples_per_second=workers * n_samples / wall,
+        time_to_first_sample=min(ttfs) if ttfs else None,
+        stage_seconds=stages,
+        peak_rss_bytes=max([x['peak_rss_bytes'] or 0 for x in runs]),
+        written=[x['written'] for x in runs],
+        errors=[x['errors'] for x in runs])
+
+# ----------- END run_point function. -----------
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="End-to-end throughput and scaling harness for "
+        "indra. Trains, samples and writes over a matrix of settings.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--path_file_in", type=str,
+                        default=MASTERS['epw'],
+                        help="Seed file to train on.")
+    parser.add_argument("--years", type=str, default="1,10",
+                        help="Record lengths in years. Anything above 1 "
+                        "is a synthetic record made by seedgen.")
+    parser.add_argument("--n_samples", type=str, default="10",
+                        help="Numbers of samples to generate, separated "
+                        "by commas.")
+    parser.add_argument("--arma_params", type=str, default="1,1,0,0,24",
+                        help="SARMA upper limits to try, as in indra. "
+                        "Separate several sets with semicolons.")
+    parser.add_argument("--workers", type=str, default="1",
+                        help="Numbers of stations to run at once, "
+                        "separated by commas.")
+    parser.add_argument("--formats", type=str, default="epw,espr,csv",
+                        help="Output formats to write every sample in.")
+    parser.add_argument("--fin4_master", type=str, default=None,
+                        help="A fin4 file to use as master if fin4 is "
+                        "one of the formats.")
+    parser.add_argument("--save", type=str, default=None,
+                        help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.fin4_master is not None:
+        MASTERS['fin4'] = args.fin4_master
+
+    matrix = itertools.product(
+        [int(x) for x in args.years.split(',')],
+        [int(x) for x in args.n_samples.split(',')],
+        [[int(y) for y in x.split(',')] for x in args.arma_params.split(';')],
+        [int(x) for x in args.workers.split(',')])
+    formats = args.formats.split(',')
+
+    print("{0:>5s} {1:>9s} {2:>14s} {3:>7s} {4:>9s} {5:>9s} "
+          "{6:>9s} {7:>9s}".format(
+              "years", "n_samples", "arma_params", "workers", "wall [s]",
+              "samples/s", "ttfs [s]", "rss [MB]"))
+
+    results = list()
+    for years, n_samples, arma_params, workers in matrix:
+
+        point = run_point(args.path_file_in, years, n_samples,
+                          arma_params, workers, formats)
+        results.append(point)
+
+        print("{0:5d} {1:9d} {2:>14s} {3:7d} {4:9.2f} {5:9.2f} "
+              "{6:>9s} {7:9.1f}".format(
+                  years, n_samples, ','.join(map(str, arma_params)),
+                  workers, point['wall_seconds'],
+                  point['samples_per_second'],
+                  ('-' if point['time_to_first_sample'] is None else
+                   '{:.2f}'.format(point['time_to_first_sample'])),
+                  point['peak_rss_bytes'] / 1e6))
+
+        for this_run in point['errors']:
+            for fmt, err in this_run.items():
+                print("      could not write {0}: {1}".format(fmt, err))
+
+    if args.save is not None:
+        with open(args.save, 'w') as open_file:
+            json.dump(results, open_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Calendar of the hourly years that indra works with.
+
+Every year of recorded or synthetic data is 8760 hours long, without the
+leap day. The hourly index of a year, and the month, day and hour of
+every one of its hours, used to be rebuilt with pd.date_range and a
+leap-day filter by every reader, writer and resampling loop. Here they
+are computed once:
+    - the hourly index of each year, with or without the leap day, is
+      built the first time it is asked for and cached,
+    - MONTH, DAY, HOUR and DAY_OF_YEAR hold the calendar of every hour
+      of a year without the leap day, which is the same for all years,
+    - month_hours gives the hours of a month of that year as a slice,
+      and month_positions the positions of every month in any index.
+The cached arrays and indexes are read-only, so they can be handed out
+without copying.
+
+@author: Parag Rastogi
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+# Hours in a year without the leap day.
+N_HOURS = 8760
+
+# Number of days in each month, without the leap day.
+MONTH_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Day of the year (0 to 365) on which every month starts, and after the
+# last month.
+MONTH_START = np.concatenate([[0], np.cumsum(MONTH_DAYS)])
+
+# Month (1 to 12), day of month, hour of day and day of year (1 to 365)
+# of every hour of a year without the leap day.
+MONTH = np.repeat(np.arange(1, 13), np.asarray(MONTH_DAYS) * 24)
+DAY = np.concatenate([np.repeat(np.arange(1, x + 1), 24)
+                      for x in MONTH_DAYS])
+HOUR = np.tile(np.arange(0, 24), N_HOURS // 24)
+DAY_OF_YEAR = np.repeat(np.arange(1, N_HOURS // 24 + 1), 24)
+
+for _array in (MONTH_START, MONTH, DAY, HOUR, DAY_OF_YEAR):
+    _array.flags.writeable = False
+
+
+@functools.lru_cache(maxsize=None)
+def year_index(year):
+    '''Hourly index of one whole year, with the leap day if it has one.'''
+
+    return pd.date_range(start='{:04d}-01-01 00:00:00'.format(year),
+                         end='{:04d}-12-31 23:00:00'.format(year),
+                         freq='1H')
+
+# ----------- END year_index function. -----------
+
+
+@functools.lru_cache(maxsize=None)
+def _noleap_year(year):
+    '''Hourly index of one year without the leap day.'''
+
+    index = year_index(year)
+    leap = is_leap_day(index)
+
+    if not leap.any():
+        return index
+
+    return index[~leap]
+
+# ----------- END _noleap_year function. -----------
+
+
+def noleap_index(year, periods=None, start=0):
+    '''Hourly index of one year without the leap day, as used for every
+       sample, from hour `start` of that year.'''
+
+    index = _noleap_year(int(year))
+
+    if periods is not None:
+        return index[start:start + periods]
+
+    return index[start:]
+
+# ----------- END noleap_index function. -----------
+
+
+def is_leap_day(index):
+    '''Which time stamps of index fall on 29 February.'''
+
+    return (np.asarray(index.month) == 2) & (np.asarray(index.day) == 29)
+
+# ----------- END is_leap_day function. -----------
+
+
+def remove_leap_day(df):
+    '''Rows of df, with a datetime index, that are not on 29 February.
+       df itself is returned if it has none.'''
+
+    leap = is_leap_day(df.index)
+
+    if not leap.any():
+        return df
+
+    return df[~leap]
+
+# ----------- END remove_leap_day function. -----------
+
+
+def noleap_hours(index):
+    '''Position of every time stamp of index in its year without the
+       leap day, i.e., 0 for 1 January 00:00 and 8759 for 31 December
+       23:00.'''
+
+    day = (np.asarray(index.dayofyear) - 1 -
+           (np.asarray(index.is_leap_year) & np.asarray(index.month > 2)))
+
+    return day * 24 + np.asarray(index.hour)
+
+# ----------- END noleap_hours function. -----------
+
+
+def window_hours(window=None):
+    '''Hours of the year (without leap day) covered by window, a pair of
+       'MM-DD' dates with both days included, e.g., ('06-01', '08-31'),
+       as a slice. None is the whole year. Windows across the new year
+       are not supported.'''
+
+    if window is None:
+        return slice(0, N_HOURS)
+
+    # Any year without a leap day will do.
+    start, end = [pd.Timestamp('2001-' + x.strip()) for x in window]
+
+    if end < start:
+        raise ValueError(
+            "The window {0} ends before it starts. Windows across the "
+            "new year are not supported.".format(list(window)))
+
+    # Up to and including the last hour of the last day.
+    return slice(int(noleap_hours(pd.DatetimeIndex([start]))[0]),
+                 int(noleap_hours(pd.DatetimeIndex([end]))[0]) + 24)
+
+# ----------- END window_hours function. -----------
+
+
+def month_hours(month):
+    '''Hours of a month (1 to 12) in a year without the leap day, as a
+       slice.'''
+
+    return slice(int(MONTH_START[month - 1]) * 24,
+                 int(MONTH_START[month]) * 24)
+
+# ----------- END month_hours function. -----------
+
+
+def month_positions(index):
+    '''Positions of the time stamps of every month in index, as a
+       dictionary from the month (1 to 12) to an array of positions in
+       the order of the index. Months not in index are left out.'''
+
+    month = np.asarray(index.month)
+    order = np.argsort(month, kind='stable')
+    bounds = np.searchsorted(month[order], np.arange(1, 14))
+
+    return dict([(m, order[bounds[m - 1]:bounds[m]])
+                 for m in range(1, 13) if bounds[m] > bounds[m - 1]])
+
+# ----------- END month_positions function. -----------
+
+
+def day_of_year(month, day):
+    '''Day of the year (1 to 365, without the leap day) of arrays of
+       months (1 to 12) and days of the month.'''
+
+    return (MONTH_START[np.asarray(month, dtype=int) - 1] +
+            np.asarray(day, dtype=int))
+
+# ----------- END day_of_year function. -----------
+
+
+def day_of_month(day):
+    '''Month (1 to 12) and day of the month of an array of days of the
+       year (1 to 365, without the leap day).'''
+
+    day = np.asarray(day, dtype=int)
+    month = np.searchsorted(MONTH_START, day, side='left')
+
+    return month, day - MONTH_START[month - 1]
+
+# ----------- END day_of_month function. -----------
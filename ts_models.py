@@ -4,34 +4,28 @@ Created on Sun Oct  8 20:29:16 2017
 
 @author: rasto
 """
+import inspect
 from sys import stdout
 from itertools import product
 import numpy as np
+from statsmodels.tsa.statespace.mlemodel import MLEResults
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+import checkpoint
+import profiler
 # from tqdm import tqdm
 
 
-def select_models(arma_params, ts_in):
+def candidate_orders(arma_params):
 
-    '''Select the most parsimonious SARMA model.'''
+    '''All (order, seasonal_order) pairs tried by select_models, in the
+       order in which they are tried.'''
 
-    # Set ranges for various model parameters.
     # Each range is one more than what we are
     # interested in because range cuts off at end-1.
     # arma_params = [arp_ub, maq_ub, sarp_ub, smaq_ub, seasonality]
 
-    aic_curr = 0
-    selaic = np.infty
-    mod_fit_curr = None
-
-    counter = 0
-    # Total iterations expected.
-    # total_iters = np.prod([x+1 for x in arma_params[:-1]])
-    # print(total_iters)
-
-    # Loop through all possible combinations of ar, ma, sar, and sma lags.
-
-    print("Iteration number: ")
+    candidates = list()
 
     for p, q, pp, qq in product(
             range(0, arma_params[0]+1), range(0, arma_params[1]+1),
@@ -40,39 +34,150 @@ def select_models(arma_params, ts_in):
         if p == 0 and q == 0:
             continue
 
-        model = SARIMAX(
-            ts_in, order=(p, 0, q),
-            seasonal_order=(pp, 0, qq, arma_params[4]),
-            trend=None)
+        candidates.append(((p, 0, q), (pp, 0, qq, arma_params[4])))
+
+    return candidates
 
-        try:
-            mod_fit_curr = model.fit(
-                disp=0, cov_type="robust",
+
+def fit_candidate(ts_in, order, seasonal_order, start_params=None):
+
+    '''Fit one SARMA candidate. Returns the fitted model, or None if the
+       fit failed or its AIC is not a number. The optimiser starts from
+       start_params if they are given, e.g., those of an earlier fit.'''
+
+    model = SARIMAX(
+        ts_in, order=order, seasonal_order=seasonal_order, trend=None)
+
+    try:
+        with profiler.stage('sarimax_fit', order=order,
+                            seasonal_order=seasonal_order) as fit_stage:
+            mod_fit = model.fit(
+                start_params=start_params, disp=0, cov_type="robust",
                 full_output=True)
-            aic_curr = mod_fit_curr.aic
+            fit_stage.note(
+                iterations=mod_fit.mle_retvals.get('iterations'),
+                converged=mod_fit.mle_retvals.get('converged'))
+    except Exception:
+        # print('fit threw an error')
+        return None
+
+    if np.isnan(mod_fit.aic):
+        return None
+
+    return mod_fit
+
+
+def refit_candidate(ts_in, order, seasonal_order, params):
+
+    '''Rebuild a fitted candidate from its parameters, e.g., after it
+       was fitted in another process. Only the Kalman smoother is run,
+       not the optimiser.'''
+
+    model = SARIMAX(
+        ts_in, order=order, seasonal_order=seasonal_order, trend=None)
+
+    return model.smooth(params, cov_type='none')
+
+
+def update_model(ts_in, order, seasonal_order, params):
 
-            if np.isnan(aic_curr):
-                counter += 1
-                continue
+    '''Refit a model of known order to a new series, with the optimiser
+       warm-started from params, the parameters of the earlier fit.
+       Returns the refitted model (None if the fit failed) and how much
+       the refit improves the log-likelihood of the new series over the
+       earlier parameters, per value.'''
 
-            # if counter > 0:
-            if aic_curr < selaic:
-                [selaic, selmdl] = [aic_curr, mod_fit_curr]
+    with profiler.stage('update_model', order=order,
+                        seasonal_order=seasonal_order):
+        previous = refit_candidate(ts_in, order, seasonal_order, params)
+        mod_fit = fit_candidate(ts_in, order, seasonal_order,
+                                start_params=np.asarray(params))
 
-            # elif counter == 0:
-            #     [selaic, selmdl] = [aic_curr, mod_fit_curr]
+    if mod_fit is None:
+        return None, np.inf
 
-            counter += 1
+    return mod_fit, (mod_fit.llf - previous.llf) / mod_fit.nobs
 
-        except Exception as err:
-            # print('fit threw an error')
+
+# Older statsmodels take the generator of simulate as random_state,
+# newer ones as rng, and refuse both.
+_SIMULATE_RNG = ('rng' if 'rng' in inspect.signature(
+    MLEResults.simulate).parameters else 'random_state')
+
+
+def simulate_model(mdl, nsimulations, rng):
+
+    '''Simulate nsimulations steps of a fitted model, drawing the shocks
+       from the numpy Generator rng.'''
+
+    return mdl.simulate(nsimulations=nsimulations, **{_SIMULATE_RNG: rng})
+
+
+def select_models(arma_params, ts_in, key=None):
+
+    '''Select the most parsimonious SARMA model. If key is given (e.g.,
+       the name of the variable), every candidate fit is checkpointed
+       under it, and candidates checkpointed by an earlier run are not
+       fitted again.'''
+
+    # Set ranges for various model parameters.
+    # arma_params = [arp_ub, maq_ub, sarp_ub, smaq_ub, seasonality]
+
+    selaic = np.infty
+    selmdl = None
+
+    counter = 0
+    # Total iterations expected.
+    # total_iters = np.prod([x+1 for x in arma_params[:-1]])
+    # print(total_iters)
+
+    # Loop through all possible combinations of ar, ma, sar, and sma lags.
+
+    print("Iteration number: ")
+
+    for order, seasonal_order in candidate_orders(arma_params):
+
+        if key is None:
+            fit_key = None
+        else:
+            fit_key = '_'.join(['fit', key] +
+                               [str(x) for x in order + seasonal_order])
+
+        # The AIC and parameters of the candidate, or None if it could
+        # not be fitted.
+        found = checkpoint.load(fit_key)
+
+        if found is checkpoint.MISSING:
+            mod_fit_curr = fit_candidate(ts_in, order, seasonal_order)
+            if mod_fit_curr is not None:
+                found = (mod_fit_curr.aic, np.asarray(mod_fit_curr.params))
+            else:
+                found = None
+            checkpoint.save(fit_key, found)
+        else:
+            # Fitted by an earlier run. Only the winner is rebuilt.
+            mod_fit_curr = None
+
+        if found is None:
             continue
 
+        if found[0] < selaic:
+            selaic = found[0]
+            if mod_fit_curr is None:
+                selmdl = (order, seasonal_order, found[1])
+            else:
+                selmdl = mod_fit_curr
+
+        counter += 1
+
         # Print out a heartbeat.
         print("{0} ...".format(counter))
 
     # End p, q, pp, qq nested loops.
 
+    if isinstance(selmdl, tuple):
+        selmdl = refit_candidate(ts_in, *selmdl)
+
     resid = selmdl.resid
 
     return selmdl, resid
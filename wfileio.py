@@ -1,12 +1,29 @@
 import os
+import glob
+import json
+import pickle
+import struct
+import zipfile
 import numpy as np
 import pandas as pd
 import csv
 import re
 from scipy import interpolate
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    # Ensembles are written as npz files instead of Feather.
+    pyarrow = None
 		   
 
+import compression
+import ensemble
+import gcmstore
 import petites as petite
+import profiler
+import timeindex
 
 """
 This file contains functions to:
@@ -35,6 +52,21 @@ keywords = dict(tmy=("nrel", "iwec", "ishrae", "cwec",
                      "ms", "WY2", "nasa_saudi"))
 wformats = ("epw", "espr", "csv", "fin4")
 
+# Extensions of weather files as they are, or compressed.
+compressed_exts = ("", compression.EXTENSIONS['gzip'],
+                   compression.EXTENSIONS['lzma'])
+
+# Binary formats that hold all the samples of an ensemble in one file.
+ensemble_formats = ("feather", "npz")
+
+# Calendar columns, the same in every sample.
+calendar_cols = ("month", "day", "hour")
+
+# Codes of missing values in EPW files, for the columns indra uses. No
+# valid value reaches them.
+epw_missing = dict(tdb=99.9, tdp=99.9, rh=999., atmpr=999999.,
+                   ghi=9999., dni=9999., dhi=9999., wdr=999., wspd=999.)
+
 # List of values that could be NaNs.
 nanlist = ("9900", "-9900", "9999", "99", "-99", "9999.9", "999.9", " ", "-")
 
@@ -66,7 +98,10 @@ def get_weather(stcode, fpath):
     locdata = None
     header = None
 
-    file_type = os.path.splitext(fpath)[-1].replace('.', '').lower()
+    # Compressed files (see compression.py) are read as they are
+    # decompressed, e.g., wf_in.epw.gz as an EPW file.
+    file_type = os.path.splitext(compression.strip_extension(fpath))[
+        -1].replace('.', '').lower()
 
     if not os.path.isfile(fpath):
         print("I cannot find file {0}.".format(fpath) +
@@ -91,20 +126,16 @@ def get_weather(stcode, fpath):
 
         try:
             wdata, locdata, header = read_epw(fpath)
-            # Remove leap day.
-            wdata = petite.remove_leap_day(wdata)
         except Exception as err:
             print("Error: " + str(err))
             wdata = None
             header = None
             locdata = None
 
-    elif file_type == "espr":
+    elif file_type in ("espr", "a"):
 
         try:
             wdata, locdata, header, columns = read_espr(fpath)
-            # Remove leap day.
-            wdata = petite.remove_leap_day(wdata)
         except Exception as err:
             print("Error: " + str(err))
             wdata = None
@@ -114,9 +145,12 @@ def get_weather(stcode, fpath):
     elif file_type == "csv" or fpath[-4:] == ".csv":
 
         try:
-            wdata = pd.read_csv(fpath, header=0)
+            with compression.open_text(fpath) as open_file:
+                wdata = pd.read_csv(open_file, header=0)
             wdata.columns = ["year", "month", "day", "hour", "tdb", "tdp", "rh",
                              "ghi", "dni", "dhi", "wspd", "wdr"]
+            wdata.index = pd.to_datetime(
+                wdata[["year", "month", "day", "hour"]])
             # Location data is nonsensical, except for station code,
             # which will be reassigned later in this function.
             locdata = dict(loc=stcode, lat="00", long="00",
@@ -131,8 +165,6 @@ def get_weather(stcode, fpath):
                       "alt: {0}".format(locdata["alt"]) +
                       "wmo: {0}".format(locdata["wmo"]) +
                       "\r\n")
-            # Remove leap day.
-            wdata = petite.remove_leap_day(wdata)
 
         except Exception as err:
             print("Error: " + str(err))
@@ -164,24 +196,93 @@ def get_weather(stcode, fpath):
 
     else:
         # Remove leap day.
-        wdata = petite.remove_leap_day(wdata)
+        wdata = timeindex.remove_leap_day(wdata)
 
         if len(np.unique(wdata['year'].values)) > 1:
             # Incoming file is probably a TMY or TRY file,
             # so insert a dummy year.
             wdata["year"] = 2223
 
-        date_index = pd.date_range(
-            start='{:d}-01-01 00:00:00'.format(int(wdata["year"][0])),
-            end='{:d}-12-31 23:00:00'.format(int(wdata["year"][0])),
-            freq='1H')
-        wdata.index = date_index[
-            ~((date_index.day == 29) & (date_index.month == 2))]
+        wdata.index = timeindex.noleap_index(int(wdata["year"][0]))
 		
         return wdata, locdata, header
 
 	
 
+def get_seed(stcode, fpath, names=None):
+    '''Read a seed file, or every weather file in a folder, and return
+       all the recorded data as one dataframe. If names is given, only
+       the files of the folder with those names are read.'''
+
+    if os.path.isfile(fpath):
+        with profiler.stage('get_weather'):
+            return get_weather(stcode, fpath)
+
+    list_wfiles = ([glob.glob(os.path.join(fpath, "*." + x + z))
+                    for x in wformats for z in compressed_exts] +
+                   [glob.glob(os.path.join(fpath, "*." + x.upper() + z))
+                    for x in wformats for z in compressed_exts])
+    # In order, so that the data is in order when the years are read
+    # from one file each.
+    list_wfiles = sorted(sum(list_wfiles, []))
+
+    if names is not None:
+        list_wfiles = [x for x in list_wfiles
+                       if os.path.basename(x) in names]
+
+    if not list_wfiles:
+        raise ValueError(
+            "I could not find any weather files at {0}.".format(fpath))
+
+    xy_list = list()
+
+    for file in list_wfiles:
+        with profiler.stage('get_weather', file=file):
+            xy_temp, locdata, header = get_weather(stcode, file)
+        xy_list.append(xy_temp)
+
+    return pd.concat(xy_list, sort=False).sort_index(), locdata, header
+
+# ----------- END get_seed function. -----------
+
+
+def get_cc_data(path_cc_file, cc_scenario, epoch):
+    '''Load the daily climate model outputs of one scenario, keeping only
+       the years in the epoch and the models that have data. If
+       path_cc_file is a store made by gcmstore.py, only those years are
+       read, already cleaned.'''
+
+    if gcmstore.is_store(path_cc_file):
+        return gcmstore.load(path_cc_file, cc_scenario, epoch)
+
+    cc_data = pickle.load(open(path_cc_file, 'rb'))
+    cc_data = cc_data[cc_scenario]
+    cc_models = set(cc_data.index.get_level_values(0))
+
+    # Pass only the relevant epochs to resampling.
+    # For some reason, some models have repetitions and NaNs.
+    # This will drop models with no data.
+
+    temp_dict = dict()
+    # In order, as the store gives them, and not in the order of the set,
+    # which changes from one process to the next.
+    for model in sorted(cc_models):
+
+        # Some times there are non-unique indices, as in duplicate
+        # days. Get rid of them by taking the means.
+        temp = gcmstore.clean_gcm(cc_data.loc[model])
+        orig_index = temp.index
+
+        if orig_index.shape[0] > 0:
+            temp_dict[model] = temp[
+                (orig_index.year <= epoch[1]) &
+                (orig_index.year >= epoch[0])]
+
+    return pd.concat(temp_dict)
+
+# ----------- END get_cc_data function. -----------
+
+
 def read_fin4(fpath):
 
     header_cols = ["year", "month", "day", "hour",
@@ -193,24 +294,20 @@ def read_fin4(fpath):
     hlines = 3
     header = list()
 
-    with open(fpath, 'r') as openfile:
+    with compression.open_text(fpath) as openfile:
         for ln in range(0, hlines):
             header.append(openfile.readline())
 
-    wdata = pd.read_csv(
-        fpath, sep='\s+', skiprows=[0, 1, 2],
-        names=header_cols, dtype=str, index_col=False)
+        wdata = pd.read_csv(
+            openfile, sep='\s+', names=header_cols, dtype=str,
+            index_col=False)
 
-    temp_index = pd.date_range(
-        start='{:d}-01-01 00:00:00'.format(int(wdata["year"][0])),
-        end='{:d}-12-31 23:00:00'.format(int(wdata["year"][0])),
-        freq='1H')
+    temp_index = timeindex.year_index(int(wdata["year"][0]))
 
     if wdata.shape[0] == temp_index.shape[0]:
         wdata.index = temp_index
     elif wdata.shape[0] < temp_index.shape[0]:
-        wdata.index = temp_index[~((temp_index.day == 29) &
-                                   (temp_index.month == 2))]
+        wdata.index = timeindex.noleap_index(int(wdata["year"][0]))
 
     wdata = wdata.dropna(axis=1, how='all')
 	
@@ -222,7 +319,7 @@ def read_fin4(fpath):
         if col in ['year', 'month', 'day', 'hour']:
             wdata[col] = wdata[col].apply(lambda x: int(x))
 
-    wdata = petite.remove_leap_day(wdata)
+    wdata = timeindex.remove_leap_day(wdata)
 
     wdata['rh'] = pd.Series(petite.calc_rh(wdata['tdb'], wdata['tdp']),
                             index=wdata.index)
@@ -231,56 +328,11 @@ def read_fin4(fpath):
 
 
 	
-# Number of days in each month.
-m_days = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
-
-
-def day_of_year(month, day):
-
-    month = month.astype(int) - 1
-    doy = np.zeros_like(day, dtype=int)
-
-    for m, mon in enumerate(month):
-        doy[m] = (day[m] + np.sum(m_days[0:mon])).astype(int)
-
-    return doy
-
-# End function day_of_year
-	
-
-
-def day_of_month(day):
-
-    month = np.zeros_like(day, dtype=int)
-    dom = np.zeros_like(day, dtype=int)
-
-    for d, doy in enumerate(day):
-
-        rem = doy
-        prev_ndays = 0
-
-        for m, ndays in enumerate(m_days):
-            # The iterator "m" starts at zero.
-
-            if rem <= 0:
-                # Iterator has now reached the incomplete month.
-
-                # The previous month is the correct month.
-                # Not subtracting 1 because the iterator starts at 0.
-                month[d] = m
-
-                # Add the negative remainder to the previous month"s days.
-                dom[d] = rem + prev_ndays
-                break
-
-            # Subtract number of days in this month from the day.
-            rem -= ndays
-            # Store number of days from previous month.
-            prev_ndays = ndays
-
-    return month, dom
-
-# End function day_of_month
+# Number of days in each month, and the days of the year, now kept in
+# timeindex.py.
+m_days = timeindex.MONTH_DAYS
+day_of_year = timeindex.day_of_year
+day_of_month = timeindex.day_of_month
 
 
 # %%
@@ -303,21 +355,29 @@ def read_epw(fpath, epw_colnames=epw_colnames):
     # Convert the names to lowercase.
     epw_colnames = [x.lower() for x in epw_colnames]
 
-    # Read table, ignoring header lines.
-    wdata = pd.read_csv(fpath, delimiter=",", skiprows=hlines,
-                        header=None, names=epw_colnames,
-                        index_col=False)
+    # Read the header, then the table after it.
+    header = list()
+    with compression.open_text(fpath) as hf:
+        for ln in range(0, hlines):
+            header.append(hf.readline())
+
+        wdata = pd.read_csv(hf, delimiter=",", header=None,
+                            names=epw_colnames, index_col=False)
 
     if len(wdata['year'].unique()) > 1:
         wdata['year'] = 2223
 
-    dates= pd.date_range(start='{}-01-01 00:00:00'.format(wdata['year'].unique()[0]), end='{}-12-31 23:00:00'.format(wdata['year'].unique()[0]), freq='1H')
+    # Missing values are NaN from here on.
+    for col, code in epw_missing.items():
+        wdata[col] = wdata[col].mask(wdata[col] >= code)
+
+    dates = timeindex.year_index(int(wdata['year'].unique()[0]))
 
     if len(dates) > wdata.shape[0]:
-        dates = dates[~((dates.month == 2) & (dates.day == 29))]
+        dates = timeindex.noleap_index(int(wdata['year'].unique()[0]))
 
     wdata.index = dates
-    wdata = petite.remove_leap_day(wdata)
+    wdata = timeindex.remove_leap_day(wdata)
 
     if len(wdata.columns) == 35:
         # Some files have three extra columns
@@ -326,12 +386,7 @@ def read_epw(fpath, epw_colnames=epw_colnames):
         wdata = wdata.drop(["unknownvar1", "unknownvar2",
                             "unknownvar3"], axis=1)
 
-    # Read header and assign all metadata.
-    header = list()
-    hf = open(fpath, "r")
-    for ln in range(0, hlines):
-        header.append(hf.readline())
-
+    # Assign all metadata from the header.
     infoline = (header[0].strip()).split(",")
 
     locdata = dict(loc=infoline[1], lat=infoline[6], long=infoline[7],
@@ -353,13 +408,13 @@ def read_espr(fpath):
     # Missing functionality - reject call if path points to binary file.
 
     # Uniform date index for all tmy weather data tables.
-    dates = pd.date_range("1/1/2223", periods=8760, freq="H")
+    dates = timeindex.noleap_index(2223)
 
     fpath_fldr, fpath_name = os.path.split(fpath)
-    sitename = fpath_name.split(sep=".")
+    sitename = compression.strip_extension(fpath_name).split(sep=".")
     sitename = sitename[0]
 
-    with open(fpath, "r") as f:
+    with compression.open_text(fpath) as f:
         content = f.readlines()
 
     # Read first line to get format.
@@ -560,7 +615,10 @@ def read_espr(fpath):
 
 def give_weather(df, locdata, stcode, header,
                  masterfile="GEN_IWEC.epw", file_type="epw",
-                 path_file_out=".", std_cols=None):
+                 path_file_out=".", std_cols=None, verbose=True):
+    '''Write one sample out as a weather file of file_type, with the
+       header and unchanged columns of masterfile if it is given. Returns
+       the path of the file, or None if it could not be written.'''
 
     file_type = file_type.lower()
 
@@ -614,6 +672,11 @@ def give_weather(df, locdata, stcode, header,
 
     if file_type == "espr":
 
+        if df.shape[0] < 8760:
+            raise ValueError(
+                "ESP-r climate files hold whole years. Please write a "
+                "window of the year as an EPW or CSV file instead.")
+
         esp_master, locdata, header, esp_columns = read_espr(masterfile)
 
         # Replace the year in the header.
@@ -631,11 +694,8 @@ def give_weather(df, locdata, stcode, header,
             if col in ["tdb", "wspd"]:
                 # Deci-degrees and deci-m/s respectively.
                 esp_master.loc[:, col] *= 10
-        # Create a datetime index for this year.
-        esp_master.index = pd.date_range(
-            start='{:04d}-01-01 00:00:00'.format(year),
-            end='{:04d}-12-31 23:00:00'.format(year),
-            freq='1H')
+        # Create a datetime index for this year, without the leap day.
+        esp_master.index = timeindex.noleap_index(year)
 
         # Save month and day to write out to file as separate rows.
         monthday = (esp_master.loc[:, ["day", "month"]]).astype(int)
@@ -663,14 +723,14 @@ def give_weather(df, locdata, stcode, header,
         with open(filepath, "w") as f:
             f.write(''.join(header)+'\n')
 
-            spamwriter = csv.writer(f, delimiter=",", quotechar="",
+            spamwriter = csv.writer(f, delimiter=",", quotechar=None,
                                     quoting=csv.QUOTE_NONE,
                                     escapechar=" ",
                                     lineterminator="\n ")
             for line in master_aslist[:-1]:
                 spamwriter.writerow(line)
 
-            spamwriter = csv.writer(f, delimiter=",", quotechar="",
+            spamwriter = csv.writer(f, delimiter=",", quotechar=None,
                                     quoting=csv.QUOTE_NONE,
                                     lineterminator="\n\n")
             spamwriter.writerow(master_aslist[-1])
@@ -691,23 +751,33 @@ def give_weather(df, locdata, stcode, header,
                    ((np.repeat("%5.2f", len(epw_colnames) - (6 + 3))
                      ).tolist()))
 
-        epw_master, locdata, header = read_epw(masterfile)
-        # Cut out the last new-line character since numpy savetxt
-        # puts in a newline character after the header anyway.
-        header[-1] = header[-1][:-1]
-													   
-
         # These columns will be replaced.
         epw_columns = ["tdb", "tdp", "rh", "ghi", "dni", "dhi", "wspd", "wdr"]
-		
-									   
-        for col in epw_columns:
-            epw_master.loc[:, col] = df[col].values
 
-        # Replace the year of the master file.
-        epw_master["year"] = year
-		
-																										  
+        if masterfile is None:
+            # No master file, so write out the header that was passed.
+            header = list(header)
+        else:
+            epw_master, locdata, header = read_epw(masterfile)
+
+            # A sample of a window of the year only replaces those hours.
+            if df.shape[0] != epw_master.shape[0]:
+                epw_master = epw_master.iloc[timeindex.noleap_hours(df.index)]
+
+            for col in epw_columns:
+                epw_master.loc[:, col] = df[col].values
+
+            # Replace the year of the master file.
+            epw_master["year"] = year
+
+        if df.shape[0] < 8760:
+            header = [epw_data_periods(df.index)
+                      if line.startswith("DATA PERIODS") else line
+                      for line in header]
+
+        # Cut out the last new-line character since numpy savetxt
+        # puts in a newline character after the header anyway.
+        header[-1] = header[-1][:-1]
 
         np.savetxt(filepath, df.values, fmt=epw_fmt,
                    delimiter=",", header="".join(header),
@@ -724,7 +794,10 @@ def give_weather(df, locdata, stcode, header,
         if filepath.split(".")[-1] != "fin4":
             filepath = filepath + "fin4"
 
-        _, _, header = read_fin4(masterfile)
+        if masterfile is None:
+            header = list(header)
+        else:
+            _, _, header = read_fin4(masterfile)
 
         # Strip the last end-of-line character.
         header[-1] = header[-1].strip('\r').strip('\n')
@@ -783,7 +856,7 @@ def give_weather(df, locdata, stcode, header,
     else:
 
         if filepath.split(".")[-1] != "csv":
-            filepath = filepath + "csv"
+            filepath = filepath + ".csv"
 
         df.to_csv(filepath, sep=",", header=True, index=False)
 
@@ -792,12 +865,270 @@ def give_weather(df, locdata, stcode, header,
         else:
             success = False
 
-    if success:
+    if not success:
+        print("Some error prevented file from being written.")
+        return None
+
+    if verbose:
+        print("Write success.")
+
+    return filepath
+
+# ----------- End give_weather function. -----------
+
+
+def epw_data_periods(index):
+    '''DATA PERIODS line of an EPW file that holds the hours in index,
+       which have to be one period of whole days.'''
+
+    return "DATA PERIODS,1,1,Data,{0},{1:2d}/{2:2d},{3:2d}/{4:2d}\n".format(
+        index[0].day_name(), index[0].month, index[0].day,
+        index[-1].month, index[-1].day)
+
+# ----------- END epw_data_periods function. -----------
+
+
+def ensemble_arrays(xout):
+    '''Index, sample keys, and calendar, per-sample and shared columns
+       of an Ensemble, or of a list of samples as saved before ensembles.
+       Per-sample columns are float32 arrays of [samples, hours], the
+       rest are [hours].'''
+
+    if isinstance(xout, ensemble.Ensemble):
+        template = xout.static
+        index = xout.index(0)
+        keys = [xout.key(k) for k in range(0, len(xout))]
+        per_sample = xout.per_sample
+    else:
+        template = xout[0]
+        index = template.index
+        keys = [('', int(x.index.year[0]), k) for k, x in enumerate(xout)]
+        per_sample = [x for x in template.columns
+                      if x not in calendar_cols and x != 'year' and
+                      pd.api.types.is_numeric_dtype(template[x])]
+
+    calendar = dict([(col, template[col].values.astype(np.int8))
+                     for col in calendar_cols])
+
+    if isinstance(xout, ensemble.Ensemble):
+        sampled = dict([(col, np.asarray(xout.column(col), dtype=np.float32))
+                        for col in per_sample])
+    else:
+        sampled = dict([(col, np.asarray([x[col].values for x in xout],
+                                         dtype=np.float32))
+                        for col in per_sample])
+
+    # Text columns, e.g., the data source flags of EPW files, are left
+    # out of both.
+    shared = dict([(col, template[col].values.astype(np.float32))
+                   for col in template.columns
+                   if col not in per_sample and col not in calendar_cols and
+                   col != 'year' and
+                   pd.api.types.is_numeric_dtype(template[col])])
+
+    return index, keys, calendar, sampled, shared
+
+# ----------- END ensemble_arrays function. -----------
+
+
+def give_ensemble(xout, locdata, stcode, path_file_out, file_type=None,
+                  window=None):
+    '''Write all the samples of an ensemble (or a list of samples) to
+       one binary file, along with the station metadata in locdata. The
+       file_type is "feather" (needs pyarrow) or "npz", and by default
+       Feather if pyarrow is installed. A window of the year ('MM-DD',
+       'MM-DD') can be written instead of the whole samples.
+
+       The Feather file is one uncompressed table with a row per sample
+       and hour, in the order of the samples: sample, year, gcm, variant,
+       month, day, hour and the weather variables as float32. The npz
+       file is uncompressed, so every array in it can be memory-mapped:
+       one [samples] array each for sample_year, sample_gcm and
+       sample_variant, the calendar columns as [hours], the variables
+       that differ between samples as float32 [samples, hours], and
+       those that do not as float32 [hours]. In both, a JSON string
+       (the schema metadata "indra" of the Feather table, the array
+       "meta" of the npz file) holds the station code, locdata, the
+       columns, and the number of samples and hours.
+
+       Returns the path of the file, which is given the extension of
+       its format. Use get_ensemble to read it back.'''
+
+    if file_type is None:
+        file_type = "npz" if pyarrow is None else "feather"
+    file_type = file_type.lower()
+
+    if file_type not in ensemble_formats:
+        raise ValueError("Ensembles can be written as {0}, not {1}.".format(
+            " or ".join(ensemble_formats), file_type))
+
+    if file_type == "feather" and pyarrow is None:
+        raise ImportError("Writing Feather files needs pyarrow. Please "
+                          "install it, or write an npz file instead.")
+
+    index, keys, calendar, sampled, shared = ensemble_arrays(xout)
+
+    if window is not None:
+        hours = timeindex.window_hours(window)
+        index_hours = timeindex.noleap_hours(index)
+        in_window = np.flatnonzero((index_hours >= hours.start) &
+                                   (index_hours < hours.stop))
+        index = index[in_window]
+        calendar = dict([(x, y[in_window]) for x, y in calendar.items()])
+        sampled = dict([(x, y[:, in_window]) for x, y in sampled.items()])
+        shared = dict([(x, y[in_window]) for x, y in shared.items()])
+
+    n_samples, n_hours = len(keys), len(index)
+
+    meta = dict(station_code=stcode, locdata=locdata,
+                columns=list(sampled) + list(shared),
+                sampled=list(sampled), shared=list(shared),
+                n_samples=n_samples, n_hours=n_hours,
+                start=str(index[0]) if n_hours > 0 else None)
+
+    filepath = os.path.splitext(path_file_out)[0] + "." + file_type
+
+    years = np.asarray([x[1] for x in keys], dtype=np.int16)
+    gcms = np.asarray([x[0] for x in keys], dtype=str)
+    variants = np.asarray([x[2] for x in keys], dtype=np.int32)
+
+    if file_type == "feather":
+
+        columns = dict(
+            sample=np.repeat(np.arange(0, n_samples, dtype=np.int32),
+                             n_hours),
+            year=np.repeat(years, n_hours),
+            gcm=pyarrow.array(np.repeat(gcms, n_hours)).dictionary_encode(),
+            variant=np.repeat(variants, n_hours))
+        for col, values in calendar.items():
+            columns[col] = np.tile(values, n_samples)
+        for col, values in sampled.items():
+            columns[col] = np.ravel(values)
+        for col, values in shared.items():
+            columns[col] = np.tile(values, n_samples)
+
+        table = pyarrow.table(columns)
+        table = table.replace_schema_metadata(
+            {"indra": json.dumps(meta, default=str)})
+
+        # Uncompressed, so that readers can map the columns without
+        # copying them.
+        pyarrow.feather.write_feather(table, filepath,
+                                      compression="uncompressed")
+
+    else:
+
+        arrays = dict(sample_year=years, sample_gcm=gcms,
+                      sample_variant=variants)
+        arrays.update(calendar)
+        arrays.update(sampled)
+        arrays.update(shared)
+
+        np.savez(filepath, meta=np.asarray(json.dumps(meta, default=str)),
+                 **arrays)
+
+    if os.path.isfile(filepath):
         print("Write success.")
     else:
         print("Some error prevented file from being written.")
 
-# ----------- End give_weather function. -----------
+    return filepath
+
+# ----------- END give_ensemble function. -----------
+
+
+def npz_members(fpath):
+    '''Offset, dtype, shape and order of every array in an uncompressed
+       npz file, i.e., where each array sits in the file.'''
+
+    members = dict()
+
+    with zipfile.ZipFile(fpath) as zip_file, open(fpath, "rb") as open_file:
+
+        for info in zip_file.infolist():
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(
+                    "{0} in {1} is compressed, so it cannot be memory-"
+                    "mapped.".format(info.filename, fpath))
+
+            # The array follows the local header of its zip entry, whose
+            # extra field need not match the central directory.
+            open_file.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", open_file.read(4))
+            open_file.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(open_file)
+            if version == (1, 0):
+                shape, fortran, dtype = \
+                    np.lib.format.read_array_header_1_0(open_file)
+            else:
+                shape, fortran, dtype = \
+                    np.lib.format.read_array_header_2_0(open_file)
+
+            members[os.path.splitext(info.filename)[0]] = (
+                open_file.tell(), dtype, shape, "F" if fortran else "C")
+
+    return members
+
+# ----------- END npz_members function. -----------
+
+
+def get_ensemble(fpath):
+    '''Read an ensemble written by give_ensemble, without copying the
+       data: the arrays are memory-mapped (npz) or point into the mapped
+       Feather file. Returns a dictionary with the metadata (meta), the
+       sample keys (sample_year, sample_gcm, sample_variant), the
+       calendar columns as [hours], and every variable as [samples,
+       hours] if it differs between samples or [hours] if not.'''
+
+    if fpath.split(".")[-1].lower() == "feather":
+
+        if pyarrow is None:
+            raise ImportError("Reading Feather files needs pyarrow.")
+
+        table = pyarrow.feather.read_table(fpath, memory_map=True)
+        meta = json.loads(table.schema.metadata[b"indra"].decode("utf-8"))
+        n_samples, n_hours = meta["n_samples"], meta["n_hours"]
+
+        def column(name):
+            chunked = table.column(name)
+            if chunked.num_chunks == 1:
+                return chunked.chunk(0).to_numpy(zero_copy_only=True)
+            return chunked.to_numpy()
+
+        out = dict(meta=meta,
+                   sample_year=column("year")[::n_hours],
+                   sample_gcm=np.asarray(table.column("gcm").take(
+                       np.arange(0, n_samples) * n_hours).to_pylist(),
+                       dtype=str),
+                   sample_variant=column("variant")[::n_hours])
+        for col in calendar_cols:
+            out[col] = column(col)[0:n_hours]
+        for col in meta["sampled"]:
+            out[col] = np.reshape(column(col), [n_samples, n_hours])
+        for col in meta["shared"]:
+            out[col] = column(col)[0:n_hours]
+
+        return out
+
+    with np.load(fpath) as npz_file:
+        meta = json.loads(str(npz_file["meta"]))
+
+    out = dict(meta=meta)
+
+    for name, (offset, dtype, shape, order) in npz_members(fpath).items():
+        if name == "meta":
+            continue
+        if 0 in shape:
+            out[name] = np.empty(shape, dtype=dtype)
+        else:
+            out[name] = np.memmap(fpath, dtype=dtype, mode="r",
+                                  offset=offset, shape=shape, order=order)
+
+    return out
+
+# ----------- END get_ensemble function. -----------
 
 
 						